@@ -1,7 +1,10 @@
 #################################################################
 #%%  Search for both glasses and start recording
 #################################################################
+import csv
+import queue
 import sys
+import threading
 import time
 
 from tkinter import *
@@ -25,6 +28,114 @@ events = ["Sit", "Stand", "Swivel", "end"]
 previous_events = []
 
 
+class EventDispatcher:
+    """
+    Sends events to the devices from a background thread.
+
+    The Tk handlers only call send(), which records time.time_ns() at the
+    click and queues the event, so the UI never waits on the network. The
+    sender thread drains everything queued since its last wake-up as one
+    batch, sends each event to every device with retries, and logs the
+    round-trip latency of every send to a CSV file. Events that still fail
+    after all retries end up in the failures queue for the UI to report.
+    Once close() has been called, send() raises instead of queueing events
+    that would never go out.
+    """
+
+    def __init__(self, devices, log_path="event_latency.csv", max_retries=3, retry_delay=0.1):
+        self.devices = devices
+        self.log_path = log_path
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.events = queue.Queue()
+        self.failures = queue.Queue()
+        with open(self.log_path, 'w', newline='') as f:
+            csv.writer(f).writerow(['event', 'device', 'event_timestamp_unix_ns',
+                                    'sent_unix_ns', 'latency_ms', 'attempts'])
+        self._closing = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def send(self, name, timestamp_ns=None):
+        if self.closed:
+            raise RuntimeError(f"Event dispatcher is closed; {name} was not sent")
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        self.events.put((name, timestamp_ns))
+
+    @property
+    def closed(self):
+        return self._closing or not self.thread.is_alive()
+
+    def close(self):
+        """Sends everything still queued, then stops the sender thread."""
+        if self._closing:
+            return
+        self._closing = True
+        self.events.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self.events.get()]
+            while True:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            rows = []
+            for item in batch:
+                if item is None:
+                    self._log(rows)
+                    return
+                name, timestamp_ns = item
+                for device in list(self.devices):
+                    rows.append(self._send_with_retry(device, name, timestamp_ns))
+            self._log(rows)
+
+    def _send_with_retry(self, device, name, timestamp_ns):
+        for attempt in range(1, self.max_retries + 1):
+            sent_ns = time.time_ns()
+            start = time.perf_counter()
+            try:
+                device.send_event(name, event_timestamp_unix_ns=timestamp_ns)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failures.put((name, str(e)))
+                    return [name, device.address, timestamp_ns, sent_ns, '', attempt]
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                continue
+            latency_ms = (time.perf_counter() - start) * 1000
+            return [name, device.address, timestamp_ns, sent_ns, f"{latency_ms:.2f}", attempt]
+
+    def _log(self, rows):
+        if rows:
+            with open(self.log_path, 'a', newline='') as f:
+                csv.writer(f).writerows(rows)
+
+
+dispatcher = EventDispatcher(devices)
+
+
+def check_event_failures():
+    # Runs on the Tk thread; the sender thread only queues failures
+    try:
+        while True:
+            name, error = dispatcher.failures.get_nowait()
+            messagebox.showinfo('Error', f'Unable to send event {name}: {error}')
+    except queue.Empty:
+        pass
+    window.after(200, check_event_failures)
+
+
+def send_phase_events(phase_event):
+    """Ends the previous phase and starts the next one at the same click time."""
+    click_ns = time.time_ns()
+    if len(previous_events) > 0:
+        dispatcher.send(f"end_{previous_events[-1]}", click_ns)
+    dispatcher.send(phase_event, click_ns)
+
+
 def ip_to_device(ips):
     print(ips)
     for ip in ips:
@@ -89,82 +200,53 @@ def button_add_event_on_click():
         choice = selected_option.get()
         if choice != "":
             phase = choice
+            send_phase_events(f"start_{phase}")
+            previous_events.append(f"{phase}")
             dialog.destroy()
-            try:
-                if len(previous_events) > 0:
-                    devices[0].send_event(f"end_{previous_events[-1]}", event_timestamp_unix_ns=time.time_ns())
-                devices[0].send_event(f"start_{phase}", event_timestamp_unix_ns=time.time_ns())
-                previous_events.append(f"{phase}")
-            except:
-                messagebox.showinfo('Error', 'Unable to send event')
     ok_button = tk.Button(dialog, text="Ok", command=on_ok)
     ok_button.pack(pady=10)
 
 
 def button_stand_on_click():
-    try:
-        if len(previous_events) > 0:
-            devices[0].send_event(f"end_{previous_events[-1]}", event_timestamp_unix_ns=time.time_ns())
-        devices[0].send_event(f"start_stand", event_timestamp_unix_ns=time.time_ns())
-        previous_events.append(f"stand")
-        button_stand.configure(bg="green")
-        button_sit.configure(bg="lightgrey")
-    except:
-        messagebox.showinfo('Error', 'Unable to send event')
+    send_phase_events("start_stand")
+    previous_events.append("stand")
+    button_stand.configure(bg="green")
+    button_sit.configure(bg="lightgrey")
 
 
 def button_sit_on_click():
-    try:
-        if len(previous_events) > 0:
-            devices[0].send_event(f"end_{previous_events[-1]}", event_timestamp_unix_ns=time.time_ns())
-        devices[0].send_event(f"start_sit", event_timestamp_unix_ns=time.time_ns())
-        previous_events.append(f"sit")
-        button_sit.configure(bg="green")
-        button_stand.configure(bg="lightgrey")
-    except:
-        messagebox.showinfo('Error', 'Unable to send event')
+    send_phase_events("start_sit")
+    previous_events.append("sit")
+    button_sit.configure(bg="green")
+    button_stand.configure(bg="lightgrey")
 
 def button_swivel_on_click():
-    try:
-        if len(previous_events) > 0:
-            devices[0].send_event(f"end_{previous_events[-1]}", event_timestamp_unix_ns=time.time_ns())
-        devices[0].send_event(f"start_swivel", event_timestamp_unix_ns=time.time_ns())
-        previous_events.append(f"swivel")
-        button_sit.configure(bg="green")
-        button_stand.configure(bg="lightgrey")
-        button_swivel.configure(bg="lightgrey")
-    except:
-        messagebox.showinfo('Error', 'Unable to send event')
+    send_phase_events("start_swivel")
+    previous_events.append("swivel")
+    button_sit.configure(bg="green")
+    button_stand.configure(bg="lightgrey")
+    button_swivel.configure(bg="lightgrey")
 
 def button_end_on_click():
-    try:
-        if len(previous_events) > 0:
-            devices[0].send_event(f"end_{previous_events[-1]}", event_timestamp_unix_ns=time.time_ns())
-        devices[0].send_event(f"end_posture", event_timestamp_unix_ns=time.time_ns())
-        button_end.configure(bg="green")
-        button_stand.configure(bg="lightgrey")
-        button_sit.configure(bg="lightgrey")
-    except:
-        messagebox.showinfo('Error', 'Unable to send event')
+    send_phase_events("end_posture")
+    button_end.configure(bg="green")
+    button_stand.configure(bg="lightgrey")
+    button_sit.configure(bg="lightgrey")
 
 
 def button_sq_on_click():
-    try:
-        devices[0].send_event(f"start_posture", event_timestamp_unix_ns=time.time_ns())
-        button_startquestion.configure(bg="green")
-    except:
-        messagebox.showinfo('Error', 'Unable to send event')
+    dispatcher.send("start_posture")
+    button_startquestion.configure(bg="green")
 
 
 def button_eq_on_click():
-    try:
-        devices[0].send_event(f"end_question", event_timestamp_unix_ns=time.time_ns())
-        button_startquestion.configure(bg="lightgrey")
-    except:
-        messagebox.showinfo('Error', 'Unable to send event')
+    dispatcher.send("end_question")
+    button_startquestion.configure(bg="lightgrey")
 
 
 def button_save_on_click():
+    # Every queued event must reach the devices before the recordings close
+    dispatcher.close()
     for idx_device, device in enumerate(devices):
         device.recording_stop_and_save()
         device.close()
@@ -229,4 +311,5 @@ button_end.configure(bg="lightgrey")
 button_save.configure(bg="lightgrey")
 button_end.configure(bg="lightgrey")
 
+window.after(200, check_event_failures)
 window.mainloop()
@@ -1,5 +1,6 @@
 # experiment/__init__.py
 from .trial_manager import BlockCopyExperiment
 from .data_logger import DataLogger
+from .batch_analysis import BatchAnalysis
 
-__all__ = ['BlockCopyExperiment', 'DataLogger']
\ No newline at end of file
+__all__ = ['BlockCopyExperiment', 'DataLogger', 'BatchAnalysis']
\ No newline at end of file
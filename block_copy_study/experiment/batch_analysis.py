@@ -0,0 +1,199 @@
+# batch_analysis.py
+# experiment/batch_analysis.py
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from .session_reader import SessionReader, session_base
+from utils.alignment import StreamAligner
+from utils.calibration import angular_speed, markley_average
+from utils.quaternions import QUATERNION_COLUMNS
+
+
+GAZE_COLUMNS = ['timestamp', 'gaze_x', 'gaze_y']
+MOTION_COLUMNS = ['timestamp', 'pitch', 'roll', 'yaw', 'quat_w', 'quat_x', 'quat_y', 'quat_z']
+EVENT_COLUMNS = ['timestamp', 'kind', 'duration', 'amplitude']
+
+
+def discover_sessions(output_dir):
+    """Session prefixes of every recorded ``P###_*`` session in ``output_dir``, sorted."""
+    return sorted(session_base(path)
+                  for path in glob.glob(os.path.join(output_dir, 'P*_trials.csv')))
+
+
+def summarize_orientation(location, quaternions, timestamps):
+    """
+    Orientation aggregates of one tracker over a trial.
+
+    Quaternion components are not averaged: q and -q are the same rotation,
+    so their mean is meaningless. The mean orientation is Markley's average
+    and the spread is the RMS angle of the samples from it.
+
+    Returns:
+        Dictionary of ``<location>_orientation_w``..``_z`` (mean orientation),
+        ``<location>_orientation_spread`` (deg) and ``<location>_speed_mean``
+        and ``_speed_max`` (rad/s)
+    """
+    names = [f'{location}_orientation_{c}' for c in 'wxyz'] + \
+        [f'{location}_orientation_spread', f'{location}_speed_mean', f'{location}_speed_max']
+    row = dict.fromkeys(names, np.nan)
+    valid = ~np.isnan(quaternions).any(axis=1)
+    q, t = quaternions[valid], timestamps[valid]
+    if not len(q):
+        return row
+    mean = markley_average(q)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    deviation = 2 * np.arccos(np.clip(np.abs(q @ mean), 0.0, 1.0))
+    row.update(zip(names[:4], mean))
+    row[f'{location}_orientation_spread'] = np.degrees(np.sqrt(np.mean(deviation ** 2)))
+    if len(q) >= 2:
+        speed = angular_speed(q, t)
+        row[f'{location}_speed_mean'] = speed.mean()
+        row[f'{location}_speed_max'] = speed.max()
+    return row
+
+
+def summarize_trial(session, trial, locations=('chest', 'mobile'), rate=None):
+    """
+    Aligns one trial's streams and reduces them to one row.
+
+    Gaze is the master clock; every motion location is resampled onto it
+    with ``StreamAligner``. Each aligned scalar and Euler channel
+    contributes its mean and standard deviation; orientations are reduced
+    by ``summarize_orientation`` from the trackers' own samples. Fixation
+    and saccade counts come from the gaze event file when the session has
+    one.
+
+    Args:
+        session: ``SessionReader``
+        trial: Row of ``session.trials``
+        locations: Motion tracker locations to align
+        rate: Optional uniform output rate (Hz) for the aligned clock
+
+    Returns:
+        Dictionary of trial labels and aggregates
+    """
+    select = dict(posture=trial['posture'], angle=trial['angle'], trial_num=trial['trial_num'])
+    row = {'participant_id': trial['participant_id'], 'posture': trial['posture'],
+           'angle': trial['angle'], 'trial_num': trial['trial_num'],
+           'duration': trial['duration']}
+
+    gaze = session.load('gaze', GAZE_COLUMNS, labels=(), **select)
+    row['gaze_samples'] = len(gaze)
+    if len(gaze) >= 2:
+        aligner = StreamAligner('gaze', rate=rate)
+        aligner.add_stream('gaze', gaze['timestamp'].to_numpy(), gaze)
+        orientations = {}
+        for location in locations:
+            motion = session.load('motion', MOTION_COLUMNS, location=location, labels=(),
+                                  **select)
+            if len(motion) >= 2:
+                aligner.add_stream(location, motion['timestamp'].to_numpy(),
+                                   motion.drop(columns=QUATERNION_COLUMNS),
+                                   angle_columns=('pitch', 'roll', 'yaw'))
+            orientations.update(summarize_orientation(
+                location, motion[QUATERNION_COLUMNS].to_numpy(np.float64),
+                motion['timestamp'].to_numpy(np.float64)))
+        aligned = aligner.align().drop(columns='timestamp')
+        for column, values in aligned.items():
+            row[f'{column}_mean'] = np.nanmean(values) if values.notna().any() else np.nan
+            row[f'{column}_std'] = np.nanstd(values) if values.notna().any() else np.nan
+        row.update(orientations)
+
+    if os.path.exists(f"{session.base_path}_gaze_events.bcol"):
+        events = session.load('gaze_events', EVENT_COLUMNS, labels=(), **select)
+        fixations = events[events['kind'] == 'fixation']
+        row['fixations'] = len(fixations)
+        row['saccades'] = int((events['kind'] == 'saccade').sum())
+        row['fixation_duration_mean'] = fixations['duration'].mean()
+        row['saccade_amplitude_mean'] = events.loc[events['kind'] == 'saccade', 'amplitude'].mean()
+    return row
+
+
+def summarize_session(path, **kwargs):
+    """
+    Per-trial rows of one session; the unit of work of ``BatchAnalysis``.
+
+    Trials are processed one at a time, so a worker holds at most one
+    trial's columns in memory.
+    """
+    session = SessionReader(path)
+    name = os.path.basename(session.base_path)
+    rows = []
+    for order, (_, trial) in enumerate(session.trials.iterrows()):
+        row = {'session': name, 'trial_order': order}
+        row.update(summarize_trial(session, trial, **kwargs))
+        rows.append(row)
+    return rows
+
+
+class BatchAnalysis:
+    def __init__(self, output_dir, workers=None, tasks_per_worker=4, **kwargs):
+        """
+        Runs ``summarize_session`` over every session of a study in parallel.
+
+        Sessions are independent, so each is one task in a process pool
+        and the study scales with the number of cores. Workers are replaced
+        after ``tasks_per_worker`` sessions, which bounds the memory a
+        long-lived worker can accumulate; each task only returns its small
+        list of per-trial rows.
+
+        Args:
+            output_dir: Directory holding the ``P###_*`` session files
+            workers: Worker processes; defaults to the CPU count
+            tasks_per_worker: Sessions a worker handles before it is replaced
+            **kwargs: Passed to ``summarize_trial`` (locations, rate)
+        """
+        self.output_dir = output_dir
+        self.sessions = discover_sessions(output_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.tasks_per_worker = tasks_per_worker
+        self.kwargs = kwargs
+        self.errors = {}
+
+    def run(self):
+        """
+        Returns:
+            Tidy DataFrame with one row per trial of every session, ordered
+            by participant and trial order
+        """
+        rows = []
+        if self.workers == 1 or len(self.sessions) <= 1:
+            for path in self.sessions:
+                rows.extend(self._run_one(path))
+        else:
+            # Spawned workers start clean instead of inheriting this process
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(self.sessions)),
+                                     mp_context=context,
+                                     max_tasks_per_child=self.tasks_per_worker) as pool:
+                futures = {pool.submit(summarize_session, path, **self.kwargs): path
+                           for path in self.sessions}
+                for future in as_completed(futures):
+                    try:
+                        rows.extend(future.result())
+                    except Exception as e:
+                        self.errors[futures[future]] = repr(e)
+                        print(f"Session {futures[future]} failed: {e}")
+        if not rows:
+            return pd.DataFrame()
+        table = pd.DataFrame(rows)
+        return table.sort_values(['participant_id', 'session', 'trial_order'],
+                                 ignore_index=True)
+
+    def _run_one(self, path):
+        try:
+            return summarize_session(path, **self.kwargs)
+        except Exception as e:
+            self.errors[path] = repr(e)
+            print(f"Session {path} failed: {e}")
+            return []
+
+    def save(self, path, table=None):
+        """Runs the analysis unless a table is given and writes it as CSV."""
+        table = self.run() if table is None else table
+        table.to_csv(path, index=False)
+        return table
+
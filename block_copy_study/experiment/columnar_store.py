@@ -0,0 +1,320 @@
+# columnar_store.py
+# experiment/columnar_store.py
+import json
+import os
+import struct
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b'BCOL0001'
+TRAILER_MAGIC = b'BCOLEND\x00'
+TRAILER = struct.Struct('<Q8s')  # footer length, trailer magic
+ALIGNMENT = 8
+
+# Column kinds: 'time' is float seconds stored as int64 ns, 'category' is a
+# string stored as a uint8 code into the footer's category list and 'chunk'
+# is an int32 that is constant per chunk, so it lives only in the footer.
+STORAGE_DTYPES = {
+    'time': np.dtype('<i8'),
+    'chunk': np.dtype('<i4'),
+    'int32': np.dtype('<i4'),
+    'float32': np.dtype('<f4'),
+    'category': np.dtype('u1')
+}
+
+SCHEMAS = {
+    'gaze': [('timestamp', 'time'), ('trial_num', 'chunk'),
+             ('gaze_x', 'float32'), ('gaze_y', 'float32'),
+             ('gaze_3d_x', 'float32'), ('gaze_3d_y', 'float32'), ('gaze_3d_z', 'float32')],
+    'motion': [('timestamp', 'time'), ('trial_num', 'chunk'), ('location', 'category'),
+               ('pitch', 'float32'), ('roll', 'float32'), ('yaw', 'float32'),
+               ('quat_w', 'float32'), ('quat_x', 'float32'),
+               ('quat_y', 'float32'), ('quat_z', 'float32')],
+    'gaze_events': [('timestamp', 'time'), ('trial_num', 'chunk'), ('kind', 'category'),
+                    ('end', 'time'), ('duration', 'float32'), ('x', 'float32'), ('y', 'float32'),
+                    ('amplitude', 'float32'), ('peak_velocity', 'float32'),
+                    ('n_samples', 'int32')]
+}
+
+
+class ColumnarWriter:
+    def __init__(self, path, schema, chunk_rows=65536):
+        """
+        Append-only chunked columnar writer.
+
+        File layout::
+
+            MAGIC | chunk | chunk | ... | footer JSON | footer length | TRAILER_MAGIC
+
+        Each chunk stores every column as one contiguous, 8-byte aligned
+        block, with rows sorted by timestamp. Chunks never span a
+        ``trial_num`` change, and the footer records per chunk its byte
+        offsets, row count, timestamp range and trial number. The footer is
+        rewritten after every chunk, so the file is readable at any point
+        during a recording.
+
+        Args:
+            path: Output file
+            schema: List of (column, kind) pairs, e.g. ``SCHEMAS['gaze']``
+            chunk_rows: Rows buffered before a chunk is written
+        """
+        self.path = path
+        self.schema = list(schema)
+        self.chunk_rows = chunk_rows
+        self.categories = {name: [] for name, kind in self.schema if kind == 'category'}
+        self.chunks = []
+        self._pending = {name: [] for name, _ in self.schema}
+        self._pending_rows = 0
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._data_end = self._file.tell()
+        self._write_footer()
+
+    def append(self, columns):
+        """
+        Buffers rows given as a dict of equal-length column arrays.
+
+        Timestamps are float seconds; category columns are strings.
+        """
+        n = len(columns['timestamp'])
+        if not n:
+            return
+        for name, kind in self.schema:
+            values = columns[name]
+            if kind == 'time':
+                values = np.round(np.asarray(values, dtype=np.float64) * 1e9).astype('<i8')
+            elif kind == 'category':
+                values = self._encode(name, values)
+            else:
+                values = np.asarray(values, dtype=STORAGE_DTYPES[kind])
+            self._pending[name].append(values)
+        self._pending_rows += n
+        if self._pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def append_rows(self, rows):
+        """Buffers rows given as a list of dicts (the CSV writer's input)."""
+        if rows:
+            self.append({name: [row[name] for row in rows] for name, _ in self.schema})
+
+    def flush(self):
+        """Writes all buffered rows as one chunk per trial run."""
+        if not self._pending_rows:
+            return
+        columns = {name: np.concatenate(parts) for name, parts in self._pending.items()}
+        self._pending = {name: [] for name, _ in self.schema}
+        self._pending_rows = 0
+
+        # Rows drained from several queues interleave; keep chunks time-sorted
+        order = np.argsort(columns['timestamp'], kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+
+        trial_num = columns['trial_num']
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(trial_num)) + 1, [len(trial_num)]])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            self._write_chunk({name: values[start:end] for name, values in columns.items()})
+        self._write_footer()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _encode(self, name, values):
+        categories = self.categories[name]
+        uniques, inverse = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        lookup = np.empty(len(uniques), dtype=STORAGE_DTYPES['category'])
+        for i, value in enumerate(uniques):
+            if value not in categories:
+                categories.append(str(value))
+            lookup[i] = categories.index(value)
+        return lookup[inverse]
+
+    def _write_chunk(self, columns):
+        f = self._file
+        f.seek(self._data_end)
+        offsets = {}
+        for name, kind in self.schema:
+            if kind == 'chunk':
+                continue
+            f.write(b'\x00' * (-f.tell() % ALIGNMENT))
+            offsets[name] = f.tell()
+            f.write(np.ascontiguousarray(columns[name]).tobytes())
+        self._data_end = f.tell()
+
+        timestamps = columns['timestamp']
+        chunk = {
+            'rows': int(len(timestamps)),
+            'offsets': offsets,
+            't_min': int(timestamps.min()),
+            't_max': int(timestamps.max())
+        }
+        for name, kind in self.schema:
+            if kind == 'chunk':
+                chunk[name] = int(columns[name][0])
+        self.chunks.append(chunk)
+
+    def _write_footer(self):
+        footer = json.dumps({
+            'schema': self.schema,
+            'categories': self.categories,
+            'chunks': self.chunks
+        }).encode('utf-8')
+        f = self._file
+        f.seek(self._data_end)
+        f.write(footer)
+        f.write(TRAILER.pack(len(footer), TRAILER_MAGIC))
+        f.truncate()
+        f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarReader:
+    def __init__(self, path):
+        """
+        Reader for files written by ``ColumnarWriter``.
+
+        Args:
+            path: Columnar session file
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a columnar session file: {path}")
+            f.seek(-TRAILER.size, os.SEEK_END)
+            footer_size, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != TRAILER_MAGIC:
+                raise ValueError(f"Truncated columnar session file: {path}")
+            f.seek(-TRAILER.size - footer_size, os.SEEK_END)
+            footer = json.loads(f.read(footer_size))
+        self.schema = [tuple(column) for column in footer['schema']]
+        self.kinds = dict(self.schema)
+        self.categories = footer['categories']
+        self.chunks = footer['chunks']
+        self._mmap = None
+
+    @property
+    def columns(self):
+        return [name for name, _ in self.schema]
+
+    def __len__(self):
+        return sum(chunk['rows'] for chunk in self.chunks)
+
+    def select_chunks(self, trial_num=None, t_min=None, t_max=None):
+        """Chunks matching a trial number and overlapping a time range (seconds)."""
+        selected = []
+        for chunk in self.chunks:
+            if trial_num is not None and chunk['trial_num'] != trial_num:
+                continue
+            if t_min is not None and chunk['t_max'] < t_min * 1e9:
+                continue
+            if t_max is not None and chunk['t_min'] > t_max * 1e9:
+                continue
+            selected.append(chunk)
+        return selected
+
+    def read(self, columns=None, trial_num=None):
+        """
+        Reads raw column arrays.
+
+        Args:
+            columns: Column names to read; defaults to all
+            trial_num: Only read chunks of this trial
+
+        Returns:
+            Dict of NumPy arrays in storage form: ``timestamp`` as int64 ns,
+            category columns as uint8 codes into ``self.categories``
+        """
+        columns = self.columns if columns is None else list(columns)
+        chunks = self.select_chunks(trial_num=trial_num)
+        out = {}
+        with open(self.path, 'rb') as f:
+            for name in columns:
+                dtype = STORAGE_DTYPES[self.kinds[name]]
+                array = np.empty(sum(chunk['rows'] for chunk in chunks), dtype=dtype)
+                pos = 0
+                for chunk in chunks:
+                    self._read_into(f, chunk, name, array[pos:pos + chunk['rows']])
+                    pos += chunk['rows']
+                out[name] = array
+        return out
+
+    def iter_chunks(self, columns=None, trial_num=None):
+        """Yields raw column arrays one chunk at a time."""
+        columns = self.columns if columns is None else list(columns)
+        with open(self.path, 'rb') as f:
+            for chunk in self.select_chunks(trial_num=trial_num):
+                arrays = {}
+                for name in columns:
+                    arrays[name] = np.empty(chunk['rows'], dtype=STORAGE_DTYPES[self.kinds[name]])
+                    self._read_into(f, chunk, name, arrays[name])
+                yield arrays
+
+    def view(self, chunk, name):
+        """
+        Zero-copy view of one column of one chunk.
+
+        The file is memory-mapped on first use, so only the pages a caller
+        actually touches are read from disk.
+        """
+        dtype = STORAGE_DTYPES[self.kinds[name]]
+        if self.kinds[name] == 'chunk':
+            return np.full(chunk['rows'], chunk[name], dtype=dtype)
+        if self._mmap is None:
+            self._mmap = np.memmap(self.path, dtype=np.uint8, mode='r')
+        offset = chunk['offsets'][name]
+        return self._mmap[offset:offset + chunk['rows'] * dtype.itemsize].view(dtype)
+
+    def _read_into(self, f, chunk, name, out):
+        if self.kinds[name] == 'chunk':
+            out[:] = chunk[name]
+        else:
+            f.seek(chunk['offsets'][name])
+            f.readinto(out)
+
+    def to_dataframe(self, columns=None, trial_num=None):
+        """Reads columns into a DataFrame laid out like the CSV stream files."""
+        return self.decode(self.read(columns, trial_num))
+
+    def decode(self, arrays):
+        """Converts raw column arrays into a CSV-like DataFrame."""
+        data = {}
+        for name, values in arrays.items():
+            kind = self.kinds[name]
+            if kind == 'time':
+                values = values / 1e9
+            elif kind == 'category':
+                values = pd.Categorical.from_codes(values, self.categories[name])
+            data[name] = values
+        return pd.DataFrame(data)
+
+
+def csv_to_columnar(csv_path, out_path, stream, chunk_rows=65536):
+    """
+    Converts a ``DataLogger`` CSV stream file to the columnar format.
+
+    Args:
+        csv_path: Source ``_gaze.csv`` or ``_motion.csv``
+        out_path: Destination columnar file
+        stream: 'gaze' or 'motion'
+        chunk_rows: Rows read and written per chunk
+    """
+    with ColumnarWriter(out_path, SCHEMAS[stream], chunk_rows) as writer:
+        for frame in pd.read_csv(csv_path, chunksize=chunk_rows):
+            writer.append({name: frame[name].to_numpy() for name, _ in writer.schema})
+
+
+def columnar_to_csv(path, csv_path):
+    """Converts a columnar file back to the ``DataLogger`` CSV layout."""
+    reader = ColumnarReader(path)
+    pd.DataFrame(columns=reader.columns).to_csv(csv_path, index=False)
+    for arrays in reader.iter_chunks():
+        reader.decode(arrays).to_csv(csv_path, mode='a', header=False, index=False)
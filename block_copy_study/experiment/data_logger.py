@@ -1,16 +1,184 @@
 # data_logger.py
 # experiment/data_logger.py
+import bisect
 import csv
+import io
 import json
+import queue
+import threading
+import time
 from datetime import datetime
 import os
+from .columnar_store import ColumnarWriter, SCHEMAS
+
+
+HEADERS = {
+    'trial': ['participant_id', 'timestamp', 'posture', 'angle',
+              'trial_num', 'duration'],
+    'gaze': ['timestamp', 'trial_num', 'gaze_x', 'gaze_y',
+             'gaze_3d_x', 'gaze_3d_y', 'gaze_3d_z'],
+    'motion': ['timestamp', 'trial_num', 'location', 'pitch',
+               'roll', 'yaw', 'quat_w', 'quat_x', 'quat_y', 'quat_z'],
+    'gaze_events': ['timestamp', 'trial_num', 'kind', 'end', 'duration', 'x', 'y',
+                    'amplitude', 'peak_velocity', 'n_samples']
+}
+
+
+def _rows_from(source):
+    """Yields the pending samples of a queue or ring buffer as row dicts."""
+    if isinstance(source, queue.Queue):
+        while True:
+            try:
+                yield source.get_nowait()
+            except queue.Empty:
+                return
+    else:
+        names = source.dtype.names
+        batch = source.read()
+        while len(batch):
+            for values in batch.tolist():
+                yield dict(zip(names, values))
+            batch = source.read()
+
+
+class StreamWriter(threading.Thread):
+    def __init__(self, logger, path, fieldnames, sources,
+                 batch_size=4096, flush_interval=0.25, columnar=None, index_path=None):
+        """
+        Background thread that drains sensor queues into one CSV file.
+
+        The file handle stays open for the whole session. Rows are written
+        in batches and flushed whenever ``batch_size`` rows are pending or
+        ``flush_interval`` seconds have passed. Each row is tagged with the
+        ``trial_num`` that was active at its (host-time) timestamp, so
+        samples still queued at a trial boundary land in the right trial.
+
+        Each batch is written in timestamp order. While writing, the byte
+        range, row count and time range of every trial are tracked and saved
+        to a JSON sidecar index (see ``session_reader.read_trial_csv``).
+
+        Args:
+            logger: Owning ``DataLogger``; supplies trial boundaries
+            path: CSV file to append to (header already written)
+            fieldnames: CSV columns; extra keys in the sample dicts are ignored
+            sources: Queues of sample dicts, or ring buffers and bus
+                subscriptions whose ``read()`` returns structured-array batches
+            batch_size: Rows per write/flush
+            flush_interval: Maximum seconds between flushes
+            columnar: Optional ``ColumnarWriter`` receiving the same rows
+            index_path: Sidecar file for the per-trial byte-offset index
+        """
+        super().__init__(daemon=True)
+        self.logger = logger
+        self.path = path
+        self.fieldnames = fieldnames
+        self.sources = list(sources)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.columnar = columnar
+        self.index_path = index_path
+        self.index = {}
+        self.rows_written = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=fieldnames, extrasaction='ignore')
+        self._stop_event = threading.Event()
+
+    def run(self):
+        with open(self.path, 'ab') as f:
+            while not self._stop_event.wait(self.flush_interval):
+                self._drain(f)
+            # Nothing is dropped on shutdown: drain whatever is still queued
+            self._drain(f)
+        if self.columnar is not None:
+            self.columnar.close()
+
+    def _drain(self, f):
+        rows = []
+        segment_at = self.logger.segment_at
+        for source in self.sources:
+            for row in _rows_from(source):
+                row['_segment'] = segment_at(row['timestamp'])
+                rows.append(row)
+                if len(rows) >= self.batch_size:
+                    self._write(f, rows)
+                    rows = []
+        if rows:
+            self._write(f, rows)
+
+    def _write(self, f, rows):
+        rows.sort(key=lambda row: row['timestamp'])
+        start = 0
+        for end in range(1, len(rows) + 1):
+            if end == len(rows) or rows[end]['_segment'] != rows[start]['_segment']:
+                self._write_run(f, rows[start:end])
+                start = end
+        f.flush()
+        if self.columnar is not None:
+            self.columnar.append_rows(rows)
+        self.rows_written += len(rows)
+        self._save_index()
+
+    def _write_run(self, f, rows):
+        """Writes rows of one trial segment and extends its index entry."""
+        segment = rows[0]['_segment']
+        labels = self.logger.segment_labels(segment)
+        for row in rows:
+            row['trial_num'] = labels['trial_num']
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerows(rows)
+        data = self._buffer.getvalue().encode('utf-8')
+        start_byte = f.tell()
+        f.write(data)
+        if not labels['trial_num']:
+            return
+
+        entry = self.index.get(segment)
+        if entry is None:
+            entry = self.index[segment] = dict(labels, segment=segment, start_byte=start_byte,
+                                               end_byte=start_byte, rows=0,
+                                               t_min=rows[0]['timestamp'],
+                                               t_max=rows[-1]['timestamp'])
+        entry['start_byte'] = min(entry['start_byte'], start_byte)
+        entry['end_byte'] = start_byte + len(data)
+        entry['rows'] += len(rows)
+        entry['t_min'] = min(entry['t_min'], rows[0]['timestamp'])
+        entry['t_max'] = max(entry['t_max'], rows[-1]['timestamp'])
+
+    def _save_index(self):
+        if self.index_path is None:
+            return
+        with open(self.index_path, 'w') as f:
+            json.dump({'header': self.fieldnames,
+                       'trials': [self.index[segment] for segment in sorted(self.index)]},
+                      f, indent=2)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
 
 
 class DataLogger:
-    def __init__(self, output_dir, participant_id):
+    def __init__(self, output_dir, participant_id, binary=True):
+        """
+        Writes trial, gaze, motion and sync files for one session.
+
+        Args:
+            output_dir: Directory for the session files
+            participant_id: Participant number used in file names
+            binary: Also write gaze and motion in the columnar format
+                (``_gaze.bcol``/``_motion.bcol``) alongside the CSV files
+        """
         self.output_dir = output_dir
         self.participant_id = participant_id
+        self.binary = binary
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.trial_num = 0
+        self._trial_times = [float('-inf')]
+        self._trial_labels = [{'trial_num': 0}]
+        self.writers = {}
+        self._trial_file = None
+        self._trial_writer = None
         self.setup_files()
 
     def setup_files(self):
@@ -21,31 +189,128 @@ class DataLogger:
             'trial': f"{self.output_dir}/{base_filename}_trials.csv",
             'gaze': f"{self.output_dir}/{base_filename}_gaze.csv",
             'motion': f"{self.output_dir}/{base_filename}_motion.csv",
-            'sync': f"{self.output_dir}/{base_filename}_sync.json"
+            'sync': f"{self.output_dir}/{base_filename}_sync.json",
+            'gaze_bin': f"{self.output_dir}/{base_filename}_gaze.bcol",
+            'motion_bin': f"{self.output_dir}/{base_filename}_motion.bcol",
+            'gaze_index': f"{self.output_dir}/{base_filename}_gaze.idx.json",
+            'motion_index': f"{self.output_dir}/{base_filename}_motion.idx.json",
+            'gaze_events': f"{self.output_dir}/{base_filename}_gaze_events.csv",
+            'gaze_events_bin': f"{self.output_dir}/{base_filename}_gaze_events.bcol",
+            'gaze_events_index': f"{self.output_dir}/{base_filename}_gaze_events.idx.json"
         }
 
         self._initialize_files()
 
     def _initialize_files(self):
-        headers = {
-            'trial': ['participant_id', 'timestamp', 'posture', 'angle',
-                      'trial_num', 'duration'],
-            'gaze': ['timestamp', 'trial_num', 'gaze_x', 'gaze_y',
-                     'gaze_3d_x', 'gaze_3d_y', 'gaze_3d_z'],
-            'motion': ['timestamp', 'trial_num', 'location', 'pitch',
-                       'roll', 'yaw', 'quat_w', 'quat_x', 'quat_y', 'quat_z']
-        }
-
-        for file_type, header in headers.items():
+        for file_type, header in HEADERS.items():
             with open(self.files[file_type], 'w', newline='') as f:
                 writer = csv.writer(f)
                 writer.writerow(header)
 
+    def set_trial(self, trial_num, timestamp=None, **labels):
+        """
+        Starts a new trial segment for the streamed rows.
+
+        Args:
+            trial_num: Trial number, or 0 between trials
+            timestamp: Host time the segment starts; defaults to now
+            **labels: Extra trial description stored in the trial index,
+                e.g. ``posture`` and ``angle``
+        """
+        # Append the labels first so segment_at never indexes past their end
+        self._trial_labels.append(dict(labels, trial_num=trial_num))
+        self._trial_times.append(time.time() if timestamp is None else timestamp)
+        self.trial_num = trial_num
+
+    def segment_at(self, timestamp):
+        """Index of the trial segment that was active at host time ``timestamp``."""
+        return bisect.bisect_right(self._trial_times, timestamp) - 1
+
+    def segment_labels(self, segment):
+        return self._trial_labels[segment]
+
+    def trial_at(self, timestamp):
+        """Trial number that was active at host time ``timestamp``."""
+        return self._trial_labels[self.segment_at(timestamp)]['trial_num']
+
+    def start_stream(self, stream, sources, **kwargs):
+        """
+        Starts a background writer for the 'gaze', 'motion' or 'gaze_events' file.
+
+        Args:
+            stream: File to write ('gaze', 'motion' or 'gaze_events')
+            sources: Queues of sample dicts or subscriptions with ``read()``,
+                e.g. ``[eye_tracker.gaze_buffer.subscribe('logger')]``
+            **kwargs: Passed to ``StreamWriter`` (batch_size, flush_interval)
+        """
+        columnar = None
+        if self.binary:
+            columnar = ColumnarWriter(self.files[f'{stream}_bin'], SCHEMAS[stream])
+        writer = StreamWriter(self, self.files[stream], HEADERS[stream], sources,
+                              columnar=columnar, index_path=self.files[f'{stream}_index'],
+                              **kwargs)
+        self.writers[stream] = writer
+        writer.start()
+        return writer
+
+    def stop_streams(self):
+        """Stops all writers after draining their queues."""
+        for writer in self.writers.values():
+            writer.stop()
+        self.writers = {}
+
     def log_trial(self, trial_data):
-        with open(self.files['trial'], 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=trial_data.keys())
-            writer.writerow(trial_data)
+        if self._trial_writer is None:
+            self._trial_file = open(self.files['trial'], 'a', newline='')
+            self._trial_writer = csv.DictWriter(self._trial_file, fieldnames=HEADERS['trial'],
+                                                extrasaction='ignore')
+        self._trial_writer.writerow(trial_data)
+        self._trial_file.flush()
 
-    def log_sync_stats(self, sync_stats):
+    def log_sync_stats(self, sync_stats, clocks=None):
+        """
+        Writes synchronization statistics and the fitted clock models.
+
+        Args:
+            sync_stats: Output of ``DataSynchronizer.check_sync``
+            clocks: Optional iterable of ``ClockModel`` objects; their offsets
+                and drifts are stored under ``clock_offsets``
+        """
+        payload = dict(sync_stats)
+        if clocks:
+            payload['clock_offsets'] = {clock.name: clock.state() for clock in clocks}
+        with open(self.files['sync'], 'w') as f:
+            json.dump(payload, f, indent=2)
+
+    def log_stream_stats(self, stream_stats):
+        """
+        Adds per-subscriber lag and drop counts to the sync file.
+
+        Args:
+            stream_stats: Output of ``StreamBus.stats``
+        """
+        with open(self.files['sync']) as f:
+            payload = json.load(f)
+        payload['streams'] = stream_stats
         with open(self.files['sync'], 'w') as f:
-            json.dump(sync_stats, f, indent=2)
\ No newline at end of file
+            json.dump(payload, f, indent=2)
+
+    def log_stillness_events(self, events):
+        """
+        Adds stillness start/stop events to the sync file.
+
+        Args:
+            events: List of dicts with sensor, kind, timestamp and trial_num
+        """
+        with open(self.files['sync']) as f:
+            payload = json.load(f)
+        payload['stillness'] = events
+        with open(self.files['sync'], 'w') as f:
+            json.dump(payload, f, indent=2)
+
+    def close(self):
+        self.stop_streams()
+        if self._trial_file is not None:
+            self._trial_file.close()
+            self._trial_file = None
+            self._trial_writer = None
@@ -0,0 +1,141 @@
+# session_reader.py
+# experiment/session_reader.py
+import io
+import json
+import re
+import numpy as np
+import pandas as pd
+from .columnar_store import ColumnarReader
+
+
+SESSION_SUFFIX = re.compile(r'_(trials|gaze_events|gaze|motion|sync)\.(csv|bcol|json)$')
+
+
+def session_base(path):
+    """Strips a session file suffix, e.g. ``P001_..._gaze.bcol`` -> ``P001_...``."""
+    return SESSION_SUFFIX.sub('', str(path))
+
+
+def load_trial_index(csv_path):
+    """Loads the per-trial byte-offset index written next to a stream CSV."""
+    with open(re.sub(r'\.csv$', '.idx.json', str(csv_path))) as f:
+        return json.load(f)
+
+
+def read_trial_csv(csv_path, posture=None, angle=None, trial_num=None, segment=None):
+    """
+    Reads the rows of matching trials straight from a stream CSV.
+
+    Uses the sidecar index to seek to each trial's byte range, so the cost
+    is proportional to the trial, not to the session.
+
+    Args:
+        csv_path: ``_gaze.csv`` or ``_motion.csv`` written by ``DataLogger``
+        posture, angle, trial_num: Trial filters; None matches any
+        segment: Position of the trial segment in the session
+
+    Returns:
+        DataFrame of the matching rows with ``posture`` and ``angle`` columns
+    """
+    index = load_trial_index(csv_path)
+    filters = {'posture': posture, 'angle': angle, 'trial_num': trial_num, 'segment': segment}
+    frames = []
+    with open(csv_path, 'rb') as f:
+        for entry in index['trials']:
+            if any(value is not None and entry.get(key) != value
+                   for key, value in filters.items()):
+                continue
+            f.seek(entry['start_byte'])
+            data = f.read(entry['end_byte'] - entry['start_byte'])
+            frame = pd.read_csv(io.BytesIO(data), header=None, names=index['header'])
+            # Late rows of a neighbouring segment can fall inside the range
+            frame = frame[frame['trial_num'] == entry['trial_num']]
+            frame['posture'] = entry.get('posture')
+            frame['angle'] = entry.get('angle')
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=index['header'] + ['posture', 'angle'])
+    return pd.concat(frames, ignore_index=True)
+
+
+class SessionReader:
+    def __init__(self, path):
+        """
+        Lazy, memory-mapped access to one recorded session.
+
+        Only the small ``_trials.csv`` is read up front. Stream data stays in
+        the memory-mapped ``.bcol`` files until ``load`` asks for specific
+        columns and trials; chunks outside the requested trials are never
+        touched, and within a chunk only the rows of a requested trial are
+        copied out.
+
+        Args:
+            path: Session file prefix (``data/P001_20250101_120000``) or any
+                of the session's files
+        """
+        self.base_path = session_base(path)
+        self.trials = pd.read_csv(f"{self.base_path}_trials.csv")
+        self.trials['end'] = self.trials['timestamp'] + self.trials['duration']
+        self._readers = {}
+
+    def reader(self, stream):
+        if stream not in self._readers:
+            self._readers[stream] = ColumnarReader(f"{self.base_path}_{stream}.bcol")
+        return self._readers[stream]
+
+    def select_trials(self, posture=None, angle=None, trial_num=None):
+        """Rows of the trial log matching the given conditions."""
+        mask = np.ones(len(self.trials), dtype=bool)
+        for column, value in (('posture', posture), ('angle', angle), ('trial_num', trial_num)):
+            if value is not None:
+                mask &= (self.trials[column] == value).to_numpy()
+        return self.trials[mask]
+
+    def load(self, stream, columns, posture=None, angle=None, trial_num=None,
+             location=None, labels=('posture', 'angle')):
+        """
+        Materializes selected columns for the selected trials.
+
+        Args:
+            stream: 'gaze', 'motion' or 'gaze_events'
+            columns: Stream columns to return
+            posture, angle, trial_num: Trial filters; None matches any
+            location: For the motion stream, only rows of this location
+            labels: Trial log columns attached to every returned row
+
+        Returns:
+            DataFrame with the requested columns plus the label columns
+        """
+        reader = self.reader(stream)
+        columns = list(columns)
+        if location is not None and location not in reader.categories.get('location', []):
+            return pd.DataFrame(columns=columns + list(labels))
+        location_code = None if location is None else reader.categories['location'].index(location)
+
+        pieces = {name: [] for name in columns}
+        label_pieces = {label: [] for label in labels}
+        total = 0
+        for _, trial in self.select_trials(posture, angle, trial_num).iterrows():
+            start_ns, end_ns = trial['timestamp'] * 1e9, trial['end'] * 1e9
+            for chunk in reader.select_chunks(t_min=trial['timestamp'], t_max=trial['end']):
+                timestamps = reader.view(chunk, 'timestamp')
+                lo = np.searchsorted(timestamps, start_ns, side='left')
+                hi = np.searchsorted(timestamps, end_ns, side='right')
+                rows = slice(lo, hi)
+                if location_code is not None:
+                    rows = lo + np.flatnonzero(reader.view(chunk, 'location')[lo:hi] == location_code)
+                n = len(timestamps[rows])
+                if not n:
+                    continue
+                total += n
+                for name in columns:
+                    pieces[name].append(np.array(reader.view(chunk, name)[rows]))
+                for label in labels:
+                    label_pieces[label].append(np.full(n, trial[label], dtype=object))
+
+        if not total:
+            return pd.DataFrame(columns=columns + list(labels))
+        frame = reader.decode({name: np.concatenate(parts) for name, parts in pieces.items()})
+        for label, parts in label_pieces.items():
+            frame[label] = np.concatenate(parts)
+        return frame
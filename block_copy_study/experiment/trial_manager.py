@@ -5,15 +5,30 @@ import numpy as np
 import time
 import csv
 from datetime import datetime
-from hardware.eye_tracker import NeonEyeTracker
+from hardware.async_acquisition import AcquisitionEngine
+from hardware.eye_tracker import HeadMotionSubscription, NeonEyeTracker
 from hardware.motion_tracker import MotionTracker
-from hardware.synchronizer import DataSynchronizer
+from hardware.stream_bus import StreamBus
+from hardware.synchronizer import DataSynchronizer, SyncStage
+from experiment.data_logger import DataLogger
+from utils.gaze_events import GazeEventStage
+from utils.kinematics import KinematicsStage
+from utils.stillness import StillnessMonitor
 
 
 class BlockCopyExperiment:
-    def __init__(self, participant_id, output_dir="data/"):
+    def __init__(self, participant_id, output_dir="data/", use_async=False, shared_bus=False):
         self.participant_id = participant_id
         self.output_dir = output_dir
+        self.use_async = use_async
+        self.engine = None
+        self.kinematics = None
+        self.sync = None
+        self.gaze_events = None
+        self.stillness = None
+        self.stillness_events = []
+        # A shared bus lets the visualizer run in its own process
+        self.bus = StreamBus(shared=shared_bus)
         self.setup_experimental_conditions()
         self.setup_data_collection()
 
@@ -24,10 +39,82 @@ class BlockCopyExperiment:
         self.trial_sequence = self.generate_trial_sequence()
 
     def setup_data_collection(self):
-        self.eye_tracker = NeonEyeTracker()
-        self.chest_imu = MotionTracker("CHEST_MAC_ADDRESS", "chest")
-        self.mobile_imu = MotionTracker("MOBILE_MAC_ADDRESS", "mobile")
+        if self.use_async:
+            self.setup_async_collection()
+            return
+        self.eye_tracker = NeonEyeTracker(bus=self.bus)
+        self.chest_imu = MotionTracker("CHEST_MAC_ADDRESS", "chest", bus=self.bus)
+        self.mobile_imu = MotionTracker("MOBILE_MAC_ADDRESS", "mobile", bus=self.bus)
         self.synchronizer = DataSynchronizer()
+        self.logger = DataLogger(self.output_dir, self.participant_id)
+        self.estimate_clock_offset()
+        self.start_logging()
+
+    def estimate_clock_offset(self):
+        """Anchors the Neon clock model with a round-trip offset estimate."""
+        offset = self.eye_tracker.estimate_clock_offset()
+        if offset is None:
+            print("Neon clock offset estimate unavailable; using arrival times only")
+        return offset
+
+    def start_logging(self):
+        """
+        Subscribes the logger to the gaze topic, the detected gaze events and
+        the motion of the head (Neon IMU, location 'head') and both trackers,
+        and starts the event detector, the head/trunk kinematics stage (the
+        mobile IMU is on the chair), the stillness monitor of all three
+        sensors and the synchronizer stage comparing all four streams.
+        """
+        self.logger.start_stream('gaze', [self.eye_tracker.gaze_buffer.subscribe('logger')])
+        self.gaze_events = GazeEventStage(self.eye_tracker.gaze_buffer.subscribe('gaze_events'),
+                                          self.bus)
+        self.logger.start_stream('gaze_events', [self.gaze_events.topic.subscribe('logger')])
+        self.gaze_events.start()
+        self.logger.start_stream('motion', [
+            HeadMotionSubscription(self.eye_tracker.imu_buffer.subscribe('logger')),
+            self.chest_imu.subscribe('logger'),
+            self.mobile_imu.subscribe('logger')])
+        self.kinematics = KinematicsStage(self.eye_tracker.imu_buffer.subscribe('kinematics'),
+                                          self.chest_imu.subscribe('kinematics'),
+                                          self.mobile_imu.subscribe('kinematics'),
+                                          bus=self.bus)
+        self.kinematics.start()
+        self.stillness = StillnessMonitor({
+            'head': self.eye_tracker.imu_buffer.subscribe('stillness'),
+            'chest': self.chest_imu.subscribe('stillness'),
+            'mobile': self.mobile_imu.subscribe('stillness')
+        })
+        self.stillness.subscribe(self.on_stillness)
+        self.stillness.start()
+        self.sync = SyncStage(self.synchronizer, {
+            'gaze': self.eye_tracker.gaze_buffer.subscribe('synchronizer'),
+            'head': self.eye_tracker.imu_buffer.subscribe('synchronizer'),
+            'chest': self.chest_imu.subscribe('synchronizer'),
+            'mobile': self.mobile_imu.subscribe('synchronizer')
+        }, bus=self.bus)
+        self.sync.start()
+
+    def on_stillness(self, event):
+        """Records a stillness transition with the trial it happened in."""
+        self.stillness_events.append({'sensor': event.sensor, 'kind': event.kind,
+                                      'timestamp': event.timestamp,
+                                      'trial_num': self.logger.trial_at(event.timestamp)})
+
+    def setup_async_collection(self):
+        """
+        Registers the devices with an ``AcquisitionEngine``.
+
+        Nothing is connected here; ``run_async`` connects the Neon and both
+        IMUs concurrently and then starts the stream writers.
+        """
+        self.engine = AcquisitionEngine(bus=self.bus)
+        self.eye_tracker = self.engine.add_neon('neon', "127.0.0.1")
+        self.engine.add_blocking('chest', MotionTracker, "CHEST_MAC_ADDRESS", "chest",
+                                 bus=self.bus)
+        self.engine.add_blocking('mobile', MotionTracker, "MOBILE_MAC_ADDRESS", "mobile",
+                                 bus=self.bus)
+        self.synchronizer = DataSynchronizer()
+        self.logger = DataLogger(self.output_dir, self.participant_id)
 
     def generate_trial_sequence(self):
         sequence = []
@@ -53,7 +140,12 @@ class BlockCopyExperiment:
     def run_trial(self, trial):
         print(f"\nPreparing trial: {trial}")
         input("Press Enter when ready...")
+        # Re-anchor before every trial so drift is tracked across the session
+        self.estimate_clock_offset()
 
+        start_time = time.time()
+        self.logger.set_trial(trial['trial_num'], start_time,
+                              posture=trial['posture'], angle=trial['angle'])
         self.eye_tracker.start_recording(
             f"P{self.participant_id}_{trial['posture']}_{trial['angle']}_{trial['trial_num']}")
         self.chest_imu.start_streaming()
@@ -65,7 +157,91 @@ class BlockCopyExperiment:
         self.chest_imu.stop_streaming()
         self.mobile_imu.stop_streaming()
 
+        end_time = time.time()
+        self.logger.set_trial(0, end_time)
+        self.logger.log_trial({
+            'participant_id': self.participant_id,
+            'timestamp': start_time,
+            'posture': trial['posture'],
+            'angle': trial['angle'],
+            'trial_num': trial['trial_num'],
+            'duration': end_time - start_time
+        })
+
+    async def run_async(self, on_ready=None):
+        """
+        Runs the whole session on the acquisition engine's event loop.
+
+        Args:
+            on_ready: Optional callable run once all devices are connected,
+                e.g. ``VisualizerProcess.start``
+        """
+        await self.engine.start()
+        self.chest_imu = self.engine.blocking_devices['chest']
+        self.mobile_imu = self.engine.blocking_devices['mobile']
+        self.start_logging()
+        if on_ready is not None:
+            on_ready()
+        await self.engine.estimate_clock_offsets()
+        try:
+            for trial in self.trial_sequence:
+                await self.run_trial_async(trial)
+        finally:
+            self.cleanup()
+            await self.engine.stop()
+            self.bus.close()
+
+    async def run_trial_async(self, trial):
+        print(f"\nPreparing trial: {trial}")
+        await self.engine.run_blocking(input, "Press Enter when ready...")
+        await self.engine.estimate_clock_offsets()
+
+        start_time = time.time()
+        self.logger.set_trial(trial['trial_num'], start_time,
+                              posture=trial['posture'], angle=trial['angle'])
+        await self.engine.start_recording()
+        await self.engine.send_event(
+            f"start_{trial['posture']}_{trial['angle']}_{trial['trial_num']}",
+            int(start_time * 1e9))
+
+        await self.engine.run_blocking(input, "Press Enter to end trial...")
+
+        end_time = time.time()
+        await self.engine.send_event(
+            f"end_{trial['posture']}_{trial['angle']}_{trial['trial_num']}",
+            int(end_time * 1e9))
+        await self.engine.stop_recording()
+
+        self.logger.set_trial(0, end_time)
+        self.logger.log_trial({
+            'participant_id': self.participant_id,
+            'timestamp': start_time,
+            'posture': trial['posture'],
+            'angle': trial['angle'],
+            'trial_num': trial['trial_num'],
+            'duration': end_time - start_time
+        })
+
     def cleanup(self):
+        if self.kinematics is not None:
+            self.kinematics.stop()
+        if self.stillness is not None:
+            self.stillness.stop()
+        if self.sync is not None:
+            self.sync.stop()
+        if self.gaze_events is not None:
+            # Publishes the last open event before the logger drains
+            self.gaze_events.stop()
+        self.logger.log_sync_stats(
+            self.sync.stats if self.sync is not None else self.synchronizer.check_sync(),
+            clocks=[self.eye_tracker.clock, self.chest_imu.clock, self.mobile_imu.clock])
+        self.logger.close()
+        self.logger.log_stream_stats(self.bus.stats())
+        self.logger.log_stillness_events(self.stillness_events)
+        if self.engine is not None:
+            # Devices belong to the engine; run_async disconnects them
+            return
         self.eye_tracker.cleanup()
         self.chest_imu.cleanup()
-        self.mobile_imu.cleanup()
\ No newline at end of file
+        self.mobile_imu.cleanup()
+        self.bus.close()
\ No newline at end of file
@@ -1,7 +1,10 @@
 # hardware/__init__.py
 from .eye_tracker import NeonEyeTracker
 from .motion_tracker import MotionTracker
-from .synchronizer import DataSynchronizer
+from .synchronizer import DataSynchronizer, SyncStage
+from .async_acquisition import AcquisitionEngine, AsyncNeonDevice
+from .stream_bus import StreamBus
 
 # This allows users to import directly from the hardware package
-__all__ = ['NeonEyeTracker', 'MotionTracker', 'DataSynchronizer']
\ No newline at end of file
+__all__ = ['NeonEyeTracker', 'MotionTracker', 'DataSynchronizer', 'SyncStage',
+           'AcquisitionEngine', 'AsyncNeonDevice', 'StreamBus']
\ No newline at end of file
@@ -0,0 +1,216 @@
+# async_acquisition.py
+# hardware/async_acquisition.py
+import asyncio
+import functools
+import time
+from pupil_labs.realtime_api import Device, receive_gaze_data, receive_imu_data
+from pupil_labs.realtime_api.time_echo import TimeOffsetEstimator
+from .clock_sync import ClockModel, time_echo_offset
+from .eye_tracker import GAZE_DTYPE, IMU_DTYPE
+from .stream_bus import StreamBus
+
+
+class AsyncNeonDevice:
+    def __init__(self, name, address, port=8080, buffer_capacity=8192, bus=None):
+        """
+        One Neon driven through the asyncio realtime API.
+
+        Gaze and IMU samples are published on the ``<name>_gaze`` and
+        ``<name>_imu`` topics in the same layout as ``NeonEyeTracker``, so
+        the logger and visualizer read either kind of device the same way.
+
+        Args:
+            name: Device name used in reports and clock models
+            address: Companion device address
+            port: Realtime API port
+            buffer_capacity: Records per buffer
+            bus: ``StreamBus`` to publish on; a private one by default
+        """
+        self.name = name
+        self.address = address
+        self.port = port
+        self.bus = StreamBus() if bus is None else bus
+        self.gaze_buffer = self.bus.topic(f'{name}_gaze', GAZE_DTYPE, buffer_capacity)
+        self.imu_buffer = self.bus.topic(f'{name}_imu', IMU_DTYPE, buffer_capacity)
+        self.clock = ClockModel(name)
+        self.device = None
+        self.status = None
+        self.recording_id = None
+
+    async def connect(self):
+        self.device = Device(self.address, self.port)
+        self.status = await self.device.get_status()
+        return self
+
+    async def stream_gaze(self):
+        """Receives gaze until cancelled; reconnects on network errors."""
+        sensor = self.status.direct_gaze_sensor()
+        async for gaze in receive_gaze_data(sensor.url, run_loop=True):
+            timestamp = gaze.timestamp_unix_seconds
+            self.clock.observe(timestamp, time.time())
+            self.gaze_buffer.append((self.clock.to_host(timestamp), gaze.x, gaze.y,
+                                     getattr(gaze, 'gaze_3d_x', float('nan')),
+                                     getattr(gaze, 'gaze_3d_y', float('nan')),
+                                     getattr(gaze, 'gaze_3d_z', float('nan'))))
+
+    async def stream_imu(self):
+        """Receives head IMU samples until cancelled."""
+        sensor = self.status.direct_imu_sensor()
+        async for imu in receive_imu_data(sensor.url, run_loop=True):
+            gyro, quaternion, accel = imu.gyro_data, imu.quaternion, imu.accel_data
+            self.imu_buffer.append((self.clock.to_host(imu.timestamp_unix_seconds),
+                                    gyro.x, gyro.y, gyro.z,
+                                    quaternion.w, quaternion.x, quaternion.y, quaternion.z,
+                                    accel.x, accel.y, accel.z))
+
+    async def estimate_clock_offset(self):
+        """
+        Feeds one round-trip clock offset estimate into the clock model.
+
+        Returns:
+            Host minus device clock offset in seconds, or None if the device
+            could not provide an estimate
+        """
+        phone = self.status.phone
+        estimator = TimeOffsetEstimator(phone.ip, phone.time_echo_port)
+        estimate = await estimator.estimate()
+        if estimate is None:
+            return None
+        offset = time_echo_offset(estimate)
+        self.clock.add_offset_estimate(time.time(), offset)
+        return offset
+
+    async def start_recording(self):
+        self.recording_id = await self.device.recording_start()
+        return self.recording_id
+
+    async def stop_recording(self):
+        await self.device.recording_stop_and_save()
+
+    async def send_event(self, name, timestamp_ns):
+        return await self.device.send_event(name, event_timestamp_unix_ns=timestamp_ns)
+
+    async def close(self):
+        if self.device is not None:
+            await self.device.close()
+            self.device = None
+
+
+class AcquisitionEngine:
+    def __init__(self, executor=None, bus=None):
+        """
+        Runs all acquisition devices as concurrent tasks on one event loop.
+
+        Neon devices use the asyncio realtime API directly: streaming,
+        event sending and recording control for every device proceed
+        concurrently instead of one blocking round-trip after another.
+        Blocking devices (the MetaWear BLE trackers) are constructed and
+        controlled through an executor, so their calls never stall the loop.
+
+        Args:
+            executor: ``concurrent.futures`` executor for blocking calls;
+                defaults to the loop's default thread pool
+            bus: ``StreamBus`` shared by all Neons added with ``add_neon``
+        """
+        self.executor = executor
+        self.bus = StreamBus() if bus is None else bus
+        self.neon_devices = {}
+        self.blocking_devices = {}
+        self._factories = {}
+        self._tasks = []
+        self.running = False
+
+    def add_neon(self, name, address, port=8080, **kwargs):
+        """Registers a Neon; returns the ``AsyncNeonDevice`` (connected by ``start``)."""
+        device = AsyncNeonDevice(name, address, port, bus=self.bus, **kwargs)
+        self.neon_devices[name] = device
+        return device
+
+    def add_blocking(self, name, factory, *args, **kwargs):
+        """
+        Registers a blocking device built by ``factory(*args, **kwargs)``.
+
+        The device must provide ``start_streaming``, ``stop_streaming`` and
+        ``cleanup``, e.g. ``add_blocking('chest', MotionTracker, mac, 'chest',
+        bus=engine.bus)``. It is constructed (and so connected) in the
+        executor by ``start``.
+        """
+        self._factories[name] = functools.partial(factory, *args, **kwargs)
+
+    async def run_blocking(self, func, *args):
+        """Runs a blocking call in the executor and awaits its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def start(self):
+        """Connects all devices concurrently and starts the Neon streaming tasks."""
+        neons = list(self.neon_devices.values())
+        names = list(self._factories)
+        results = await asyncio.gather(
+            *(device.connect() for device in neons),
+            *(self.run_blocking(self._factories[name]) for name in names))
+        self.blocking_devices.update(zip(names, results[len(neons):]))
+
+        for device in neons:
+            self._tasks.append(asyncio.create_task(device.stream_gaze()))
+            self._tasks.append(asyncio.create_task(device.stream_imu()))
+        self.running = True
+
+    async def estimate_clock_offsets(self):
+        """Round-trip clock offset estimates for all Neons, keyed by name."""
+        offsets = await asyncio.gather(*(device.estimate_clock_offset()
+                                         for device in self.neon_devices.values()))
+        return dict(zip(self.neon_devices, offsets))
+
+    async def start_recording(self):
+        """
+        Starts recording on every Neon and streaming on every blocking device.
+
+        Returns:
+            Dictionary of Neon recording ids keyed by device name
+        """
+        results = await asyncio.gather(
+            *(device.start_recording() for device in self.neon_devices.values()),
+            *(self.run_blocking(device.start_streaming)
+              for device in self.blocking_devices.values()))
+        return dict(zip(self.neon_devices, results))
+
+    async def stop_recording(self):
+        await asyncio.gather(
+            *(device.stop_recording() for device in self.neon_devices.values()),
+            *(self.run_blocking(device.stop_streaming)
+              for device in self.blocking_devices.values()))
+
+    async def send_event(self, name, timestamp_ns=None):
+        """
+        Sends one event to every Neon.
+
+        The timestamp is taken once, before any network round-trip, so all
+        devices receive the same event time.
+
+        Args:
+            name: Event name
+            timestamp_ns: Host time of the event; defaults to now
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        await asyncio.gather(*(device.send_event(name, timestamp_ns)
+                               for device in self.neon_devices.values()))
+        return timestamp_ns
+
+    @property
+    def clocks(self):
+        return ([device.clock for device in self.neon_devices.values()] +
+                [device.clock for device in self.blocking_devices.values()])
+
+    async def stop(self):
+        """Cancels the streaming tasks and disconnects every device."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.gather(
+            *(device.close() for device in self.neon_devices.values()),
+            *(self.run_blocking(device.cleanup) for device in self.blocking_devices.values()),
+            return_exceptions=True)
+        self.running = False
@@ -0,0 +1,165 @@
+# clock_sync.py
+# hardware/clock_sync.py
+import numpy as np
+from .ring_buffer import RingBuffer
+
+
+def _robust_line(x, y, n_iter=3, cutoff=3.0):
+    """
+    Least-squares line fit with iterative MAD-based outlier rejection.
+
+    Returns:
+        Tuple of (intercept at x=0, slope, residual std of the inliers)
+    """
+    keep = np.ones(len(x), dtype=bool)
+    intercept, slope = float(np.median(y)), 0.0
+    for _ in range(n_iter):
+        if keep.sum() < 2 or np.ptp(x[keep]) == 0:
+            break
+        slope, intercept = np.polyfit(x[keep], y[keep], 1)
+        residuals = y - (intercept + slope * x)
+        mad = np.median(np.abs(residuals[keep] - np.median(residuals[keep])))
+        new_keep = np.abs(residuals) <= cutoff * 1.4826 * mad + 1e-9
+        if np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+    residual_std = float(np.std(y[keep] - (intercept + slope * x[keep]))) if keep.any() else 0.0
+    return float(intercept), float(slope), residual_std
+
+
+def time_echo_offset(estimate):
+    """
+    Host minus device clock offset of a realtime API time echo estimate.
+
+    ``time_offset_ms`` is the client (host) clock minus the Companion clock,
+    in ms, which is already the sign ``ClockModel.add_offset_estimate`` takes.
+
+    Args:
+        estimate: ``TimeEchoEstimates`` from ``estimate_time_offset``
+
+    Returns:
+        Offset in seconds
+    """
+    return estimate.time_offset_ms.mean / 1000.0
+
+
+class ClockModel:
+    def __init__(self, name, window_size=2048, n_bins=32, refit_interval=500):
+        """
+        Maps a device clock into the host ``time.time()`` timebase.
+
+        The model is ``host = device + offset + drift * (device - reference)``,
+        fitted over a sliding window of recent observations. Two kinds of
+        observations are used:
+
+        - Arrival pairs (device timestamp, host arrival time). Transport
+          delay only ever makes a sample arrive late, so the window is split
+          into bins and only the least-delayed pair of each bin is fitted.
+          This tracks the lower envelope instead of the BLE/Wi-Fi jitter.
+        - Offset estimates from a round-trip measurement such as the Neon
+          realtime API's ``estimate_time_offset``. These are unbiased, so
+          when present they set the offset while the arrival pairs still
+          supply the drift.
+
+        Args:
+            name: Device name used in reports
+            window_size: Number of arrival pairs in the sliding window
+            n_bins: Number of lower-envelope bins per fit
+            refit_interval: Refit after this many new arrival pairs
+        """
+        self.name = name
+        self.n_bins = n_bins
+        self.refit_interval = refit_interval
+        self._device = RingBuffer(window_size)
+        self._delay = RingBuffer(window_size)
+        self._estimates = RingBuffer(64, dtype=[('device', 'f8'), ('offset', 'f8')])
+        self._pending = 0
+
+        self._params = None  # (reference, offset, drift), swapped atomically
+        self.reference = None
+        self.offset = 0.0
+        self.drift = 0.0
+        self.residual_std = None
+        self.source = None
+
+    def observe(self, device_time, host_time):
+        """Records one arrival pair; cheap enough to call from a device callback."""
+        self._device.append(device_time)
+        self._delay.append(host_time - device_time)
+        self._pending += 1
+        if self.reference is None or self._pending >= self.refit_interval:
+            self.fit()
+
+    def observe_batch(self, device_times, host_times):
+        """Records a batch of arrival pairs."""
+        device_times = np.asarray(device_times, dtype=np.float64)
+        self._device.extend(device_times)
+        self._delay.extend(np.asarray(host_times, dtype=np.float64) - device_times)
+        self._pending += len(device_times)
+        if self.reference is None or self._pending >= self.refit_interval:
+            self.fit()
+
+    def add_offset_estimate(self, host_time, offset):
+        """
+        Records a round-trip offset measurement.
+
+        Args:
+            host_time: Host time at which the estimate was taken
+            offset: Host clock minus device clock, in seconds
+        """
+        self._estimates.append((host_time - offset, offset))
+        self.fit()
+
+    def fit(self):
+        """Refits offset and drift over the current window."""
+        self._pending = 0
+        device, delay = self._device.view(), self._delay.view()
+        estimates = self._estimates.view()
+        if not len(device) and not len(estimates):
+            return
+
+        if len(device):
+            self.reference = float(device[-1])
+            n_bins = min(self.n_bins, len(device))
+            per_bin = len(device) // n_bins
+            x = device[-n_bins * per_bin:].reshape(n_bins, per_bin)
+            y = delay[-n_bins * per_bin:].reshape(n_bins, per_bin)
+            lowest = np.argmin(y, axis=1)
+            rows = np.arange(n_bins)
+            offset, drift, residual_std = _robust_line(x[rows, lowest] - self.reference,
+                                                       y[rows, lowest])
+            source = 'arrival'
+        else:
+            self.reference = float(estimates['device'][-1])
+            offset, drift, residual_std = 0.0, 0.0, None
+
+        if len(estimates):
+            anchored = estimates['offset'] - drift * (estimates['device'] - self.reference)
+            offset = float(np.median(anchored))
+            residual_std = float(np.std(anchored)) if len(estimates) > 1 else residual_std
+            source = 'estimate'
+
+        self.offset, self.drift = offset, drift
+        self._params = (self.reference, offset, drift)
+        self.residual_std = residual_std
+        self.source = source
+
+    def to_host(self, device_time):
+        """Maps device timestamps (scalar or array) into host time."""
+        params = self._params
+        if params is None:
+            return device_time
+        reference, offset, drift = params
+        return device_time + offset + drift * (device_time - reference)
+
+    def state(self):
+        """Current model parameters, suitable for JSON output."""
+        return {
+            'offset': self.offset,
+            'drift_ppm': self.drift * 1e6,
+            'reference': self.reference,
+            'residual_std': self.residual_std,
+            'source': self.source,
+            'n_pairs': len(self._device),
+            'n_estimates': len(self._estimates)
+        }
@@ -1,16 +1,51 @@
 # eye_tracker.py
 # hardware/eye_tracker.py
 from pupil_labs.realtime_api import Device
-import queue
 import numpy as np
 import time
+from .clock_sync import ClockModel, time_echo_offset
+from .stream_bus import StreamBus
+
+
+GAZE_DTYPE = np.dtype([('timestamp', 'f8'), ('gaze_x', 'f8'), ('gaze_y', 'f8'),
+                       ('gaze_3d_x', 'f8'), ('gaze_3d_y', 'f8'), ('gaze_3d_z', 'f8')])
+IMU_DTYPE = np.dtype([('timestamp', 'f8'),
+                      ('rotation_x', 'f8'), ('rotation_y', 'f8'), ('rotation_z', 'f8'),
+                      ('quaternion_w', 'f8'), ('quaternion_x', 'f8'),
+                      ('quaternion_y', 'f8'), ('quaternion_z', 'f8'),
+                      ('acceleration_x', 'f8'), ('acceleration_y', 'f8'),
+                      ('acceleration_z', 'f8')])
+# Same fields as motion_tracker.MOTION_DTYPE, so the head IMU can be logged
+# to the motion stream next to the MetaWear trackers
+HEAD_MOTION_DTYPE = np.dtype([('timestamp', 'f8'), ('location', 'U16'),
+                              ('pitch', 'f8'), ('roll', 'f8'), ('yaw', 'f8'),
+                              ('quat_w', 'f8'), ('quat_x', 'f8'),
+                              ('quat_y', 'f8'), ('quat_z', 'f8')])
 
 
 class NeonEyeTracker:
-    def __init__(self, address="127.0.0.1", port=8080):
+    def __init__(self, address="127.0.0.1", port=8080, buffer_capacity=8192, bus=None):
+        """
+        Streams gaze and head IMU samples from a Neon into ring buffers.
+
+        Each callback writes one record into a preallocated slot of
+        ``gaze_buffer`` or ``imu_buffer``. Both are ``StreamBus`` topics
+        ('neon_gaze', 'neon_imu'); consumers ``subscribe()`` to them and read
+        new samples as zero-copy structured arrays.
+
+        Args:
+            address: Companion device address
+            port: Realtime API port
+            buffer_capacity: Records per buffer; must cover the longest
+                interval between consumer reads at the maximum gaze rate
+            bus: ``StreamBus`` to publish on; a private one by default
+        """
         self.device = Device(address=address, port=port)
-        self.gaze_queue = queue.Queue()
-        self.imu_queue = queue.Queue()
+        self.bus = StreamBus() if bus is None else bus
+        self.gaze_buffer = self.bus.topic('neon_gaze', GAZE_DTYPE, buffer_capacity)
+        self.imu_buffer = self.bus.topic('neon_imu', IMU_DTYPE, buffer_capacity)
+        self.clock = ClockModel('neon')
+        self._missing_accel = False
 
         if not self.device.connected:
             raise ConnectionError("Failed to connect to Neon eye tracker")
@@ -19,28 +54,40 @@ class NeonEyeTracker:
         self.device.streaming.subscribe('imu', self._handle_imu)
 
     def _handle_gaze(self, timestamp, gaze):
-        gaze_data = {
-            'timestamp': timestamp,
-            'gaze_x': gaze[0],
-            'gaze_y': gaze[1],
-            'gaze_3d_x': gaze[2],
-            'gaze_3d_y': gaze[3],
-            'gaze_3d_z': gaze[4]
-        }
-        self.gaze_queue.put(gaze_data)
+        self.clock.observe(timestamp, time.time())
+        self.gaze_buffer.append((self.clock.to_host(timestamp),
+                                 gaze[0], gaze[1], gaze[2], gaze[3], gaze[4]))
 
     def _handle_imu(self, timestamp, imu_data):
-        head_motion = {
-            'timestamp': timestamp,
-            'rotation_x': imu_data.rotation_x,
-            'rotation_y': imu_data.rotation_y,
-            'rotation_z': imu_data.rotation_z,
-            'quaternion_w': imu_data.quaternion_w,
-            'quaternion_x': imu_data.quaternion_x,
-            'quaternion_y': imu_data.quaternion_y,
-            'quaternion_z': imu_data.quaternion_z
-        }
-        self.imu_queue.put(head_motion)
+        gyro, quaternion = imu_data.gyro_data, imu_data.quaternion
+        accel = getattr(imu_data, 'accel_data', None)
+        if accel is None:
+            # Stored as NaN, which the stillness gate never counts as still
+            if not self._missing_accel:
+                print("Warning: Neon IMU samples have no accel_data; "
+                      "head acceleration is logged as NaN")
+                self._missing_accel = True
+            accel_xyz = (np.nan, np.nan, np.nan)
+        else:
+            accel_xyz = (accel.x, accel.y, accel.z)
+        self.imu_buffer.append((self.clock.to_host(timestamp), gyro.x, gyro.y, gyro.z,
+                                quaternion.w, quaternion.x, quaternion.y, quaternion.z)
+                               + accel_xyz)
+
+    def estimate_clock_offset(self):
+        """
+        Feeds one round-trip clock offset estimate into the clock model.
+
+        Returns:
+            Host minus device clock offset in seconds, or None if the device
+            could not provide an estimate
+        """
+        estimate = self.device.estimate_time_offset()
+        if estimate is None:
+            return None
+        offset = time_echo_offset(estimate)
+        self.clock.add_offset_estimate(time.time(), offset)
+        return offset
 
     def start_recording(self, recording_name):
         self.device.recording.start(recording_name)
@@ -50,4 +97,43 @@ class NeonEyeTracker:
 
     def cleanup(self):
         self.device.streaming.unsubscribe('gaze')
-        self.device.streaming.unsubscribe('imu')
\ No newline at end of file
+        self.device.streaming.unsubscribe('imu')
+
+
+class HeadMotionSubscription:
+    def __init__(self, imu, location='head'):
+        """
+        Neon IMU samples as motion rows, so the logger writes the head next
+        to the chest and mobile trackers.
+
+        Pitch, roll and yaw are the intrinsic z-y-x decomposition of the IMU
+        quaternion, in degrees.
+
+        Args:
+            imu: Subscription to a Neon IMU topic ('neon_imu')
+            location: Location label of the rows
+        """
+        self.imu = imu
+        self.location = location
+        self.dtype = HEAD_MOTION_DTYPE
+
+    def read(self):
+        """Returns the next batch of IMU samples as ``HEAD_MOTION_DTYPE``."""
+        batch = self.imu.read()
+        out = np.empty(len(batch), HEAD_MOTION_DTYPE)
+        if not len(batch):
+            return out
+        w, x, y, z = (batch[f'quaternion_{c}'] for c in 'wxyz')
+        out['timestamp'] = batch['timestamp']
+        out['location'] = self.location
+        out['yaw'] = np.degrees(np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z)))
+        out['pitch'] = np.degrees(np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0)))
+        out['roll'] = np.degrees(np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y)))
+        out['quat_w'], out['quat_x'], out['quat_y'], out['quat_z'] = w, x, y, z
+        return out
+
+    def wait(self, timeout=None):
+        return self.imu.wait(timeout)
+
+    def close(self):
+        self.imu.close()
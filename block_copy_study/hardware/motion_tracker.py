@@ -2,45 +2,130 @@
 # hardware/motion_tracker.py
 from mbientlab.metawear import MetaWear, libmetawear
 from mbientlab.metawear.cbindings import *
-import queue
+from ctypes import memmove
+import numpy as np
+import threading
 import time
+from .clock_sync import ClockModel
+from .stream_bus import StreamBus
+
+
+# Raw capture slots: board epoch (ms), the fusion payload exactly as
+# libmetawear lays it out, and the host arrival time for the clock model
+QUATERNION_SLOT = np.dtype([('epoch', '<i8'), ('w', '<f4'), ('x', '<f4'),
+                            ('y', '<f4'), ('z', '<f4'), ('arrival', '<f8')])
+EULER_SLOT = np.dtype([('epoch', '<i8'), ('heading', '<f4'), ('pitch', '<f4'),
+                       ('roll', '<f4'), ('yaw', '<f4'), ('arrival', '<f8')])
+
+MOTION_DTYPE = np.dtype([('timestamp', 'f8'), ('location', 'U16'),
+                         ('pitch', 'f8'), ('roll', 'f8'), ('yaw', 'f8'),
+                         ('quat_w', 'f8'), ('quat_x', 'f8'),
+                         ('quat_y', 'f8'), ('quat_z', 'f8')])
+
+
+class _SlotWriter:
+    """Copies one fusion notification into the next ring-buffer slot."""
+
+    def __init__(self, buffer):
+        dtype = buffer.dtype
+        self.buffer = buffer
+        self.epoch = buffer.field('epoch')
+        self.arrival = buffer.field('arrival')
+        self.payload_offset = dtype.fields[dtype.names[1]][1]
+        self.payload_size = dtype.fields['arrival'][1] - self.payload_offset
+
+    def __call__(self, ctx, data):
+        contents = data.contents
+        buffer = self.buffer
+        i = buffer.end % buffer.capacity
+        self.epoch[i] = contents.epoch
+        memmove(buffer.address + i * buffer.dtype.itemsize + self.payload_offset,
+                contents.value, self.payload_size)
+        self.arrival[i] = time.time()
+        buffer.commit()
 
 
 class MotionTracker:
-    def __init__(self, mac_address, location):
+    def __init__(self, mac_address, location, buffer_capacity=4096, pair_tolerance=0.005,
+                 bus=None):
+        """
+        Streams MetaWear sensor fusion output into preallocated buffers.
+
+        Quaternion and Euler outputs are separate fusion signals, each with
+        its own subscription. Their callbacks only copy the raw payload and
+        board epoch into a ring-buffer slot, so very little time is spent on
+        the BLE thread. Both buffers are ``StreamBus`` topics; consumers call
+        ``subscribe()`` and get paired samples in host time.
+
+        Args:
+            mac_address: Board MAC address
+            location: Body location label ('chest', 'mobile', ...)
+            buffer_capacity: Records per signal buffer
+            pair_tolerance: Largest epoch difference (seconds) for pairing a
+                quaternion with an Euler sample
+            bus: ``StreamBus`` to publish on; a private one by default
+        """
         self.device = MetaWear(mac_address)
         self.device.connect()
         self.location = location
-        self.data_queue = queue.Queue()
-
-        libmetawear.mbl_mw_settings_set_connection_parameters(
-            self.device.board, 100, 100, 0, 6000)
-
-        libmetawear.mbl_mw_sensor_fusion_enable_data(
-            self.device.board,
-            SensorFusionData.EULER_ANGLE)
-        libmetawear.mbl_mw_sensor_fusion_enable_data(
-            self.device.board,
-            SensorFusionData.QUATERNION)
-
-        self.callback = FnVoid_VoidP_DataP(self._handle_data)
-
-    def _handle_data(self, ctx, data):
-        euler_angles = cast(data.contents.value, POINTER(EulerAngles)).contents
-        quaternion = cast(data.contents.value, POINTER(Quaternion)).contents
-
-        motion_data = {
-            'timestamp': time.time(),
-            'location': self.location,
-            'pitch': euler_angles.pitch,
-            'roll': euler_angles.roll,
-            'yaw': euler_angles.yaw,
-            'quat_w': quaternion.w,
-            'quat_x': quaternion.x,
-            'quat_y': quaternion.y,
-            'quat_z': quaternion.z
-        }
-        self.data_queue.put(motion_data)
+        self.pair_tolerance = pair_tolerance
+        self.clock = ClockModel(location)
+        self.bus = StreamBus() if bus is None else bus
+        self.quaternion_buffer = self.bus.topic(f'{location}_quaternion', QUATERNION_SLOT,
+                                                buffer_capacity)
+        self.euler_buffer = self.bus.topic(f'{location}_euler', EULER_SLOT, buffer_capacity)
+        self._clock_feed = self.quaternion_buffer.subscribe('clock')
+        self._clock_lock = threading.Lock()
+
+        board = self.device.board
+        libmetawear.mbl_mw_settings_set_connection_parameters(board, 100, 100, 0, 6000)
+        libmetawear.mbl_mw_sensor_fusion_set_mode(board, SensorFusionMode.NDOF)
+        libmetawear.mbl_mw_sensor_fusion_write_config(board)
+
+        # Keep references to the ctypes callbacks so they are not collected
+        self.quaternion_callback = FnVoid_VoidP_DataP(_SlotWriter(self.quaternion_buffer))
+        self.euler_callback = FnVoid_VoidP_DataP(_SlotWriter(self.euler_buffer))
+        self.quaternion_signal = libmetawear.mbl_mw_sensor_fusion_get_data_signal(
+            board, SensorFusionData.QUATERNION)
+        self.euler_signal = libmetawear.mbl_mw_sensor_fusion_get_data_signal(
+            board, SensorFusionData.EULER_ANGLE)
+        libmetawear.mbl_mw_datasignal_subscribe(self.quaternion_signal, None,
+                                                self.quaternion_callback)
+        libmetawear.mbl_mw_datasignal_subscribe(self.euler_signal, None, self.euler_callback)
+
+        libmetawear.mbl_mw_sensor_fusion_enable_data(board, SensorFusionData.EULER_ANGLE)
+        libmetawear.mbl_mw_sensor_fusion_enable_data(board, SensorFusionData.QUATERNION)
+
+    def subscribe(self, name, policy='drop_oldest', max_lag=None):
+        """
+        Paired quaternion/Euler samples for one consumer.
+
+        Args:
+            name: Subscriber name
+            policy, max_lag: Overflow policy, see ``Subscription``
+
+        Returns:
+            ``MotionSubscription`` whose ``read()`` returns ``MOTION_DTYPE``
+            batches
+        """
+        return MotionSubscription(self, name, policy, max_lag)
+
+    def observe_clock(self):
+        """
+        Feeds newly arrived epoch/arrival pairs into the clock model.
+
+        Called by every ``MotionSubscription.read``; the lock makes sure only
+        one consumer thread updates the model while the others go on.
+        """
+        if not self._clock_lock.acquire(blocking=False):
+            return
+        try:
+            batch = self._clock_feed.read()
+            while len(batch):
+                self.clock.observe_batch(batch['epoch'] / 1000.0, batch['arrival'])
+                batch = self._clock_feed.read()
+        finally:
+            self._clock_lock.release()
 
     def start_streaming(self):
         libmetawear.mbl_mw_sensor_fusion_start(self.device.board)
@@ -50,4 +135,115 @@ class MotionTracker:
 
     def cleanup(self):
         self.stop_streaming()
-        self.device.disconnect()
\ No newline at end of file
+        libmetawear.mbl_mw_datasignal_unsubscribe(self.quaternion_signal)
+        libmetawear.mbl_mw_datasignal_unsubscribe(self.euler_signal)
+        self.device.disconnect()
+
+
+class MotionSubscription:
+    def __init__(self, tracker, name, policy='drop_oldest', max_lag=None):
+        """
+        One consumer's view of a tracker: pairs its quaternion and Euler
+        subscriptions by epoch.
+
+        Args:
+            tracker: ``MotionTracker`` to follow
+            name: Subscriber name
+            policy, max_lag: Overflow policy applied to both signals
+        """
+        self.tracker = tracker
+        self.name = name
+        self.dtype = MOTION_DTYPE
+        self.quaternions = tracker.quaternion_buffer.subscribe(name, policy, max_lag)
+        self.eulers = tracker.euler_buffer.subscribe(name, policy, max_lag)
+        self._pending = {'quaternion': np.empty(0, QUATERNION_SLOT),
+                         'euler': np.empty(0, EULER_SLOT)}
+        self._newest_quaternion = None
+
+    def _take(self, name, subscription):
+        """New slots of one signal, prefixed by samples held back last time."""
+        parts = [self._pending[name]]
+        batch = subscription.read()
+        while len(batch):
+            parts.append(batch.copy())
+            batch = subscription.read()
+        return np.concatenate(parts)
+
+    def read(self):
+        """
+        Returns all newly paired samples as a ``MOTION_DTYPE`` array.
+
+        A quaternion is emitted once an Euler sample at or after its epoch
+        has arrived, so pairs are never split across calls. Quaternions
+        without an Euler sample within ``pair_tolerance`` get NaN angles.
+
+        If one signal stalls or never starts, the other is not held back:
+        quaternions more than ``pair_tolerance`` older than the newest
+        quaternion are emitted with NaN angles, and Euler samples more than
+        ``pair_tolerance`` older than the newest Euler sample and later than
+        every quaternion seen are emitted with a NaN quaternion.
+        """
+        self.tracker.observe_clock()
+        quaternions = self._take('quaternion', self.quaternions)
+        eulers = self._take('euler', self.eulers)
+        q_epoch, e_epoch = quaternions['epoch'], eulers['epoch']
+        tolerance = self.tracker.pair_tolerance * 1000.0
+        if len(q_epoch):
+            self._newest_quaternion = q_epoch[-1]
+
+        n_quat = 0
+        if len(q_epoch):
+            n_quat = np.searchsorted(q_epoch, q_epoch[-1] - tolerance, side='left')
+            if len(e_epoch):
+                n_quat = max(n_quat, np.searchsorted(q_epoch, e_epoch[-1], side='right'))
+
+        # Stale Euler samples no quaternion seen so far can pair with
+        lo = 0 if self._newest_quaternion is None else \
+            np.searchsorted(e_epoch, self._newest_quaternion + tolerance, side='right')
+        hi = np.searchsorted(e_epoch, e_epoch[-1] - tolerance, side='left') if len(e_epoch) else 0
+        orphans = eulers[lo:hi] if hi > lo else eulers[:0]
+
+        # Keep the last Euler sample at or before the emitted quaternions
+        # around as a pairing candidate
+        keep = max(np.searchsorted(e_epoch, q_epoch[n_quat - 1], side='right') - 1, 0) \
+            if n_quat else 0
+        self._pending = {'quaternion': quaternions[n_quat:],
+                         'euler': np.concatenate([eulers[keep:lo], eulers[hi:]])
+                         if hi > lo else eulers[keep:]}
+        quaternions, q_epoch = quaternions[:n_quat], q_epoch[:n_quat]
+
+        out = np.empty(len(quaternions) + len(orphans), MOTION_DTYPE)
+        out['location'] = self.tracker.location
+        paired, unpaired = out[:len(quaternions)], out[len(quaternions):]
+        paired['timestamp'] = self.tracker.clock.to_host(q_epoch / 1000.0)
+        if len(e_epoch) and len(q_epoch):
+            right = np.clip(np.searchsorted(e_epoch, q_epoch), 1, max(len(e_epoch) - 1, 1))
+            left = right - 1
+            if len(e_epoch) > 1:
+                nearest = np.where(np.abs(e_epoch[right] - q_epoch) < np.abs(q_epoch - e_epoch[left]),
+                                   right, left)
+            else:
+                nearest = np.zeros(len(q_epoch), dtype=np.intp)
+            matched = np.abs(e_epoch[nearest] - q_epoch) <= tolerance
+            for field in ('pitch', 'roll', 'yaw'):
+                paired[field] = np.where(matched, eulers[field][nearest], np.nan)
+        else:
+            for field in ('pitch', 'roll', 'yaw'):
+                paired[field] = np.nan
+        for field in ('w', 'x', 'y', 'z'):
+            paired[f'quat_{field}'] = quaternions[field]
+
+        unpaired['timestamp'] = self.tracker.clock.to_host(orphans['epoch'] / 1000.0)
+        for field in ('pitch', 'roll', 'yaw'):
+            unpaired[field] = orphans[field]
+        for field in ('w', 'x', 'y', 'z'):
+            unpaired[f'quat_{field}'] = np.nan
+        return out
+
+    def wait(self, timeout=None):
+        """Blocks until new quaternions arrive or ``timeout`` expires."""
+        return self.quaternions.wait(timeout)
+
+    def close(self):
+        self.quaternions.close()
+        self.eulers.close()
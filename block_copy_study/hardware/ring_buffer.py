@@ -0,0 +1,267 @@
+# ring_buffer.py
+# hardware/ring_buffer.py
+import ctypes
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring buffer over a preallocated NumPy array.
+
+    Every sample is stored twice, at ``i % capacity`` and ``i % capacity +
+    capacity``, so any run of up to ``capacity`` consecutive samples is a
+    contiguous slice and can be handed out as a zero-copy view. Samples are
+    addressed by absolute index: ``start`` is the oldest retained sample,
+    ``end`` is one past the newest. Appending past capacity overwrites the
+    oldest samples.
+    """
+
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(2 * self.capacity, dtype=self.dtype)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def append(self, value):
+        pos = self.end % self.capacity
+        self._data[pos] = value
+        self._data[pos + self.capacity] = value
+        self.end += 1
+        if self.end - self.start > self.capacity:
+            self.start = self.end - self.capacity
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.dtype)
+        if len(values) > self.capacity:
+            self.end += len(values) - self.capacity
+            values = values[-self.capacity:]
+        self._store(self.end, values)
+        self.end += len(values)
+        self.start = max(self.start, self.end - self.capacity)
+
+    def write(self, start, values):
+        """Overwrites retained samples beginning at absolute index ``start``."""
+        values = np.asarray(values, dtype=self.dtype)
+        if start < self.start or start + len(values) > self.end:
+            raise IndexError("Write outside the retained window")
+        self._store(start, values)
+
+    def view(self, start=None, end=None):
+        """Zero-copy view of samples ``[start, end)`` (absolute indices)."""
+        start = self.start if start is None else max(start, self.start)
+        end = self.end if end is None else min(end, self.end)
+        pos = start % self.capacity
+        return self._data[pos:pos + max(end - start, 0)]
+
+    def last(self):
+        return self._data[(self.end - 1) % self.capacity]
+
+    def discard(self, n):
+        """Drops the ``n`` oldest samples."""
+        self.start = min(self.start + n, self.end)
+
+    def clear(self):
+        self.start = self.end
+
+    def _store(self, start, values):
+        pos = start % self.capacity
+        first = min(len(values), self.capacity - pos)
+        for offset in (0, self.capacity):
+            self._data[pos + offset:pos + offset + first] = values[:first]
+            self._data[offset:offset + len(values) - first] = values[first:]
+
+
+class TimestampRingBuffer(RingBuffer):
+    """Ring buffer of sorted timestamps with eviction by sample time."""
+
+    def __init__(self, capacity):
+        super().__init__(capacity, dtype=np.float64)
+
+    def evict_before(self, cutoff):
+        """Drops every timestamp older than ``cutoff``; O(1) when none are."""
+        if not len(self) or self._data[self.start % self.capacity] >= cutoff:
+            return
+        self.start += int(np.searchsorted(self.view(), cutoff, side='left'))
+
+    def insert(self, values):
+        """
+        Merges timestamps that are older than the newest retained one.
+
+        This is the slow path for out-of-order samples; it rewrites the
+        retained window in sorted order.
+        """
+        merged = np.sort(np.concatenate([self.view(), np.asarray(values, dtype=np.float64)]))
+        self.start = self.end
+        self.extend(merged)
+
+
+class SPSCRingBuffer:
+    """
+    Single-producer/single-consumer ring buffer of fixed-size records.
+
+    The producer writes each record straight into a preallocated slot with
+    ``append``. The consumer takes published records with ``read``, which
+    returns a contiguous zero-copy view running up to the newest record or
+    the wrap point, whichever comes first; call it until it returns an empty
+    batch to drain everything. A view stays valid until the producer has
+    written another ``capacity`` records, so size the buffer for a few
+    seconds of data. If the producer laps the consumer, the overwritten
+    records are skipped and counted in ``dropped``.
+    """
+
+    def __init__(self, capacity, dtype):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(self.capacity, dtype=self.dtype)
+        self.address = self._data.ctypes.data
+        self.end = 0
+        self.read_index = 0
+        self.dropped = 0
+
+    def append(self, record):
+        self._data[self.end % self.capacity] = record
+        self.end += 1
+
+    def field(self, name):
+        """
+        Writable view of one field across all slots.
+
+        Together with ``address`` this lets a producer fill the slot at
+        ``end % capacity`` in place (e.g. with ``ctypes.memmove``) and then
+        publish it with ``commit``.
+        """
+        return self._data[name]
+
+    def commit(self):
+        """Publishes the slot at ``end % capacity`` after it was filled in place."""
+        self.end += 1
+
+    def extend(self, records):
+        """Writes a batch of records and publishes them with one index update."""
+        n = len(records)
+        records = records[max(n - self.capacity, 0):]
+        end = self.end
+        pos = (end + n - len(records)) % self.capacity
+        first = min(len(records), self.capacity - pos)
+        self._data[pos:pos + first] = records[:first]
+        self._data[:len(records) - first] = records[first:]
+        self.end = end + n
+
+    def available(self):
+        return min(self.end - self.read_index, self.capacity)
+
+    def read(self, max_records=None):
+        end = self.end
+        if end - self.read_index > self.capacity:
+            self.dropped += end - self.capacity - self.read_index
+            self.read_index = end - self.capacity
+        pos = self.read_index % self.capacity
+        n = min(end - self.read_index, self.capacity - pos)
+        if max_records is not None:
+            n = min(n, max_records)
+        self.read_index += n
+        return self._data[pos:pos + n]
+
+    def read_since(self, index, max_records=None):
+        """
+        Non-consuming read for observers such as a live plot.
+
+        Args:
+            index: Absolute index of the first record wanted (start at ``end``
+                to see only new records)
+            max_records: Optional cap on the batch size
+
+        Returns:
+            Tuple of (contiguous view, index to pass next time). Records the
+            producer has already overwritten are skipped.
+        """
+        end = self.end
+        index = max(index, end - self.capacity)
+        pos = index % self.capacity
+        n = min(end - index, self.capacity - pos)
+        if max_records is not None:
+            n = min(n, max_records)
+        return self._data[pos:pos + n], index + n
+
+
+class SharedSPSCRingBuffer(SPSCRingBuffer):
+    """
+    ``SPSCRingBuffer`` whose records and write index live in shared memory.
+
+    The acquisition process creates the buffer; another process attaches to
+    it by ``shm_name`` and reads it through its own cursor (``read_since``),
+    without copying anything through a pipe. The write index is an int64
+    header in front of the records, published after each record is written.
+    """
+
+    HEADER_SIZE = 8
+
+    def __init__(self, capacity, dtype, shm_name=None, readonly=False):
+        """
+        Args:
+            capacity: Number of records
+            dtype: Record dtype
+            shm_name: Attach to this existing segment instead of creating one
+            readonly: Map the records and index read-only (for consumers)
+        """
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        size = self.HEADER_SIZE + self.capacity * self.dtype.itemsize
+        self.owner = shm_name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name=shm_name, track=False)
+            except TypeError:
+                # track was added in Python 3.13; spawned children share the
+                # creator's resource tracker, so attaching is harmless there
+                self.shm = shared_memory.SharedMemory(name=shm_name)
+        self._header = ctypes.c_int64.from_buffer(self.shm.buf)
+        self._data = np.ndarray(self.capacity, dtype=self.dtype, buffer=self.shm.buf,
+                                offset=self.HEADER_SIZE)
+        if self.owner:
+            self._header.value = 0
+        if readonly:
+            self._data.flags.writeable = False
+        self.address = self._data.ctypes.data
+        self.read_index = self.end
+        self.dropped = 0
+
+    @property
+    def shm_name(self):
+        return self.shm.name
+
+    @property
+    def end(self):
+        return self._header.value
+
+    @end.setter
+    def end(self, value):
+        self._header.value = value
+
+    def append(self, record):
+        header = self._header
+        end = header.value
+        self._data[end % self.capacity] = record
+        header.value = end + 1
+
+    def commit(self):
+        self._header.value += 1
+
+    def close(self):
+        """Unmaps the segment; the creating side also frees it."""
+        self._header = None
+        self._data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A consumer still holds a view; the mapping goes with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
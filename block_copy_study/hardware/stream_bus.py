@@ -0,0 +1,209 @@
+# stream_bus.py
+# hardware/stream_bus.py
+import threading
+from .ring_buffer import SPSCRingBuffer, SharedSPSCRingBuffer
+
+
+POLICIES = ('drop_oldest', 'latest')
+
+
+class Subscription:
+    def __init__(self, topic, name, policy='drop_oldest', max_lag=None):
+        """
+        One consumer's cursor over a topic.
+
+        Reads return zero-copy views of the topic's shared buffer; nothing is
+        copied per subscriber. The producer never waits for anyone, so a
+        slow subscriber only ever affects itself, according to its policy:
+
+        - ``'drop_oldest'``: read every record; if the producer laps this
+          cursor, the overwritten records are skipped and counted in
+          ``dropped``. Use for the logger, sized so this never happens.
+        - ``'latest'``: never fall more than ``max_lag`` records behind; older
+          records are skipped (counted in ``skipped``). Use for live views,
+          which want fresh data rather than a backlog.
+
+        Args:
+            topic: ``Topic`` to follow
+            name: Subscriber name used in ``StreamBus.stats``
+            policy: Overflow policy, one of ``POLICIES``
+            max_lag: Records kept behind the head with the 'latest' policy
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown subscription policy: {policy}")
+        if policy == 'latest' and max_lag is None:
+            raise ValueError("The 'latest' policy needs max_lag")
+        self.topic = topic
+        self.name = name
+        self.policy = policy
+        self.max_lag = max_lag
+        self.index = topic.end  # Only records published from now on
+        self.dropped = 0
+        self.skipped = 0
+
+    @property
+    def dtype(self):
+        return self.topic.dtype
+
+    def lag(self):
+        """Records published but not yet read."""
+        return self.topic.end - self.index
+
+    def wait(self, timeout=None):
+        """
+        Blocks until unread records are available or ``timeout`` expires.
+
+        Returns:
+            True if records are available
+        """
+        return self.topic.wait_beyond(self.index, timeout)
+
+    def read(self, max_records=None):
+        """
+        Returns the next contiguous batch of records as a view.
+
+        Like ``SPSCRingBuffer.read``, a batch stops at the buffer's wrap
+        point; call until it returns an empty batch to catch up fully.
+        """
+        end = self.topic.end
+        lag = end - self.index
+        if self.policy == 'latest' and lag > self.max_lag:
+            self.skipped += lag - self.max_lag
+            self.index = end - self.max_lag
+        elif lag > self.topic.capacity:
+            self.dropped += lag - self.topic.capacity
+        batch, self.index = self.topic.read_since(self.index, max_records)
+        return batch
+
+    def close(self):
+        self.topic.unsubscribe(self)
+
+
+class Topic(SPSCRingBuffer):
+    def __init__(self, name, capacity, dtype, **kwargs):
+        """
+        A published stream: one producer, any number of subscriptions.
+
+        The producer side is the ``SPSCRingBuffer`` API (``append``, or
+        ``field``/``address``/``commit`` for in-place writes), so device
+        callbacks are unchanged. Consumers call ``subscribe`` and read
+        through their own ``Subscription``.
+
+        Args:
+            name: Topic name, e.g. 'neon_gaze' or 'chest_quaternion'
+            capacity: Records kept in the shared buffer
+            dtype: Record dtype
+        """
+        super().__init__(capacity, dtype, **kwargs)
+        self.name = name
+        self.subscriptions = []
+        self._ready = threading.Event()
+        self._waiters = 0
+
+    def append(self, record):
+        super().append(record)
+        # Waking consumers costs the producer nothing unless one is waiting
+        if self._waiters:
+            self._ready.set()
+
+    def commit(self):
+        super().commit()
+        if self._waiters:
+            self._ready.set()
+
+    def extend(self, records):
+        super().extend(records)
+        if self._waiters:
+            self._ready.set()
+
+    def wait_beyond(self, index, timeout=None):
+        """Blocks until the write index passes ``index`` or ``timeout`` expires."""
+        self._waiters += 1
+        try:
+            self._ready.clear()
+            # Checked after registering, so a record published in between
+            # either shows up here or sets the event
+            if self.end > index:
+                return True
+            self._ready.wait(timeout)
+            return self.end > index
+        finally:
+            self._waiters -= 1
+
+    def subscribe(self, name, policy='drop_oldest', max_lag=None):
+        subscription = Subscription(self, name, policy, max_lag)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+
+
+class SharedTopic(Topic, SharedSPSCRingBuffer):
+    """
+    Topic in shared memory, readable from other processes.
+
+    ``spec()`` describes the topic in a picklable form; another process
+    calls ``SharedTopic.attach(spec)`` and subscribes to the result like to
+    any local topic.
+    """
+
+    def spec(self):
+        return {'name': self.name, 'capacity': self.capacity,
+                'dtype': self.dtype, 'shm_name': self.shm_name}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec['name'], spec['capacity'], spec['dtype'],
+                   shm_name=spec['shm_name'], readonly=True)
+
+
+class StreamBus:
+    def __init__(self, shared=False):
+        """
+        Registry of device topics.
+
+        Each device publishes every sample once into its topic; the logger,
+        visualizer, synchronizer and calibrator each subscribe with their
+        own cursor and overflow policy.
+
+        Args:
+            shared: Create topics in shared memory so that another process
+                (the out-of-process visualizer) can subscribe to them
+        """
+        self.shared = shared
+        self.topics = {}
+
+    def topic(self, name, dtype, capacity):
+        """Returns the topic ``name``, creating it on first use."""
+        topic = self.topics.get(name)
+        if topic is None:
+            topic_class = SharedTopic if self.shared else Topic
+            topic = self.topics[name] = topic_class(name, capacity, dtype)
+        elif topic.dtype != dtype:
+            raise ValueError(f"Topic {name} already exists with a different dtype")
+        return topic
+
+    def subscribe(self, topic, name, policy='drop_oldest', max_lag=None):
+        return self.topics[topic].subscribe(name, policy, max_lag)
+
+    def stats(self):
+        """Lag, drops and skips of every subscription, for the sync report."""
+        return {
+            topic.name: {
+                subscription.name: {
+                    'lag': subscription.lag(),
+                    'dropped': subscription.dropped,
+                    'skipped': subscription.skipped
+                }
+                for subscription in topic.subscriptions
+            }
+            for topic in self.topics.values()
+        }
+
+    def close(self):
+        """Releases shared-memory topics; call once every producer has stopped."""
+        for topic in self.topics.values():
+            if isinstance(topic, SharedTopic):
+                topic.close()
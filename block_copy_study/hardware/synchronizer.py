@@ -1,42 +1,229 @@
 # synchronizer.py
 # hardware/synchronizer.py
-import numpy as np
+import threading
 import time
-from collections import defaultdict
+import numpy as np
+from .ring_buffer import TimestampRingBuffer
+
+
+def sync_dtype(streams):
+    """Record of one ``check_sync`` snapshot: mean and max lag (ms) of every pair."""
+    pairs = [(stream1, stream2) for i, stream1 in enumerate(streams)
+             for stream2 in streams[i + 1:]]
+    return np.dtype([('timestamp', 'f8')] +
+                    [(f'{stream1}_{stream2}_{stat}', 'f8')
+                     for stream1, stream2 in pairs for stat in ('mean', 'max')])
+
+
+class _PairLag:
+    """Nearest-neighbour lag of every live ``stream1`` sample into ``stream2``."""
+
+    def __init__(self):
+        self.lags = np.empty(0)
+        self.start = 0          # absolute stream1 index of lags[0]
+        self.ref_start = 0      # stream2 window at the last update
+        self.ref_end = 0
+        self.ref_last = None    # newest stream2 timestamp at the last update
+        self.stats = None
+
+
+def _nearest_lags(t1, t2):
+    """Vectorized |t1 - nearest(t2)| for sorted, non-empty ``t2``."""
+    if len(t2) == 1:
+        return np.abs(t1 - t2[0])
+    idx = np.clip(np.searchsorted(t2, t1), 1, len(t2) - 1)
+    return np.minimum(np.abs(t1 - t2[idx - 1]), np.abs(t2[idx] - t1))
 
 
 class DataSynchronizer:
-    def __init__(self, streams=['gaze', 'head', 'chest', 'mobile']):
+    def __init__(self, streams=['gaze', 'head', 'chest', 'mobile'], capacity=4096):
+        """
+        Tracks recent timestamps of each stream and reports pairwise lag.
+
+        Args:
+            streams: Names of the streams to compare
+            capacity: Maximum number of timestamps retained per stream; must
+                cover ``sync_window`` at the fastest stream rate
+        """
         self.streams = streams
-        self.timestamps = defaultdict(list)
+        self.timestamps = {stream: TimestampRingBuffer(capacity) for stream in streams}
         self.sync_window = 5.0  # seconds
+        self._pairs = {(stream1, stream2): _PairLag()
+                       for i, stream1 in enumerate(streams)
+                       for stream2 in streams[i + 1:]}
 
     def add_timestamp(self, stream, timestamp):
-        self.timestamps[stream].append(timestamp)
-        self._cleanup_old_timestamps()
+        window = self.timestamps[stream]
+        if len(window) and timestamp < window.last():
+            window.insert([timestamp])
+            self._invalidate(stream)
+        else:
+            window.append(timestamp)
+        window.evict_before(timestamp - self.sync_window)
+
+    def add_timestamps(self, stream, timestamps):
+        """
+        Adds a batch of timestamps, e.g. everything a device callback drained.
+
+        Args:
+            stream: Stream name
+            timestamps: 1-D array of sample timestamps in seconds
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not len(timestamps):
+            return
+        window = self.timestamps[stream]
+        if np.any(np.diff(timestamps) < 0) or len(window) and timestamps[0] < window.last():
+            window.insert(timestamps)
+            self._invalidate(stream)
+        else:
+            window.extend(timestamps)
+        window.evict_before(window.last() - self.sync_window)
+
+    def _evict_stale(self):
+        """Ages every stream against the newest sample seen on any stream."""
+        newest = max((window.last() for window in self.timestamps.values() if len(window)),
+                     default=None)
+        if newest is not None:
+            for window in self.timestamps.values():
+                window.evict_before(newest - self.sync_window)
+
+    def _invalidate(self, stream):
+        """Forces a full lag recompute for every pair involving ``stream``."""
+        for (stream1, stream2), pair in self._pairs.items():
+            if stream in (stream1, stream2):
+                pair.ref_last = None
 
-    def _cleanup_old_timestamps(self):
-        current_time = time.time()
-        for stream in self.streams:
-            self.timestamps[stream] = [t for t in self.timestamps[stream]
-                                       if current_time - t < self.sync_window]
+    def _update_pair(self, stream1, stream2, pair):
+        """
+        Brings the lag column of ``stream1`` against ``stream2`` up to date.
+
+        Only samples whose nearest neighbour can have changed are recomputed:
+        new ``stream1`` samples, samples past the previous newest ``stream2``
+        timestamp, and samples before the ``stream2`` head when old ``stream2``
+        samples were evicted. Returns False when nothing changed.
+        """
+        window1, window2 = self.timestamps[stream1], self.timestamps[stream2]
+        t1, t2 = window1.view(), window2.view()
+        if not len(t1) or not len(t2):
+            pair.ref_last = None
+            pair.stats = None
+            return False
+
+        computed_end = pair.start + len(pair.lags)
+        if (pair.ref_last is not None and pair.start == window1.start
+                and computed_end == window1.end
+                and (pair.ref_start, pair.ref_end) == (window2.start, window2.end)):
+            return False
+
+        if (pair.ref_last is None or computed_end <= window1.start
+                or window2.start >= pair.ref_end):
+            lags = _nearest_lags(t1, t2)
+        else:
+            valid = pair.lags[window1.start - pair.start:]
+            lags = np.empty(len(t1))
+            lags[:len(valid)] = valid
+            tail = len(valid)
+            if window2.end != pair.ref_end:
+                tail = min(tail, int(np.searchsorted(t1, pair.ref_last, side='left')))
+            lags[tail:] = _nearest_lags(t1[tail:], t2)
+            if window2.start != pair.ref_start:
+                head = min(int(np.searchsorted(t1, t2[0], side='right')), tail)
+                lags[:head] = _nearest_lags(t1[:head], t2)
+
+        pair.lags = lags
+        pair.start = window1.start
+        pair.ref_start, pair.ref_end = window2.start, window2.end
+        pair.ref_last = t2[-1]
+        return True
 
     def check_sync(self):
+        self._evict_stale()
         sync_stats = {}
-        for i, stream1 in enumerate(self.streams):
-            for stream2 in self.streams[i + 1:]:
-                diffs = []
-                for t1 in self.timestamps[stream1]:
-                    if self.timestamps[stream2]:
-                        closest_t2 = min(self.timestamps[stream2],
-                                         key=lambda t: abs(t - t1))
-                        diffs.append(abs(t1 - closest_t2))
-
-                if diffs:
-                    sync_stats[f'{stream1}-{stream2}'] = {
-                        'mean_diff': np.mean(diffs),
-                        'std_diff': np.std(diffs),
-                        'max_diff': max(diffs)
-                    }
-
-        return sync_stats
\ No newline at end of file
+        for (stream1, stream2), pair in self._pairs.items():
+            if self._update_pair(stream1, stream2, pair):
+                diffs = pair.lags
+                pair.stats = {
+                    'mean_diff': float(np.mean(diffs)),
+                    'std_diff': float(np.std(diffs)),
+                    'max_diff': float(np.max(diffs))
+                }
+            if pair.stats is not None:
+                sync_stats[f'{stream1}-{stream2}'] = pair.stats
+
+        return sync_stats
+
+
+class SyncStage(threading.Thread):
+    def __init__(self, synchronizer, readers, bus=None, capacity=1024, poll_interval=0.05,
+                 check_interval=0.5):
+        """
+        Background thread feeding a ``DataSynchronizer`` from the bus.
+
+        Every reader's host timestamps are drained into ``add_timestamps``.
+        Every ``check_interval`` seconds the pairwise lags are recomputed;
+        the latest result is kept in ``stats`` and published on the bus
+        topic 'sync' (lags in ms) for the live view.
+
+        Args:
+            synchronizer: ``DataSynchronizer`` whose streams name the readers
+            readers: Subscriptions keyed by synchronizer stream name
+            bus: ``StreamBus`` to publish on; without one only ``stats`` is kept
+            capacity: Records kept in the 'sync' topic
+            poll_interval: Longest wait for new samples in seconds
+            check_interval: Seconds between ``check_sync`` runs
+        """
+        super().__init__(daemon=True)
+        self.synchronizer = synchronizer
+        self.readers = readers
+        self.dtype = sync_dtype(synchronizer.streams)
+        self.topic = None if bus is None else bus.topic('sync', self.dtype, capacity)
+        self.poll_interval = poll_interval
+        self.check_interval = check_interval
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        first = next(iter(self.readers.values()))
+        last_check = 0.0
+        while not self._stop_event.is_set():
+            first.wait(self.poll_interval)
+            self.process()
+            if time.time() - last_check >= self.check_interval:
+                self.check()
+                last_check = time.time()
+        self.process()
+        self.check()
+
+    def process(self):
+        """Drains every reader into the synchronizer."""
+        with self._lock:
+            for name, reader in self.readers.items():
+                batch = reader.read()
+                while len(batch):
+                    self.synchronizer.add_timestamps(name, batch['timestamp'])
+                    batch = reader.read()
+
+    def check(self):
+        """Recomputes the pairwise lags, stores them in ``stats`` and publishes them."""
+        with self._lock:
+            stats = self.synchronizer.check_sync()
+        self.stats = stats
+        if self.topic is None:
+            return stats
+        record = np.full(1, np.nan, self.dtype)
+        record['timestamp'] = time.time()
+        for pair, values in stats.items():
+            stream1, stream2 = pair.split('-')
+            record[f'{stream1}_{stream2}_mean'] = values['mean_diff'] * 1000.0
+            record[f'{stream1}_{stream2}_max'] = values['max_diff'] * 1000.0
+        self.topic.extend(record)
+        return stats
+
+    def stop(self):
+        """Stops after a final drain; ``stats`` then covers the end of the session."""
+        self._stop_event.set()
+        self.join()
+        for reader in self.readers.values():
+            reader.close()
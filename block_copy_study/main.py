@@ -4,26 +4,46 @@ from visualization import ExperimentVisualizer, DataVisualizer
 from experiment import BlockCopyExperiment, DataLogger
 from utils import IMUCalibrator, CoordinateTransformer
 from experiment.trial_manager import BlockCopyExperiment
-from visualization.real_time_viz import ExperimentVisualizer
+from visualization.real_time_viz import ExperimentVisualizer, VisualizerProcess
 import argparse
+import asyncio
 
 
 def main():
     parser = argparse.ArgumentParser(description='Block Copy Experiment')
     parser.add_argument('participant_id', type=int, help='Participant ID number')
     parser.add_argument('--output_dir', default='data/', help='Output directory for data files')
+    parser.add_argument('--async_acquisition', action='store_true',
+                        help='Drive all devices from one asyncio event loop')
+    parser.add_argument('--viz_process', action='store_true',
+                        help='Render the live view in a separate process over shared memory')
     args = parser.parse_args()
 
-    experiment = BlockCopyExperiment(args.participant_id, args.output_dir)
-    visualizer = ExperimentVisualizer(experiment)
+    experiment = BlockCopyExperiment(args.participant_id, args.output_dir,
+                                     use_async=args.async_acquisition,
+                                     shared_bus=args.viz_process)
+    if args.viz_process:
+        visualizer = VisualizerProcess(experiment)
+    else:
+        visualizer = ExperimentVisualizer(experiment)
+
+    if args.async_acquisition:
+        try:
+            asyncio.run(experiment.run_async(
+                on_ready=visualizer.start if args.viz_process else None))
+        finally:
+            if args.viz_process:
+                visualizer.stop()
+        return
 
     try:
-        experiment.initialize_hardware()
         visualizer.start()
         experiment.run()
     except Exception as e:
         print(f"Experiment error: {e}")
     finally:
+        if args.viz_process:
+            visualizer.stop()
         experiment.cleanup()
 
 
@@ -0,0 +1,64 @@
+# tests/test_clock_sync.py
+import asyncio
+from types import SimpleNamespace
+import time
+import numpy as np
+from hardware.clock_sync import ClockModel, time_echo_offset
+from hardware import async_acquisition
+from hardware.async_acquisition import AsyncNeonDevice
+from hardware.eye_tracker import NeonEyeTracker
+
+
+def stub_estimate(offset_ms):
+    """Realtime API estimate whose client-minus-Companion offset is ``offset_ms``."""
+    return SimpleNamespace(time_offset_ms=SimpleNamespace(mean=offset_ms))
+
+
+def stub_tracker(estimate):
+    tracker = NeonEyeTracker.__new__(NeonEyeTracker)
+    tracker.device = SimpleNamespace(estimate_time_offset=lambda: estimate)
+    tracker.clock = ClockModel('neon')
+    return tracker
+
+
+def test_time_echo_offset_is_host_minus_device():
+    assert time_echo_offset(stub_estimate(250.0)) == 0.25
+    assert time_echo_offset(stub_estimate(-40.0)) == -0.04
+
+
+def test_estimate_maps_device_time_to_host():
+    tracker = stub_tracker(stub_estimate(250.0))
+    assert tracker.estimate_clock_offset() == 0.25
+    assert np.isclose(tracker.clock.to_host(1000.0), 1000.25)
+
+
+def test_estimate_overrides_arrival_delay():
+    # Neon timestamps are Unix time; arrival pairs carry 10-30 ms of
+    # transport delay on top of the true offset
+    tracker = stub_tracker(stub_estimate(250.0))
+    device = time.time() - 0.25 - 3.0 + np.arange(600) / 200.0
+    delay = np.random.default_rng(0).uniform(0.01, 0.03, len(device))
+    tracker.clock.observe_batch(device, device + 0.25 + delay)
+    tracker.estimate_clock_offset()
+    assert tracker.clock.source == 'estimate'
+    assert np.isclose(tracker.clock.to_host(device[-1]), device[-1] + 0.25, rtol=0, atol=1e-4)
+
+
+def test_missing_estimate_leaves_model_unchanged():
+    tracker = stub_tracker(None)
+    assert tracker.estimate_clock_offset() is None
+    assert tracker.clock.to_host(1000.0) == 1000.0
+
+
+def test_async_estimate_matches_blocking_path(monkeypatch):
+    class Estimator:
+        def __init__(self, address, port):
+            pass
+
+        async def estimate(self):
+            return stub_estimate(250.0)
+    monkeypatch.setattr(async_acquisition, 'TimeOffsetEstimator', Estimator)
+    device = AsyncNeonDevice('neon', '127.0.0.1')
+    device.status = SimpleNamespace(phone=SimpleNamespace(ip='127.0.0.1', time_echo_port=12321))
+    assert asyncio.run(device.estimate_clock_offset()) == 0.25
+    assert np.isclose(device.clock.to_host(1000.0), 1000.25)
@@ -0,0 +1,75 @@
+# tests/test_motion_subscription.py
+from types import SimpleNamespace
+import numpy as np
+from hardware.clock_sync import ClockModel
+from hardware.motion_tracker import EULER_SLOT, QUATERNION_SLOT, MotionSubscription
+from hardware.stream_bus import StreamBus
+
+
+def stub_tracker(pair_tolerance=0.005):
+    bus = StreamBus()
+    return SimpleNamespace(quaternion_buffer=bus.topic('chest_quaternion', QUATERNION_SLOT, 1024),
+                           euler_buffer=bus.topic('chest_euler', EULER_SLOT, 1024),
+                           pair_tolerance=pair_tolerance, location='chest',
+                           clock=ClockModel('chest'), observe_clock=lambda: None)
+
+
+def add_quaternion(tracker, epoch):
+    tracker.quaternion_buffer.append((epoch, 1.0, 0.0, 0.0, 0.0, 0.0))
+
+
+def add_euler(tracker, epoch):
+    tracker.euler_buffer.append((epoch, 0.0, epoch / 1000.0, 2.0, 3.0, 0.0))
+
+
+def test_pairs_are_not_split_across_reads():
+    tracker = stub_tracker()
+    subscription = MotionSubscription(tracker, 'test')
+    rows = []
+    for epoch in range(0, 500, 10):
+        add_quaternion(tracker, epoch)
+        rows.append(subscription.read())
+        add_euler(tracker, epoch)
+        rows.append(subscription.read())
+    rows = np.concatenate(rows)
+    assert len(rows) == 50
+    assert np.allclose(rows['pitch'], rows['timestamp'])
+    assert not np.isnan(rows['quat_w']).any()
+
+
+def test_missing_euler_signal_emits_nan_angles():
+    tracker = stub_tracker()
+    subscription = MotionSubscription(tracker, 'test')
+    for epoch in range(0, 1000, 10):
+        add_quaternion(tracker, epoch)
+    rows = subscription.read()
+    assert len(rows) == 99
+    assert np.isnan(rows['pitch']).all()
+    assert len(subscription._pending['quaternion']) == 1
+
+
+def test_stalled_euler_signal_does_not_hold_back_quaternions():
+    tracker = stub_tracker()
+    subscription = MotionSubscription(tracker, 'test')
+    for epoch in range(0, 200, 10):
+        add_quaternion(tracker, epoch)
+        add_euler(tracker, epoch)
+    first = subscription.read()
+    for epoch in range(200, 2000, 10):
+        add_quaternion(tracker, epoch)
+        subscription.read()
+    assert len(first) == 20 and not np.isnan(first['pitch']).any()
+    assert len(subscription._pending['quaternion']) <= 1
+    assert len(subscription._pending['euler']) <= 1
+
+
+def test_missing_quaternion_signal_emits_euler_rows():
+    tracker = stub_tracker()
+    subscription = MotionSubscription(tracker, 'test')
+    for epoch in range(0, 1000, 10):
+        add_euler(tracker, epoch)
+    rows = subscription.read()
+    assert len(rows) == 99
+    assert np.isnan(rows['quat_w']).all()
+    assert np.allclose(rows['pitch'], rows['timestamp'])
+    assert len(subscription._pending['euler']) == 1
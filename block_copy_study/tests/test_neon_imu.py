@@ -0,0 +1,54 @@
+# tests/test_neon_imu.py
+from types import SimpleNamespace
+import numpy as np
+from hardware.clock_sync import ClockModel
+from hardware.eye_tracker import IMU_DTYPE, NeonEyeTracker
+from hardware.stream_bus import StreamBus
+from utils.stillness import StillnessDetector
+
+
+def stub_tracker():
+    tracker = NeonEyeTracker.__new__(NeonEyeTracker)
+    tracker.imu_buffer = StreamBus().topic('neon_imu', IMU_DTYPE, 64)
+    tracker.clock = ClockModel('neon')
+    tracker._missing_accel = False
+    return tracker
+
+
+def imu_sample(accel=True):
+    """Realtime API ``IMUData`` with gyro, quaternion and optionally accelerometer data."""
+    sample = SimpleNamespace(gyro_data=SimpleNamespace(x=1.0, y=2.0, z=3.0),
+                             quaternion=SimpleNamespace(w=1.0, x=0.0, y=0.0, z=0.0))
+    if accel:
+        sample.accel_data = SimpleNamespace(x=0.0, y=0.0, z=1.0)
+    return sample
+
+
+def test_imu_sample_fields():
+    tracker = stub_tracker()
+    reader = tracker.imu_buffer.subscribe('test')
+    tracker._handle_imu(10.0, imu_sample())
+    row = reader.read()[0]
+    assert [row[f'rotation_{c}'] for c in 'xyz'] == [1.0, 2.0, 3.0]
+    assert [row[f'quaternion_{c}'] for c in 'wxyz'] == [1.0, 0.0, 0.0, 0.0]
+    assert [row[f'acceleration_{c}'] for c in 'xyz'] == [0.0, 0.0, 1.0]
+
+
+def test_missing_accelerometer_is_nan_and_warns_once(capsys):
+    tracker = stub_tracker()
+    reader = tracker.imu_buffer.subscribe('test')
+    for i in range(3):
+        tracker._handle_imu(10.0 + i, imu_sample(accel=False))
+    batch = reader.read()
+    assert len(batch) == 3
+    assert np.isnan(batch['acceleration_x']).all()
+    assert capsys.readouterr().out.count('accel_data') == 1
+
+
+def test_nan_acceleration_is_never_still():
+    detector = StillnessDetector('head', window_size=5, acceleration_variance_threshold=1.0)
+    for i in range(10):
+        assert not detector.update(i * 0.01, (0.0, 0.0, 0.0), (np.nan, np.nan, np.nan))
+    for i in range(10, 20):
+        detector.update(i * 0.01, (0.0, 0.0, 0.0), (0.0, 0.0, 1.0))
+    assert detector.still
@@ -1,5 +1,13 @@
 # utils/__init__.py
 from .calibration import IMUCalibrator
 from .coordinate_sys import CoordinateTransformer, CoordinateSystem
+from .alignment import StreamAligner
+from .aoi import AOI, AOISet, aoi_metrics, aoi_metrics_by_trial
+from .gaze_events import GazeEventDetector, GazeEventStage, detect_events
+from .kinematics import HeadTrunkKinematics, KinematicsStage
+from .stillness import StillnessDetector, StillnessMonitor
 
-__all__ = ['IMUCalibrator', 'CoordinateTransformer', 'CoordinateSystem']
\ No newline at end of file
+__all__ = ['IMUCalibrator', 'CoordinateTransformer', 'CoordinateSystem', 'StreamAligner',
+           'HeadTrunkKinematics', 'KinematicsStage', 'StillnessDetector', 'StillnessMonitor',
+           'GazeEventDetector', 'GazeEventStage', 'detect_events',
+           'AOI', 'AOISet', 'aoi_metrics', 'aoi_metrics_by_trial']
@@ -0,0 +1,266 @@
+# alignment.py
+# utils/alignment.py
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from .quaternions import QUATERNION_COLUMNS
+
+
+@dataclass
+class _Stream:
+    """A recorded stream split into scalar, angular and quaternion channels."""
+    timestamps: np.ndarray
+    scalars: Dict[str, np.ndarray]
+    angles: Dict[str, np.ndarray]
+    quaternion: Optional[np.ndarray] = None  # (N, 4), w-first
+    trial_num: Optional[np.ndarray] = None
+    quaternion_columns: List[str] = field(default_factory=list)
+
+
+def _bracket(t_src: np.ndarray, t_dst: np.ndarray, max_gap: Optional[float]):
+    """
+    Locates the source samples bracketing each target time.
+
+    Returns:
+        Tuple of (left index, right index, interpolation weight, valid mask).
+        A target is invalid if it lies outside the source range or if the
+        bracketing samples are more than ``max_gap`` seconds apart.
+    """
+    right = np.clip(np.searchsorted(t_src, t_dst, side='right'), 1, len(t_src) - 1)
+    left = right - 1
+    span = t_src[right] - t_src[left]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(span > 0, (t_dst - t_src[left]) / span, 0.0)
+    valid = (t_dst >= t_src[0]) & (t_dst <= t_src[-1])
+    if max_gap is not None:
+        valid &= span <= max_gap
+    return left, right, np.clip(weight, 0.0, 1.0), valid
+
+
+def interpolate_linear(t_src: np.ndarray, values: np.ndarray, t_dst: np.ndarray,
+                       max_gap: Optional[float] = None) -> np.ndarray:
+    """
+    Linearly resamples one or more channels onto new timestamps.
+
+    Args:
+        t_src: Sorted source timestamps (N,)
+        values: Source samples (N,) or (N, C)
+        t_dst: Target timestamps (M,)
+        max_gap: Largest source gap in seconds to interpolate across
+
+    Returns:
+        Resampled values (M,) or (M, C); NaN where masked
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(t_src) < 2:
+        return np.full((len(t_dst),) + values.shape[1:], np.nan)
+    left, right, weight, valid = _bracket(t_src, t_dst, max_gap)
+    if values.ndim == 2:
+        weight = weight[:, None]
+        valid = valid[:, None]
+    out = values[left] * (1.0 - weight) + values[right] * weight
+    return np.where(valid, out, np.nan)
+
+
+def interpolate_angle(t_src: np.ndarray, degrees: np.ndarray, t_dst: np.ndarray,
+                      max_gap: Optional[float] = None) -> np.ndarray:
+    """
+    Resamples angles in degrees, interpolating across the wrap point.
+
+    Output keeps the source convention: [0, 360) if the source has no
+    negative angles, otherwise [-180, 180).
+    """
+    degrees = np.asarray(degrees, dtype=np.float64)
+    unwrapped = np.rad2deg(np.unwrap(np.deg2rad(degrees)))
+    out = interpolate_linear(t_src, unwrapped, t_dst, max_gap)
+    lower = -180.0 if np.nanmin(degrees, initial=0.0) < 0 else 0.0
+    return (out - lower) % 360.0 + lower
+
+
+def slerp(t_src: np.ndarray, quats: np.ndarray, t_dst: np.ndarray,
+          max_gap: Optional[float] = None) -> np.ndarray:
+    """
+    Spherically interpolates unit quaternions onto new timestamps.
+
+    Args:
+        t_src: Sorted source timestamps (N,)
+        quats: Source quaternions (N, 4); any component order
+        t_dst: Target timestamps (M,)
+        max_gap: Largest source gap in seconds to interpolate across
+
+    Returns:
+        Unit quaternions (M, 4) in the input component order; NaN where masked
+    """
+    quats = np.asarray(quats, dtype=np.float64)
+    if len(t_src) < 2:
+        return np.full((len(t_dst), 4), np.nan)
+    left, right, weight, valid = _bracket(t_src, t_dst, max_gap)
+    q0, q1 = quats[left], quats[right]
+
+    # q and -q are the same rotation; take the short arc
+    dot = np.einsum('ij,ij->i', q0, q1)
+    q1 = np.where(dot[:, None] < 0, -q1, q1)
+    dot = np.clip(np.abs(dot), 0.0, 1.0)
+
+    theta = np.arccos(dot)
+    sin_theta = np.sin(theta)
+    small = sin_theta < 1e-6
+    safe_sin = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1.0 - weight, np.sin((1.0 - weight) * theta) / safe_sin)
+    w1 = np.where(small, weight, np.sin(weight * theta) / safe_sin)
+
+    out = w0[:, None] * q0 + w1[:, None] * q1
+    out /= np.linalg.norm(out, axis=1, keepdims=True)
+    out[~valid] = np.nan
+    return out
+
+
+def trial_segments(trial_num: np.ndarray) -> List[slice]:
+    """
+    Splits a stream into contiguous runs of equal ``trial_num``.
+
+    Trials are logged sequentially, so a run boundary is a trial boundary
+    even when consecutive trials share a repetition number. Runs tagged 0
+    (no active trial) are skipped.
+    """
+    trial_num = np.asarray(trial_num)
+    if not len(trial_num):
+        return []
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(trial_num)) + 1, [len(trial_num)]])
+    return [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])
+            if trial_num[start] != 0]
+
+
+class StreamAligner:
+    def __init__(self, master: str = 'gaze', rate: Optional[float] = None,
+                 max_gap: float = 0.1):
+        """
+        Resamples multi-rate sensor streams onto a common master clock.
+
+        Scalar channels are linearly interpolated, Euler angles are
+        interpolated on the unwrapped circle and quaternions are slerped.
+        Output samples whose bracketing source samples are more than
+        ``max_gap`` seconds apart are set to NaN.
+
+        Args:
+            master: Stream whose timestamps define the output clock
+            rate: If given, use a uniform clock at this rate (Hz) spanning
+                the master stream instead of its raw timestamps
+            max_gap: Largest source gap in seconds to interpolate across
+        """
+        self.master = master
+        self.rate = rate
+        self.max_gap = max_gap
+        self.streams = {}
+
+    def add_stream(self, name: str, timestamps: np.ndarray, data,
+                   angle_columns=(), quaternion_columns=None):
+        """
+        Registers a stream for alignment.
+
+        Args:
+            name: Stream name; used as the column prefix for non-master streams
+            timestamps: Sample timestamps in seconds (N,)
+            data: DataFrame or dict of equal-length columns
+            angle_columns: Columns holding angles in degrees
+            quaternion_columns: Four (w, x, y, z) columns; defaults to
+                ``quat_w``..``quat_z`` when present
+        """
+        data = pd.DataFrame(data)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        data = data.iloc[order]
+
+        if quaternion_columns is None and all(c in data for c in QUATERNION_COLUMNS):
+            quaternion_columns = QUATERNION_COLUMNS
+        quaternion_columns = list(quaternion_columns or [])
+        skip = set(quaternion_columns) | {'timestamp', 'trial_num'}
+
+        numeric = [c for c in data.columns
+                   if c not in skip and pd.api.types.is_numeric_dtype(data[c])]
+        self.streams[name] = _Stream(
+            timestamps=timestamps,
+            scalars={c: data[c].to_numpy(np.float64) for c in numeric if c not in angle_columns},
+            angles={c: data[c].to_numpy(np.float64) for c in numeric if c in angle_columns},
+            quaternion=data[quaternion_columns].to_numpy(np.float64) if quaternion_columns else None,
+            trial_num=data['trial_num'].to_numpy() if 'trial_num' in data else None,
+            quaternion_columns=quaternion_columns)
+
+    def add_logged_motion(self, motion: pd.DataFrame, angle_columns=('pitch', 'roll', 'yaw')):
+        """Registers one stream per ``location`` of a ``DataLogger`` motion table."""
+        for location, rows in motion.groupby('location', sort=False):
+            self.add_stream(location, rows['timestamp'].to_numpy(), rows,
+                            angle_columns=angle_columns)
+
+    def master_clock(self, start: Optional[float] = None,
+                     end: Optional[float] = None) -> np.ndarray:
+        """Output timestamps between ``start`` and ``end`` (inclusive)."""
+        t = self.streams[self.master].timestamps
+        lo = 0 if start is None else np.searchsorted(t, start, side='left')
+        hi = len(t) if end is None else np.searchsorted(t, end, side='right')
+        t = t[lo:hi]
+        if self.rate is None or not len(t):
+            return t
+        return t[0] + np.arange(int(np.floor((t[-1] - t[0]) * self.rate)) + 1) / self.rate
+
+    def align(self, clock: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Resamples every registered stream onto ``clock``.
+
+        Args:
+            clock: Output timestamps; defaults to the full master clock
+
+        Returns:
+            Wide DataFrame with a ``timestamp`` column, the master stream's
+            channels unprefixed and every other channel as ``<stream>_<column>``
+        """
+        if clock is None:
+            clock = self.master_clock()
+        columns = {'timestamp': clock}
+        for name, stream in self.streams.items():
+            prefix = '' if name == self.master else f'{name}_'
+            t = stream.timestamps
+            if stream.scalars:
+                values = interpolate_linear(t, np.column_stack(list(stream.scalars.values())),
+                                            clock, self.max_gap)
+                for i, column in enumerate(stream.scalars):
+                    columns[prefix + column] = values[:, i]
+            for column, degrees in stream.angles.items():
+                columns[prefix + column] = interpolate_angle(t, degrees, clock, self.max_gap)
+            if stream.quaternion is not None:
+                quats = slerp(t, stream.quaternion, clock, self.max_gap)
+                for i, column in enumerate(stream.quaternion_columns):
+                    columns[prefix + column] = quats[:, i]
+        return pd.DataFrame(columns)
+
+    def align_trials(self, trials: Optional[List[dict]] = None) -> List[pd.DataFrame]:
+        """
+        Produces one aligned wide table per trial.
+
+        Trials are the contiguous ``trial_num`` runs of the master stream.
+
+        Args:
+            trials: Optional trial descriptions in run order (e.g.
+                ``BlockCopyExperiment.trial_sequence``); their keys are added
+                as constant columns to the matching table
+
+        Returns:
+            List of aligned DataFrames, one per trial, in recording order
+        """
+        master = self.streams[self.master]
+        if master.trial_num is None:
+            raise ValueError(f"Master stream '{self.master}' has no trial_num column")
+
+        tables = []
+        for i, segment in enumerate(trial_segments(master.trial_num)):
+            t = master.timestamps[segment]
+            table = self.align(self.master_clock(t[0], t[-1]))
+            table.insert(1, 'trial_num', master.trial_num[segment.start])
+            if trials is not None and i < len(trials):
+                for key, value in trials[i].items():
+                    if key != 'trial_num':
+                        table[key] = value
+            tables.append(table)
+        return tables
@@ -0,0 +1,215 @@
+# aoi.py
+# utils/aoi.py
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+
+@dataclass
+class AOI:
+    """Area of interest: a polygon in scene camera pixels."""
+    name: str
+    vertices: np.ndarray  # (K, 2) polygon corners, in order
+    is_rectangle: bool = False  # Axis-aligned; tested by its bounding box
+
+    def __post_init__(self):
+        self.vertices = np.asarray(self.vertices, dtype=np.float64)
+
+    @classmethod
+    def rectangle(cls, name, x0, y0, x1, y1):
+        return cls(name, [[x0, y0], [x1, y0], [x1, y1], [x0, y1]], is_rectangle=True)
+
+    @property
+    def bbox(self):
+        return (*self.vertices.min(axis=0), *self.vertices.max(axis=0))
+
+    def contains(self, x, y):
+        """Vectorized point-in-polygon test (crossing number)."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        x0, y0, x1, y1 = self.bbox
+        if self.is_rectangle:
+            return (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        inside = np.zeros(x.shape, dtype=bool)
+        vertices = self.vertices
+        for (ax, ay), (bx, by) in zip(vertices, np.roll(vertices, -1, axis=0)):
+            if ay == by:
+                continue
+            crosses = (ay > y) != (by > y)
+            inside ^= crosses & (x < ax + (y - ay) * (bx - ax) / (by - ay))
+        return inside
+
+
+class AOISet:
+    def __init__(self, aois: Sequence[AOI], cell_size: float = 64.0):
+        """
+        AOIs with a uniform grid index for fast gaze assignment.
+
+        Every grid cell lists the AOIs whose bounding box overlaps it, so a
+        point is only tested against the few AOIs of its cell rather than
+        all of them. Where AOIs overlap, the one listed first wins; list
+        individual blocks before the model, resource and workspace areas
+        that contain them.
+
+        Args:
+            aois: AOIs in priority order
+            cell_size: Grid cell edge in pixels
+        """
+        self.aois = list(aois)
+        self.names = [aoi.name for aoi in self.aois]
+        self.cell_size = cell_size
+        boxes = np.array([aoi.bbox for aoi in self.aois], dtype=np.float64).reshape(-1, 4)
+        self.origin = boxes[:, :2].min(axis=0) if len(boxes) else np.zeros(2)
+        extent = boxes[:, 2:].max(axis=0) - self.origin if len(boxes) else np.zeros(2)
+        self.shape = np.floor(extent / cell_size).astype(int) + 1
+
+        # Cell -> AOI indices in priority order, stored flat (CSR layout)
+        cells = [[] for _ in range(self.shape[0] * self.shape[1])]
+        for index, (x0, y0, x1, y1) in enumerate(boxes):
+            c0 = np.floor((np.array([x0, y0]) - self.origin) / cell_size).astype(int)
+            c1 = np.floor((np.array([x1, y1]) - self.origin) / cell_size).astype(int)
+            for cx in range(c0[0], c1[0] + 1):
+                for cy in range(c0[1], c1[1] + 1):
+                    cells[cx * self.shape[1] + cy].append(index)
+        self.counts = np.array([len(members) for members in cells], dtype=np.intp)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]]).astype(np.intp)
+        self.members = np.array([index for members in cells for index in members], dtype=np.intp)
+
+    def assign(self, x, y):
+        """
+        AOI index of every point.
+
+        Args:
+            x, y: Gaze or fixation positions in pixels; NaN is never inside
+
+        Returns:
+            (N,) int array of indices into ``names``; -1 outside every AOI
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        labels = np.full(len(x), -1, dtype=np.intp)
+        if not self.aois:
+            return labels
+        with np.errstate(invalid='ignore'):
+            cx = np.floor((x - self.origin[0]) / self.cell_size)
+            cy = np.floor((y - self.origin[1]) / self.cell_size)
+            on_grid = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+        points = np.flatnonzero(on_grid)
+        cells = cx[points].astype(np.intp) * self.shape[1] + cy[points].astype(np.intp)
+
+        # k-th candidate of every point's cell, in priority order
+        for k in range(self.counts.max(initial=0)):
+            has = self.counts[cells] > k
+            points, cells = points[has], cells[has]
+            if not len(points):
+                break
+            candidates = self.members[self.offsets[cells] + k]
+            hit = np.zeros(len(points), dtype=bool)
+            for index in np.unique(candidates):
+                tested = np.flatnonzero(candidates == index)
+                hit[tested] = self.aois[index].contains(x[points[tested]], y[points[tested]])
+            labels[points[hit]] = candidates[hit]
+            points, cells = points[~hit], cells[~hit]
+        return labels
+
+    def label(self, x, y):
+        """AOI names of every point; None outside every AOI."""
+        names = np.array(self.names + [None], dtype=object)
+        return names[self.assign(x, y)]
+
+
+def _sample_durations(timestamps, max_gap):
+    """Time each sample stands for: up to the next sample, at most ``max_gap``."""
+    durations = np.diff(np.asarray(timestamps, dtype=np.float64), append=np.nan)
+    if len(durations) > 1:
+        durations[-1] = np.median(durations[:-1])
+    return np.where(durations <= max_gap, durations, 0.0)
+
+
+def aoi_metrics(timestamps, labels, names, durations=None, max_gap=0.1):
+    """
+    Dwell, visit and transition statistics of one labelled sequence.
+
+    A visit is a run of consecutive samples (or fixations) on one AOI;
+    samples outside every AOI do not interrupt a visit or a transition.
+
+    Args:
+        timestamps: (N,) sample or fixation start times, ascending
+        labels: (N,) AOI indices from ``AOISet.assign``
+        names: AOI names, indexed by label
+        durations: Duration of every entry (fixation durations); for raw
+            samples leave None to use the time to the next sample
+        max_gap: Longest sample interval (s) counted as dwell
+
+    Returns:
+        Tuple of (DataFrame indexed by AOI with dwell_time, visits,
+        revisits and first_entry; DataFrame of transition counts with
+        source AOIs as rows and target AOIs as columns)
+    """
+    labels = np.asarray(labels, dtype=np.intp)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    durations = _sample_durations(timestamps, max_gap) if durations is None else \
+        np.asarray(durations, dtype=np.float64)
+    n_aois = len(names)
+    inside = labels >= 0
+
+    dwell = np.bincount(labels[inside], weights=durations[inside], minlength=n_aois)
+    visited, times = labels[inside], timestamps[inside]
+    entry = np.ones(len(visited), dtype=bool)
+    entry[1:] = visited[1:] != visited[:-1]
+    visits = np.bincount(visited[entry], minlength=n_aois)
+    first_entry = np.full(n_aois, np.inf)
+    np.minimum.at(first_entry, visited[entry], times[entry])
+    first_entry[np.isinf(first_entry)] = np.nan
+
+    sequence = visited[entry]
+    transitions = np.zeros((n_aois, n_aois), dtype=np.int64)
+    np.add.at(transitions, (sequence[:-1], sequence[1:]), 1)
+
+    summary = pd.DataFrame({'dwell_time': dwell, 'visits': visits,
+                            'revisits': np.maximum(visits - 1, 0),
+                            'first_entry': first_entry}, index=pd.Index(names, name='aoi'))
+    return summary, pd.DataFrame(transitions, index=names, columns=names)
+
+
+def aoi_metrics_by_trial(frame: pd.DataFrame, aois: AOISet,
+                         trial_aois: Optional[Dict[object, AOISet]] = None,
+                         by: List[str] = ('posture', 'angle', 'trial_num'),
+                         x='gaze_x', y='gaze_y', duration=None, max_gap=0.1):
+    """
+    Per-trial AOI statistics of a gaze or fixation table.
+
+    Args:
+        frame: Rows with ``timestamp``, the position columns and the ``by``
+            columns, e.g. from ``SessionReader.load``
+        aois: AOIs used for every trial without its own layout
+        trial_aois: Optional AOIs per trial, keyed like the ``by`` groups
+            (a tuple, or a scalar for a single ``by`` column)
+        by: Columns identifying a trial
+        x, y: Position columns ('x'/'y' for a gaze event table)
+        duration: Duration column (e.g. 'duration' for fixations); None for
+            raw samples
+        max_gap: Longest sample interval (s) counted as dwell
+
+    Returns:
+        Tuple of (long DataFrame with one row per trial and AOI; dict of
+        transition matrices keyed by trial)
+    """
+    by = list(by)
+    trial_aois = trial_aois or {}
+    summaries, transitions = [], {}
+    for key, rows in frame.sort_values('timestamp').groupby(by, sort=False):
+        if len(by) == 1 and isinstance(key, tuple):
+            key = key[0]
+        layout = trial_aois.get(key, aois)
+        labels = layout.assign(rows[x].to_numpy(), rows[y].to_numpy())
+        summary, transitions[key] = aoi_metrics(
+            rows['timestamp'].to_numpy(), labels, layout.names,
+            None if duration is None else rows[duration].to_numpy(), max_gap)
+        summary = summary.reset_index()
+        for i, (column, value) in enumerate(zip(by, key if len(by) > 1 else (key,))):
+            summary.insert(i, column, value)
+        summaries.append(summary)
+    table = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame()
+    return table, transitions
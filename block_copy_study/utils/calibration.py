@@ -2,25 +2,93 @@
 # utils/calibration.py
 import numpy as np
 import time
-from collections import deque
 from scipy.spatial.transform import Rotation
+from .quaternions import as_quaternion_array, matrix_to_quat, quat_multiply, quat_to_matrix
+from .stillness import MotionSource, StillnessDetector
+
+
+def markley_average(quaternions, weights=None):
+    """
+    Average orientation of unit quaternions (w, x, y, z).
+
+    Markley's method: the eigenvector of the largest eigenvalue of
+    ``sum(w_i q_i q_i^T)``. Unlike a component-wise mean it is unaffected by
+    sign flips, since q and -q contribute the same outer product.
+
+    Args:
+        quaternions: (N, 4) array
+        weights: Optional (N,) weights
+
+    Returns:
+        Unit quaternion (4,) with non-negative w
+    """
+    q = np.asarray(quaternions, dtype=np.float64)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    weighted = q if weights is None else q * np.asarray(weights, dtype=np.float64)[:, None]
+    _, vectors = np.linalg.eigh(weighted.T @ q)
+    mean = vectors[:, -1]
+    return mean if mean[0] >= 0 else -mean
+
+
+def angular_speed(quaternions, timestamps):
+    """Angular speed (rad/s) between consecutive quaternions (w, x, y, z)."""
+    q = np.asarray(quaternions, dtype=np.float64)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    dots = np.clip(np.abs(np.einsum('ij,ij->i', q[:-1], q[1:])), 0.0, 1.0)
+    dt = np.diff(np.asarray(timestamps, dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(dt > 0, 2 * np.arccos(dots) / dt, 0.0)
+
+
+def still_mask(angular_velocities, window_size, threshold):
+    """
+    Marks samples whose trailing ``window_size`` velocities are all below
+    ``threshold``; the first ``window_size - 1`` samples are never still.
+    """
+    velocities = np.abs(np.asarray(angular_velocities, dtype=np.float64))
+    mask = np.zeros(len(velocities), dtype=bool)
+    if len(velocities) >= window_size:
+        windows = np.lib.stride_tricks.sliding_window_view(velocities, window_size)
+        mask[window_size - 1:] = windows.max(axis=1) < threshold
+    return mask
+
+
+class _PoseStream:
+    """Calibration samples of one tracker, gated for stillness as they arrive."""
+
+    def __init__(self, reader, detector):
+        self.reader = reader
+        self.source = MotionSource(reader)
+        self.detector = detector
+        self.still = []
+        self.n_samples = 0
+
+    def add(self, batch):
+        self.n_samples += len(batch)
+        mask = self.detector.update_batch(*self.source.velocities(batch))
+        self.still.append(as_quaternion_array(batch, self.source.fields)[mask])
 
 
 class IMUCalibrator:
-    def __init__(self, trackers, calibration_duration=5.0, stillness_threshold=0.05):
+    def __init__(self, trackers, calibration_duration=5.0, stillness_threshold=0.05,
+                 window_size=10):
         """
         Handles IMU calibration to align coordinate systems and establish reference frames.
 
         Args:
             trackers: Dictionary of tracker objects (eye_tracker, chest_imu, mobile_imu)
             calibration_duration: Duration in seconds to collect calibration data
-            stillness_threshold: Maximum allowed angular velocity for "still" state
+            stillness_threshold: Maximum allowed angular velocity (rad/s) for "still" state
+            window_size: Samples that must all be below the threshold for a
+                sample to count as still
         """
         self.trackers = trackers
         self.calibration_duration = calibration_duration
         self.stillness_threshold = stillness_threshold
+        self.window_size = window_size
         self.reference_orientations = {}
         self.alignment_matrices = {}
+        self.detectors = {}
 
     def collect_reference_pose(self):
         """
@@ -28,6 +96,11 @@ class IMUCalibrator:
         - Standing straight
         - Head level and forward
         - Arms at sides
+
+        Samples are gathered straight into arrays; each tracker's
+        ``StillnessDetector`` keeps only samples whose trailing
+        ``window_size`` angular speeds are all below ``stillness_threshold``.
+        The reference orientation of each tracker is their Markley average.
         """
         print("\nBeginning reference pose collection")
         print("Please maintain neutral position:")
@@ -36,32 +109,47 @@ class IMUCalibrator:
         print("- Arms at sides")
         time.sleep(3)  # Give time to assume position
 
-        # Initialize data collection
-        ref_data = {name: [] for name in self.trackers.keys()}
-        start_time = time.time()
-
-        # Collect data for specified duration
-        while time.time() - start_time < self.calibration_duration:
-            for name, tracker in self.trackers.items():
-                if not tracker.data_queue.empty():
-                    data = tracker.data_queue.get()
-                    ref_data[name].append({
-                        'quat_w': data['quat_w'],
-                        'quat_x': data['quat_x'],
-                        'quat_y': data['quat_y'],
-                        'quat_z': data['quat_z']
-                    })
-
-        # Calculate reference orientations
-        for name, data_list in ref_data.items():
-            if data_list:
-                mean_quat = np.mean([[d['quat_w'], d['quat_x'], d['quat_y'], d['quat_z']]
-                                     for d in data_list], axis=0)
-                mean_quat /= np.linalg.norm(mean_quat)  # Normalize
-                self.reference_orientations[name] = mean_quat
+        streams = {name: self._subscribe(name, tracker) for name, tracker in self.trackers.items()}
+        deadline = time.time() + self.calibration_duration
+
+        # Block on each stream until data arrives; no polling loop
+        while time.time() < deadline:
+            for stream in streams.values():
+                stream.reader.wait(min(deadline - time.time(), 0.1))
+                batch = stream.reader.read()
+                while len(batch):
+                    stream.add(batch)
+                    batch = stream.reader.read()
+        for stream in streams.values():
+            stream.reader.close()
+
+        # Calculate reference orientations from the still samples only
+        for name, stream in streams.items():
+            quats = np.concatenate(stream.still) if stream.still else np.empty((0, 4))
+            print(f"{name}: {len(quats)} of {stream.n_samples} samples still")
+            if len(quats):
+                self.reference_orientations[name] = markley_average(quats)
 
         return self.reference_orientations
 
+    def _subscribe(self, name, tracker):
+        detector = self.detectors[name] = StillnessDetector(name, self.window_size,
+                                                            self.stillness_threshold)
+        detector.subscribe(self._report_movement)
+        if hasattr(tracker, 'subscribe'):
+            return _PoseStream(tracker.subscribe('calibration'), detector)
+        # Neon: head orientation comes from its IMU topic
+        return _PoseStream(tracker.imu_buffer.subscribe('calibration'), detector)
+
+    def _report_movement(self, event):
+        if event.kind == 'stop':
+            print(f"{event.sensor}: movement detected, please hold still")
+
+    def is_still(self, sensor_name):
+        """O(1) stillness of a tracker from its detector during calibration."""
+        detector = self.detectors.get(sensor_name)
+        return detector is not None and detector.still
+
     def compute_alignment_matrices(self):
         """
         Computes transformation matrices to align all IMUs to common reference frame.
@@ -78,23 +166,25 @@ class IMUCalibrator:
 
         return self.alignment_matrices
 
-    def check_stillness(self, angular_velocities, window_size=10):
+    def check_stillness(self, angular_velocities, window_size=None):
         """
         Verifies participant is sufficiently still during calibration.
 
+        Checks a recorded series after the fact; streams are gated as they
+        arrive by ``StillnessDetector`` (see ``is_still``).
+
         Args:
             angular_velocities: List of angular velocity measurements
-            window_size: Number of samples to check
+            window_size: Number of samples to check; defaults to ``self.window_size``
 
         Returns:
             bool: True if angular velocities are below threshold
         """
+        window_size = self.window_size if window_size is None else window_size
         if len(angular_velocities) < window_size:
             return False
-
-        recent_velocities = angular_velocities[-window_size:]
-        max_velocity = np.max(np.abs(recent_velocities))
-        return max_velocity < self.stillness_threshold
+        return bool(still_mask(angular_velocities[-window_size:], window_size,
+                               self.stillness_threshold)[-1])
 
     def apply_calibration(self, imu_data, sensor_name):
         """
@@ -107,13 +197,36 @@ class IMUCalibrator:
         Returns:
             numpy.ndarray: Aligned rotation matrix
         """
-        if sensor_name not in self.alignment_matrices:
-            raise ValueError(f"No calibration data for sensor: {sensor_name}")
+        quat = [[imu_data['quat_w'], imu_data['quat_x'],
+                 imu_data['quat_y'], imu_data['quat_z']]]
+        return self.apply_calibration_batch(quat, sensor_name, output='matrix')[0]
 
-        quat = [imu_data['quat_w'], imu_data['quat_x'],
-                imu_data['quat_y'], imu_data['quat_z']]
-        current_rot = Rotation.from_quat([quat[1], quat[2], quat[3], quat[0]])
+    def apply_calibration_batch(self, quaternions, sensor_name, output='quaternion', out=None):
+        """
+        Aligns a whole stream of IMU orientations in one vectorized call.
 
-        # Apply alignment transformation
-        aligned_rot = current_rot.as_matrix() @ self.alignment_matrices[sensor_name]
-        return aligned_rot
\ No newline at end of file
+        Equivalent to ``apply_calibration`` per sample: the aligned rotation
+        is ``R(q) @ alignment_matrix``, computed as the quaternion product
+        ``q * q_alignment``.
+
+        Args:
+            quaternions: (N, 4) array of (w, x, y, z), or a logged motion
+                table (DataFrame or structured array) with quat_w..quat_z
+            sensor_name: Name of the sensor ('chest' or 'mobile')
+            output: 'quaternion' for (N, 4) or 'matrix' for (N, 3, 3)
+            out: Optional preallocated result array of that shape; with
+                'quaternion' it may be the input array itself
+
+        Returns:
+            numpy.ndarray: Aligned orientations
+        """
+        if sensor_name not in self.alignment_matrices:
+            raise ValueError(f"No calibration data for sensor: {sensor_name}")
+        if output not in ('quaternion', 'matrix'):
+            raise ValueError(f"Unknown output: {output}")
+
+        quats = as_quaternion_array(quaternions)
+        alignment = matrix_to_quat(self.alignment_matrices[sensor_name])
+        if output == 'quaternion':
+            return quat_multiply(quats, alignment, out=out)
+        return quat_to_matrix(quat_multiply(quats, alignment), out=out)
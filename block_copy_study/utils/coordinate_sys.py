@@ -2,8 +2,30 @@
 # utils/coordinate_sys.py
 import numpy as np
 from scipy.spatial.transform import Rotation
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+from .quaternions import quat_conjugate, quat_multiply, quat_rotate, quat_to_matrix, matrix_to_quat
+
+
+def _rotate(rotation: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Applies a (3, 3) or per-sample (N, 3, 3) rotation to (3,) or (N, 3) vectors."""
+    if rotation.ndim == 2:
+        # One matrix for all samples: a single (N, 3) x (3, 3) product
+        return vectors @ rotation.T
+    return np.einsum('...ij,...j->...i', rotation, vectors)
+
+
+def _invert(rotation: np.ndarray, translation: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of ``p -> rotation @ p + translation``; rotations may be stacked."""
+    inverse = np.swapaxes(rotation, -1, -2)
+    return inverse, -_rotate(inverse, translation)
+
+
+def _invert_quaternion(quaternion: np.ndarray, translation: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of ``p -> q p q* + translation`` for unit quaternions."""
+    inverse = quat_conjugate(quaternion)
+    return inverse, -quat_rotate(inverse, translation)
 
 
 @dataclass
@@ -13,32 +35,158 @@ class CoordinateSystem:
     orientation: np.ndarray  # 3x3 rotation matrix
 
 
+@dataclass
+class _Edge:
+    """
+    Transform ``p_target = rotation @ p_source + translation`` of one graph edge.
+
+    The rotation is kept as matrices, quaternions (w, x, y, z) or both;
+    the missing form is converted once, on first use.
+    """
+    translation: np.ndarray
+    version: int
+    rotation: Optional[np.ndarray] = None
+    quaternion: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        if self.rotation is None:
+            self.rotation = quat_to_matrix(self.quaternion)
+        return self.rotation
+
+    def quat(self) -> np.ndarray:
+        if self.quaternion is None:
+            self.quaternion = matrix_to_quat(self.rotation)
+        return self.quaternion
+
+
 class CoordinateTransformer:
-    def __init__(self):
+    def __init__(self, root: str = 'world'):
         """
         Handles coordinate system transformations between different sensors.
         Maintains relationships between coordinate frames and provides
         transformation utilities.
+
+        Frames (world, head, chest, chair, scene camera, ...) form a graph
+        whose edges are transforms that can be updated at any time, e.g. with
+        every new IMU sample. Transforms between any two connected frames
+        are found by path search and cached. Every edge update bumps a
+        version number, and a cached transform is reused only while the
+        versions of all edges on its path are unchanged.
+
+        Args:
+            root: Frame that ``add_coordinate_system`` poses are relative to
         """
+        self.root = root
         self.coordinate_systems = {}
         self.transformations = {}
+        self.quaternion_transformations = {}
+        self._edges: Dict[Tuple[str, str], _Edge] = {}
+        self._neighbors: Dict[str, set] = {root: set()}
+        self._version = 0  # Bumped by every edge update
+        self._structure_version = 0  # Bumped when an edge is added
+        self._paths = {}
+        self._cache_versions = {}
+        self._quaternion_cache_versions = {}
 
     def add_coordinate_system(self, name: str, origin: np.ndarray,
                               orientation: np.ndarray):
         """
         Adds a new coordinate system to the transformer.
 
+        The system is linked to the root frame: a root point ``p`` has
+        coordinates ``orientation @ p + origin`` in this system. Calling it
+        again for the same name updates the pose.
+
         Args:
             name: Identifier for the coordinate system
             origin: 3D position of origin
             orientation: 3x3 rotation matrix defining orientation
         """
         self.coordinate_systems[name] = CoordinateSystem(origin, orientation)
+        self.set_transform(self.root, name, orientation, origin)
+
+    def set_transform(self, source: str, target: str, rotation: np.ndarray,
+                      translation: Optional[np.ndarray] = None):
+        """
+        Adds or updates the edge ``source -> target``.
+
+        A time-varying edge (e.g. the head pose from the Neon IMU) can be
+        given per sample: an (N, 3, 3) or (N, 4) rotation and an (N, 3)
+        translation, aligned with the N samples later passed to
+        ``transform_points`` or ``transform_orientations``.
+
+        Args:
+            source: Frame the points are given in
+            target: Frame the points are mapped to
+            rotation: 3x3 rotation matrix or unit quaternion (w, x, y, z),
+                or a stack of either
+            translation: 3D translation or (N, 3) translations; zero by default
+        """
+        rotation = np.asarray(rotation, dtype=np.float64)
+        is_quaternion = rotation.shape[-1] == 4
+        translation = np.zeros(3) if translation is None else np.asarray(translation, dtype=np.float64)
+
+        key = (source, target)
+        if (target, source) in self._edges:
+            # Keep a single edge per frame pair; store the update inverted
+            invert = _invert_quaternion if is_quaternion else _invert
+            rotation, translation = invert(rotation, translation)
+            key = (target, source)
+
+        self._version += 1
+        edge = _Edge(translation, self._version)
+        if is_quaternion:
+            edge.quaternion = rotation
+        else:
+            edge.rotation = rotation
+        if key not in self._edges:
+            self._neighbors.setdefault(key[0], set()).add(key[1])
+            self._neighbors.setdefault(key[1], set()).add(key[0])
+            self._structure_version += 1
+        self._edges[key] = edge
+
+    def find_path(self, from_sys: str, to_sys: str) -> List[Tuple[Tuple[str, str], bool]]:
+        """
+        Shortest chain of edges from one frame to another.
+
+        Returns:
+            List of (edge key, inverted) pairs in application order
+        """
+        if from_sys not in self._neighbors or to_sys not in self._neighbors:
+            raise ValueError("Coordinate system not found")
+        cached = self._paths.get((from_sys, to_sys))
+        if cached is not None and cached[0] == self._structure_version:
+            return cached[1]
+
+        previous = {from_sys: None}
+        frontier = deque([from_sys])
+        while frontier and to_sys not in previous:
+            frame = frontier.popleft()
+            for neighbor in self._neighbors[frame]:
+                if neighbor not in previous:
+                    previous[neighbor] = frame
+                    frontier.append(neighbor)
+        if to_sys not in previous:
+            raise ValueError(f"No transform path from {from_sys} to {to_sys}")
+
+        path = []
+        frame = to_sys
+        while previous[frame] is not None:
+            parent = previous[frame]
+            inverted = (parent, frame) not in self._edges
+            path.append(((frame, parent) if inverted else (parent, frame), inverted))
+            frame = parent
+        path.reverse()
+        self._paths[(from_sys, to_sys)] = (self._structure_version, path)
+        return path
 
     def compute_transformation(self, from_sys: str, to_sys: str) -> Tuple[np.ndarray, np.ndarray]:
         """
         Computes transformation matrix and translation vector between coordinate systems.
 
+        The result is composed along the frame graph and cached until an
+        edge on its path changes.
+
         Args:
             from_sys: Source coordinate system name
             to_sys: Target coordinate system name
@@ -48,21 +196,64 @@ class CoordinateTransformer:
             - 3x3 rotation matrix
             - 3D translation vector
         """
-        if from_sys not in self.coordinate_systems or to_sys not in self.coordinate_systems:
-            raise ValueError("Coordinate system not found")
+        return self._cached(from_sys, to_sys, self.transformations,
+                            self._cache_versions, self._compose_matrices)
+
+    def compute_quaternion_transformation(self, from_sys: str,
+                                          to_sys: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Like ``compute_transformation``, with the rotation as a unit quaternion.
+
+        Edges are composed with quaternion products, so no rotation
+        matrices are built for edges that were given as quaternions.
+
+        Returns:
+            Tuple containing:
+            - Quaternion (w, x, y, z), or (N, 4) for time-varying paths
+            - 3D translation vector, or (N, 3)
+        """
+        return self._cached(from_sys, to_sys, self.quaternion_transformations,
+                            self._quaternion_cache_versions, self._compose_quaternions)
 
-        from_cs = self.coordinate_systems[from_sys]
-        to_cs = self.coordinate_systems[to_sys]
+    def _cached(self, from_sys, to_sys, cache, cache_versions, compose):
+        key = (from_sys, to_sys)
+        cached_versions = cache_versions.get(key)
+        if cached_versions is not None and cached_versions[0] == self._version:
+            return cache[key]
 
-        # Compute rotation matrix between systems
-        rotation = to_cs.orientation @ from_cs.orientation.T
+        path = self.find_path(from_sys, to_sys)
+        edge_versions = tuple(self._edges[edge].version for edge, _ in path)
+        if cached_versions is not None and cached_versions[1] == edge_versions:
+            # Something else in the graph changed; this path did not
+            cache_versions[key] = (self._version, edge_versions)
+            return cache[key]
 
-        # Compute translation vector
-        translation = to_cs.origin - (rotation @ from_cs.origin)
+        cache[key] = compose(path)
+        cache_versions[key] = (self._version, edge_versions)
+        return cache[key]
 
-        self.transformations[(from_sys, to_sys)] = (rotation, translation)
+    def _compose_matrices(self, path):
+        rotation, translation = np.eye(3), np.zeros(3)
+        for edge_key, inverted in path:
+            edge = self._edges[edge_key]
+            step_rotation, step_translation = edge.matrix(), edge.translation
+            if inverted:
+                step_rotation, step_translation = _invert(step_rotation, step_translation)
+            translation = _rotate(step_rotation, translation) + step_translation
+            rotation = step_rotation @ rotation
         return rotation, translation
 
+    def _compose_quaternions(self, path):
+        quaternion, translation = np.array([1.0, 0.0, 0.0, 0.0]), np.zeros(3)
+        for edge_key, inverted in path:
+            edge = self._edges[edge_key]
+            step_quaternion, step_translation = edge.quat(), edge.translation
+            if inverted:
+                step_quaternion, step_translation = _invert_quaternion(step_quaternion, step_translation)
+            translation = quat_rotate(step_quaternion, translation) + step_translation
+            quaternion = quat_multiply(step_quaternion, quaternion)
+        return quaternion, translation
+
     def transform_point(self, point: np.ndarray, from_sys: str,
                         to_sys: str) -> np.ndarray:
         """
@@ -76,10 +267,7 @@ class CoordinateTransformer:
         Returns:
             Transformed 3D point
         """
-        if (from_sys, to_sys) not in self.transformations:
-            self.compute_transformation(from_sys, to_sys)
-
-        rotation, translation = self.transformations[(from_sys, to_sys)]
+        rotation, translation = self.compute_transformation(from_sys, to_sys)
         return (rotation @ point) + translation
 
     def transform_orientation(self, orientation: np.ndarray, from_sys: str,
@@ -95,12 +283,58 @@ class CoordinateTransformer:
         Returns:
             Transformed 3x3 rotation matrix
         """
-        if (from_sys, to_sys) not in self.transformations:
-            self.compute_transformation(from_sys, to_sys)
-
-        rotation, _ = self.transformations[(from_sys, to_sys)]
+        rotation, _ = self.compute_transformation(from_sys, to_sys)
         return rotation @ orientation
 
+    def transform_points(self, points: np.ndarray, from_sys: str, to_sys: str,
+                         use_quaternions: bool = False) -> np.ndarray:
+        """
+        Transforms (N, 3) points, e.g. a session of gaze vectors, at once.
+
+        With static edges the whole batch is one matrix product. Edges set
+        per sample apply sample by sample.
+
+        Args:
+            points: (N, 3) points
+            from_sys: Source coordinate system name
+            to_sys: Target coordinate system name
+            use_quaternions: Rotate with the composed quaternions instead of
+                matrices; avoids building matrices for quaternion edges
+
+        Returns:
+            (N, 3) transformed points
+        """
+        points = np.asarray(points, dtype=np.float64)
+        if use_quaternions:
+            quaternion, translation = self.compute_quaternion_transformation(from_sys, to_sys)
+            return quat_rotate(quaternion, points) + translation
+        rotation, translation = self.compute_transformation(from_sys, to_sys)
+        return _rotate(rotation, points) + translation
+
+    def transform_orientations(self, orientations: np.ndarray, from_sys: str,
+                               to_sys: str) -> np.ndarray:
+        """
+        Transforms a batch of orientations between coordinate systems.
+
+        Quaternions are composed with quaternion products; matrices with
+        one batched matrix product.
+
+        Args:
+            orientations: (N, 4) unit quaternions (w, x, y, z) or (N, 3, 3)
+                rotation matrices
+            from_sys: Source coordinate system name
+            to_sys: Target coordinate system name
+
+        Returns:
+            Transformed orientations in the input representation
+        """
+        orientations = np.asarray(orientations, dtype=np.float64)
+        if orientations.shape[-1] == 4:
+            quaternion, _ = self.compute_quaternion_transformation(from_sys, to_sys)
+            return quat_multiply(quaternion, orientations)
+        rotation, _ = self.compute_transformation(from_sys, to_sys)
+        return rotation @ orientations
+
     def quaternion_to_matrix(self, quat: np.ndarray) -> np.ndarray:
         """Converts quaternion to rotation matrix."""
         return Rotation.from_quat(quat).as_matrix()
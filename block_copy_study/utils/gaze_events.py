@@ -0,0 +1,288 @@
+# gaze_events.py
+# utils/gaze_events.py
+import threading
+import numpy as np
+
+
+# One row per fixation or saccade; 'timestamp' is the start so event rows
+# sort and split into trials like the sample streams
+EVENT_DTYPE = np.dtype([('timestamp', 'f8'), ('end', 'f8'), ('kind', 'U8'),
+                        ('duration', 'f8'), ('x', 'f8'), ('y', 'f8'),
+                        ('amplitude', 'f8'), ('peak_velocity', 'f8'), ('n_samples', 'i8')])
+
+METHODS = ('ivt', 'idt')
+
+
+def gaze_directions(x, y, focal_length=891.0, center=(800.0, 600.0)):
+    """
+    Unit gaze directions of scene camera pixel coordinates (pinhole model).
+
+    Args:
+        x, y: Gaze position in pixels
+        focal_length: Scene camera focal length in pixels
+        center: Principal point in pixels
+
+    Returns:
+        (N, 3) unit vectors, z pointing out of the camera
+    """
+    directions = np.column_stack([(np.asarray(x, dtype=np.float64) - center[0]) / focal_length,
+                                  (np.asarray(y, dtype=np.float64) - center[1]) / focal_length,
+                                  np.ones(len(x))])
+    return directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+
+def angle_between(a, b):
+    """Angle in degrees between (N, 3) unit vectors; accurate for small angles."""
+    ax, ay, az = a[:, 0], a[:, 1], a[:, 2]
+    bx, by, bz = b[:, 0], b[:, 1], b[:, 2]
+    cross = np.sqrt((ay * bz - az * by) ** 2 + (az * bx - ax * bz) ** 2 + (ax * by - ay * bx) ** 2)
+    return np.degrees(np.arctan2(cross, ax * bx + ay * by + az * bz))
+
+
+def detect_events(timestamps, x, y, method='ivt', **kwargs):
+    """
+    Fixations and saccades of a whole recording in vectorized passes.
+
+    Args:
+        timestamps: (N,) sample times in seconds, ascending
+        x, y: Gaze position in scene camera pixels
+        method: 'ivt' (velocity threshold) or 'idt' (dispersion threshold)
+        **kwargs: Passed to ``GazeEventDetector``
+
+    Returns:
+        ``EVENT_DTYPE`` array in time order
+    """
+    detector = GazeEventDetector(method, **kwargs)
+    return np.concatenate([detector.update(timestamps, x, y), detector.flush()])
+
+
+class GazeEventDetector:
+    def __init__(self, method='ivt', velocity_threshold=30.0, dispersion_threshold=1.0,
+                 min_fixation_duration=0.06, sampling_rate=200.0, max_gap=0.1,
+                 focal_length=891.0, center=(800.0, 600.0)):
+        """
+        Fixation/saccade classifier for batches of gaze samples.
+
+        Samples are classified by I-VT (angular velocity below
+        ``velocity_threshold`` is fixation) or I-DT (a sample belongs to a
+        fixation if any window of ``min_fixation_duration`` containing it
+        has a dispersion, horizontal plus vertical extent in degrees, of at
+        most ``dispersion_threshold``). Consecutive samples of one class
+        form an event; a gap longer than ``max_gap`` always ends an event.
+        Fixations shorter than ``min_fixation_duration`` are dropped.
+
+        ``update`` can be fed a whole session or one live batch at a time;
+        the output is the same. Between calls the detector keeps only the
+        running sums of the open event and, for I-DT, the last window of
+        samples, so its state is bounded however long the recording is.
+
+        Args:
+            method: 'ivt' or 'idt'
+            velocity_threshold: I-VT saccade threshold in deg/s
+            dispersion_threshold: I-DT fixation dispersion in degrees
+            min_fixation_duration: Shortest fixation in seconds; also the
+                I-DT window length
+            sampling_rate: Nominal gaze rate (Hz) used for the I-DT window
+            max_gap: Longest sample interval (s) inside one event
+            focal_length, center: Scene camera intrinsics in pixels
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown event detection method: {method}")
+        self.method = method
+        self.velocity_threshold = velocity_threshold
+        self.dispersion_threshold = dispersion_threshold
+        self.min_fixation_duration = min_fixation_duration
+        self.max_gap = max_gap
+        self.focal_length = focal_length
+        self.center = center
+        self.window = max(int(round(min_fixation_duration * sampling_rate)), 2)
+        self._lag = self.window - 1 if method == 'idt' else 0
+        self._previous = None  # (direction, timestamp) before the pending samples
+        self._pending = (np.empty(0), np.empty(0), np.empty(0), np.empty((0, 3)))
+        self._seeds = np.zeros(self._lag, dtype=bool)
+        self._open = None
+
+    def update_batch(self, batch):
+        """``update`` for a gaze structured array (``GAZE_DTYPE``)."""
+        return self.update(batch['timestamp'], batch['gaze_x'], batch['gaze_y'])
+
+    def update(self, timestamps, x, y):
+        """
+        Adds gaze samples and returns the events they complete.
+
+        Returns:
+            ``EVENT_DTYPE`` array of finished events, in time order
+        """
+        directions = gaze_directions(x, y, self.focal_length, self.center)
+        t, x, y, d = (np.concatenate([pending, np.asarray(new, dtype=np.float64)])
+                      for pending, new in zip(self._pending, (timestamps, x, y, directions)))
+        n = len(t) - self._lag
+        if n <= 0:
+            self._pending = (t, x, y, d)
+            return np.empty(0, EVENT_DTYPE)
+        return self._classify(t, x, y, d, n)
+
+    def flush(self):
+        """Ends the recording: classifies held-back samples and closes the open event."""
+        t, x, y, d = self._pending
+        events = self._classify(t, x, y, d, len(t), final=True) if len(t) else \
+            np.empty(0, EVENT_DTYPE)
+        if self._open is not None:
+            events = np.concatenate([events, self._finish(self._open)])
+            self._open = None
+        return events
+
+    def _classify(self, t, x, y, d, n, final=False):
+        if self._previous is None:
+            previous_d, previous_t = d[:1], np.array([-np.inf])
+        else:
+            previous_d, previous_t = self._previous[0][None], np.array([self._previous[1]])
+        dt = np.diff(np.concatenate([previous_t, t]))
+        breaks = dt > self.max_gap
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocity = angle_between(np.vstack([previous_d, d[:-1]]), d) / dt
+        velocity[breaks | ~np.isfinite(velocity)] = 0.0
+
+        if self.method == 'ivt':
+            fixation = velocity[:n] < self.velocity_threshold
+        else:
+            fixation = self._covered(t, d, breaks, n, final)
+
+        entry = np.vstack([previous_d, d[:-1]])
+        entry[breaks] = d[breaks]
+        runs = self._runs(t[:n], x[:n], y[:n], d[:n], entry[:n], velocity[:n],
+                          fixation, breaks[:n])
+        self._previous = (d[n - 1], t[n - 1])
+        self._pending = (t[n:], x[n:], y[n:], d[n:])
+        return self._emit(runs)
+
+    def _covered(self, t, d, breaks, n, final):
+        """I-DT labels of the first ``n`` samples from window seeds."""
+        w = self.window
+        azimuth = np.degrees(np.arctan2(d[:, 0], d[:, 2]))
+        elevation = np.degrees(np.arctan2(d[:, 1], d[:, 2]))
+        seeds = np.zeros(n, dtype=bool)
+        if len(t) >= w:
+            windows = np.lib.stride_tricks.sliding_window_view
+            az, el = windows(azimuth, w), windows(elevation, w)
+            dispersion = (az.max(axis=1) - az.min(axis=1)) + (el.max(axis=1) - el.min(axis=1))
+            # A window must not contain a gap (breaks[i] is the gap before sample i)
+            gap = windows(breaks[1:], w - 1).any(axis=1) if w > 1 else np.zeros(len(dispersion), bool)
+            complete = (dispersion <= self.dispersion_threshold) & ~gap
+            seeds[:min(len(complete), n)] = complete[:n]
+        # Sample k is covered by any seed starting in [k - w + 1, k]
+        history = np.concatenate([self._seeds, seeds]).astype(np.int64)
+        counts = np.concatenate([[0], np.cumsum(history)])
+        covered = counts[w - 1 + np.arange(1, n + 1)] - counts[np.arange(n)] > 0
+        self._seeds = history[len(history) - self._lag:].astype(bool) if not final else \
+            np.zeros(self._lag, dtype=bool)
+        return covered
+
+    @staticmethod
+    def _runs(t, x, y, d, entry, velocity, fixation, breaks):
+        """Per-run sums of consecutive same-class samples."""
+        change = np.empty(len(t), dtype=bool)
+        change[0] = True
+        change[1:] = fixation[1:] != fixation[:-1]
+        starts = np.flatnonzero(change | breaks)
+        ends = np.append(starts[1:], len(t)) - 1
+        return {
+            'fixation': fixation[starts],
+            'continues': ~breaks[starts],
+            'start': t[starts],
+            'end': t[ends],
+            'n': np.diff(np.append(starts, len(t))),
+            'sum_x': np.add.reduceat(x, starts),
+            'sum_y': np.add.reduceat(y, starts),
+            'peak': np.maximum.reduceat(velocity, starts),
+            'entry': entry[starts],
+            'exit': d[ends]
+        }
+
+    def _emit(self, runs):
+        """Finishes every run but the last; the first run may extend the open event."""
+        first = {key: values[0] for key, values in runs.items()}
+        rest = {key: values[1:] for key, values in runs.items()}
+        opened = self._open
+        if opened is not None and first['fixation'] == opened['fixation'] and first['continues']:
+            first = dict(opened, end=first['end'], n=opened['n'] + first['n'],
+                         sum_x=opened['sum_x'] + first['sum_x'],
+                         sum_y=opened['sum_y'] + first['sum_y'],
+                         peak=max(opened['peak'], first['peak']), exit=first['exit'])
+            finished = [first]
+        else:
+            finished = [first] if opened is None else [opened, first]
+
+        if len(rest['start']):
+            self._open = {key: values[-1] for key, values in rest.items()}
+            finished.append({key: values[:-1] for key, values in rest.items()})
+        else:
+            self._open = finished.pop()
+        if not finished:
+            return np.empty(0, EVENT_DTYPE)
+        return np.concatenate([self._finish(runs) for runs in finished])
+
+    def _finish(self, runs):
+        """Events of finished runs (a single run or arrays of runs)."""
+        runs = {key: np.atleast_1d(value) for key, value in runs.items()}
+        runs['entry'] = runs['entry'].reshape(-1, 3)
+        runs['exit'] = runs['exit'].reshape(-1, 3)
+        events = np.empty(len(runs['start']), EVENT_DTYPE)
+        events['timestamp'] = runs['start']
+        events['end'] = runs['end']
+        events['kind'] = np.where(runs['fixation'], 'fixation', 'saccade')
+        events['duration'] = runs['end'] - runs['start']
+        events['x'] = runs['sum_x'] / runs['n']
+        events['y'] = runs['sum_y'] / runs['n']
+        events['amplitude'] = angle_between(runs['entry'], runs['exit'])
+        events['peak_velocity'] = runs['peak']
+        events['n_samples'] = runs['n']
+        short = runs['fixation'] & (events['duration'] < self.min_fixation_duration)
+        return events[~short]
+
+
+class GazeEventStage(threading.Thread):
+    def __init__(self, gaze, bus, capacity=1024, poll_interval=0.05, **kwargs):
+        """
+        Background thread detecting fixations and saccades live.
+
+        Reads a gaze subscription, runs ``GazeEventDetector`` on every batch
+        and publishes finished events on the bus topic 'gaze_events', which
+        the logger writes next to the gaze file.
+
+        Args:
+            gaze: Subscription to the gaze topic
+            bus: ``StreamBus`` to publish on
+            capacity: Events kept in the 'gaze_events' topic
+            poll_interval: Longest wait for new gaze samples in seconds
+            **kwargs: Passed to ``GazeEventDetector``
+        """
+        super().__init__(daemon=True)
+        self.gaze = gaze
+        self.detector = GazeEventDetector(**kwargs)
+        self.topic = bus.topic('gaze_events', EVENT_DTYPE, capacity)
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.gaze.wait(self.poll_interval)
+            self.process()
+        self.process()
+        self._publish(self.detector.flush())
+
+    def process(self):
+        batch = self.gaze.read()
+        while len(batch):
+            self._publish(self.detector.update_batch(batch))
+            batch = self.gaze.read()
+
+    def _publish(self, events):
+        if len(events):
+            self.topic.extend(events)
+
+    def stop(self):
+        """Stops after publishing the events still open; call before the logger closes."""
+        self._stop_event.set()
+        self.join()
+        self.gaze.close()
@@ -0,0 +1,325 @@
+# kinematics.py
+# utils/kinematics.py
+import threading
+import numpy as np
+from scipy.spatial.transform import Rotation
+from .alignment import slerp
+from .quaternions import QUATERNION_COLUMNS, as_quaternion_array, quat_conjugate, quat_multiply
+
+
+NEON_QUATERNION_FIELDS = ['quaternion_w', 'quaternion_x', 'quaternion_y', 'quaternion_z']
+
+# Angles in degrees, velocities in deg/s (like the Neon rotation_* fields),
+# speeds in rad/s (like IMUCalibrator.stillness_threshold)
+KINEMATICS_DTYPE = np.dtype(
+    [('timestamp', 'f8')] +
+    [(f'{segment}_{name}', 'f8')
+     for segment in ('head', 'trunk')
+     for name in ('yaw', 'pitch', 'roll',
+                  'velocity_x', 'velocity_y', 'velocity_z', 'speed',
+                  'quat_w', 'quat_x', 'quat_y', 'quat_z')])
+
+
+def relative_orientation(parent, child):
+    """Orientation of ``child`` in the frame of ``parent``: ``parent* * child``."""
+    return quat_multiply(quat_conjugate(parent), child)
+
+
+def euler_angles(quaternions):
+    """
+    Yaw, pitch and roll in degrees (intrinsic z-y-x) of (N, 4) quaternions.
+
+    Rows containing NaN give NaN angles.
+
+    Returns:
+        (N, 3) array of yaw, pitch, roll
+    """
+    q = np.asarray(quaternions, dtype=np.float64)
+    angles = np.full((len(q), 3), np.nan)
+    valid = ~np.isnan(q).any(axis=1)
+    if valid.any():
+        angles[valid] = Rotation.from_quat(q[valid][:, [1, 2, 3, 0]]).as_euler('ZYX', degrees=True)
+    return angles
+
+
+def angular_velocity(quaternions, timestamps, previous=None):
+    """
+    Body-frame angular velocity (rad/s) between consecutive quaternions.
+
+    Args:
+        quaternions: (N, 4) unit quaternions (w, x, y, z)
+        timestamps: (N,) sample times in seconds
+        previous: Optional (quaternion, timestamp) of the sample before the
+            batch, so batches can be processed one after another
+
+    Returns:
+        (N, 3) angular velocities; the first row is NaN without ``previous``
+    """
+    q = np.asarray(quaternions, dtype=np.float64)
+    t = np.asarray(timestamps, dtype=np.float64)
+    if previous is None:
+        q0, t0 = np.full((1, 4), np.nan), np.array([np.nan])
+    else:
+        q0, t0 = np.asarray(previous[0], dtype=np.float64)[None], np.array([previous[1]])
+    step = quat_multiply(quat_conjugate(np.vstack([q0, q[:-1]])), q)
+    # q and -q are the same rotation; take the short way round
+    step[step[:, 0] < 0] *= -1
+    vector = step[:, 1:]
+    norm = np.linalg.norm(vector, axis=1)
+    angle = 2.0 * np.arctan2(norm, step[:, 0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(norm > 1e-12, angle / norm, 2.0)
+        dt = np.diff(np.concatenate([t0, t]))
+        return np.where((dt > 0)[:, None], vector * (scale / dt)[:, None], np.nan)
+
+
+class _Track:
+    """
+    Not yet consumed samples of one orientation stream.
+
+    Samples live in preallocated arrays; consuming only advances ``start``,
+    and the live range is moved to the front (or the arrays doubled) only
+    when an append would run past the end, so adding is amortized O(1).
+    """
+
+    def __init__(self, capacity=1024):
+        self._timestamps = np.empty(capacity)
+        self._quaternions = np.empty((capacity, 4))
+        self.start = 0
+        self.end = 0
+        self.last = -np.inf  # Newest time ever added, kept after consumption
+
+    @property
+    def timestamps(self):
+        return self._timestamps[self.start:self.end]
+
+    @property
+    def quaternions(self):
+        return self._quaternions[self.start:self.end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def add(self, timestamps, quaternions):
+        n = len(timestamps)
+        if self.end + n > len(self._timestamps):
+            size = len(self)
+            capacity = len(self._timestamps)
+            while size + n > capacity:
+                capacity *= 2
+            live_t, live_q = self.timestamps, self.quaternions
+            if capacity != len(self._timestamps):
+                self._timestamps = np.empty(capacity)
+                self._quaternions = np.empty((capacity, 4))
+            self._timestamps[:size] = live_t
+            self._quaternions[:size] = live_q
+            self.start, self.end = 0, size
+        self._timestamps[self.end:self.end + n] = timestamps
+        self._quaternions[self.end:self.end + n] = quaternions
+        self.end += n
+        self.last = max(self.last, self._timestamps[self.end - 1])
+
+    def last_time(self):
+        return self.last
+
+    def consume(self, n):
+        self.start += n
+
+    def trim(self, time):
+        """Drops samples before the last one at or before ``time``; later times never need them."""
+        self.start += max(np.searchsorted(self.timestamps, time, side='right') - 1, 0)
+
+    def resample(self, clock, max_gap):
+        """Slerps onto ``clock``; keeps the samples later times may still need."""
+        out = slerp(self.timestamps, self.quaternions, clock, max_gap)
+        self.trim(clock[-1])
+        return out
+
+
+class HeadTrunkKinematics:
+    def __init__(self, calibrator=None, max_gap=0.1, has_chair=True, stale_after=1.0):
+        """
+        Incremental head-in-trunk and trunk-in-chair kinematics.
+
+        Batches of head, chest and chair orientations are fed in as they
+        arrive. Chest and chair are slerped onto the head sample times; a
+        head sample is emitted once every other stream has a sample at or
+        after it, so results never depend on how the data was batched. Per
+        emitted sample the relative orientations, their Euler angles and
+        their angular velocities are computed in one vectorized pass.
+
+        A stream whose newest sample is more than ``stale_after`` seconds
+        behind the head (a tracker stopped between trials, or dropped) is
+        treated as paused: head samples are emitted without waiting for it,
+        with NaN for the fields that need it. Likewise, while the head is
+        paused the other streams only keep their last ``stale_after``
+        seconds. Pending samples are thus bounded by ``stale_after`` instead
+        of growing for the whole pause.
+
+        Args:
+            calibrator: Optional ``IMUCalibrator``; sensors it has alignment
+                matrices for are aligned with ``apply_calibration_batch``
+                before the relative orientations are taken
+            max_gap: Largest source gap in seconds to interpolate across
+            has_chair: Whether a chair IMU is present; without one the
+                trunk fields are NaN
+            stale_after: Seconds a stream may lag the head before it is
+                treated as paused; keep it above the trackers' latency
+        """
+        self.calibrator = calibrator
+        self.max_gap = max_gap
+        self.stale_after = stale_after
+        self.tracks = {'head': _Track(), 'chest': _Track()}
+        if has_chair:
+            self.tracks['chair'] = _Track()
+        self._previous = {'head': None, 'trunk': None}
+
+    def add(self, name, timestamps, quaternions):
+        """
+        Adds a batch of one stream.
+
+        Args:
+            name: 'head', 'chest' or 'chair'
+            timestamps: (N,) host times in seconds, ascending
+            quaternions: (N, 4) orientations (w, x, y, z)
+        """
+        if not len(timestamps):
+            return
+        quaternions = np.asarray(quaternions, dtype=np.float64)
+        calibrator = self.calibrator
+        if calibrator is not None and name in calibrator.alignment_matrices:
+            quaternions = calibrator.apply_calibration_batch(quaternions, name)
+        self.tracks[name].add(np.asarray(timestamps, dtype=np.float64), quaternions)
+
+    def update(self):
+        """
+        Computes every head sample that can be completed so far.
+
+        Returns:
+            ``KINEMATICS_DTYPE`` array, possibly empty
+        """
+        head = self.tracks['head']
+        others = [track for name, track in self.tracks.items() if name != 'head']
+        # Future head samples come after the newest one, so older samples of
+        # the other streams are never needed; while no head samples are
+        # pending, anything more than stale_after behind a stream is dropped
+        for track in others:
+            if len(head):
+                track.trim(head.timestamps[0])
+            else:
+                track.trim(max(head.last_time(), track.last_time() - self.stale_after))
+        live = [track.last_time() for track in others
+                if head.last_time() - track.last_time() <= self.stale_after]
+        cutoff = min(live) if live else head.last_time()
+        n = np.searchsorted(head.timestamps, cutoff, side='right')
+        out = np.empty(n, KINEMATICS_DTYPE)
+        if not n:
+            return out
+        clock = head.timestamps[:n].copy()
+        head_q = head.quaternions[:n].copy()
+        head.consume(n)
+
+        chest_q = self.tracks['chest'].resample(clock, self.max_gap)
+        out['timestamp'] = clock
+        self._fill(out, 'head', clock, relative_orientation(chest_q, head_q))
+        if 'chair' in self.tracks:
+            chair_q = self.tracks['chair'].resample(clock, self.max_gap)
+            self._fill(out, 'trunk', clock, relative_orientation(chair_q, chest_q))
+        else:
+            for name in KINEMATICS_DTYPE.names[1:]:
+                if name.startswith('trunk_'):
+                    out[name] = np.nan
+        return out
+
+    def _fill(self, out, segment, clock, quaternions):
+        # Same hemisphere for every sample keeps the quaternion plots smooth
+        quaternions[quaternions[:, 0] < 0] *= -1
+        angles = euler_angles(quaternions)
+        velocity = angular_velocity(quaternions, clock, self._previous[segment])
+        self._previous[segment] = (quaternions[-1], clock[-1])
+        for i, name in enumerate(('yaw', 'pitch', 'roll')):
+            out[f'{segment}_{name}'] = angles[:, i]
+        for i, axis in enumerate('xyz'):
+            out[f'{segment}_velocity_{axis}'] = np.rad2deg(velocity[:, i])
+        for i, component in enumerate('wxyz'):
+            out[f'{segment}_quat_{component}'] = quaternions[:, i]
+        out[f'{segment}_speed'] = np.linalg.norm(velocity, axis=1)
+
+
+class KinematicsStage(threading.Thread):
+    def __init__(self, head, chest, chair=None, bus=None, calibrator=None,
+                 capacity=4096, poll_interval=0.05, max_gap=0.1, stale_after=1.0):
+        """
+        Background thread computing head/trunk kinematics as samples arrive.
+
+        Reads the head IMU, chest and chair subscriptions, runs
+        ``HeadTrunkKinematics`` on each batch and publishes the result on
+        the bus topic 'kinematics', which the live visualizer and any other
+        consumer subscribe to like to a device topic. The latest speeds are
+        kept for ``check_stillness``.
+
+        Args:
+            head: Subscription to the Neon IMU topic
+            chest: ``MotionSubscription`` of the chest tracker
+            chair: ``MotionSubscription`` of the chair-mounted (mobile)
+                tracker, or None
+            bus: ``StreamBus`` to publish on; without one results are only
+                kept for ``check_stillness``
+            calibrator: Optional ``IMUCalibrator`` applied to the inputs
+            capacity: Records kept in the 'kinematics' topic
+            poll_interval: Longest wait for new head samples in seconds
+            max_gap: Largest source gap in seconds to interpolate across
+            stale_after: Seconds a tracker may lag the head before it is
+                treated as paused (see ``HeadTrunkKinematics``)
+        """
+        super().__init__(daemon=True)
+        self.readers = {'head': head, 'chest': chest}
+        if chair is not None:
+            self.readers['chair'] = chair
+        self.kinematics = HeadTrunkKinematics(calibrator, max_gap, has_chair=chair is not None,
+                                              stale_after=stale_after)
+        self.topic = None if bus is None else bus.topic('kinematics', KINEMATICS_DTYPE, capacity)
+        self.poll_interval = poll_interval
+        self.samples = 0
+        self._recent = np.empty(0, KINEMATICS_DTYPE)
+        self._recent_size = 256
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.readers['head'].wait(self.poll_interval)
+            self.process()
+        self.process()
+
+    def process(self):
+        """Drains every reader once and publishes the completed samples."""
+        for name, reader in self.readers.items():
+            fields = QUATERNION_COLUMNS if 'quat_w' in reader.dtype.names else NEON_QUATERNION_FIELDS
+            batch = reader.read()
+            while len(batch):
+                self.kinematics.add(name, batch['timestamp'], as_quaternion_array(batch, fields))
+                batch = reader.read()
+        out = self.kinematics.update()
+        if not len(out):
+            return out
+        if self.topic is not None:
+            self.topic.extend(out)
+        self.samples += len(out)
+        self._recent = np.concatenate([self._recent, out])[-self._recent_size:]
+        return out
+
+    def check_stillness(self, calibrator, segment='head'):
+        """
+        ``IMUCalibrator.check_stillness`` on the latest relative speeds.
+
+        Args:
+            calibrator: ``IMUCalibrator`` supplying threshold and window
+            segment: 'head' (head in trunk) or 'trunk' (trunk in chair)
+        """
+        return calibrator.check_stillness(self._recent[f'{segment}_speed'])
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        for reader in self.readers.values():
+            reader.close()
@@ -0,0 +1,103 @@
+# quaternions.py
+# utils/quaternions.py
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+
+QUATERNION_COLUMNS = ['quat_w', 'quat_x', 'quat_y', 'quat_z']
+
+
+def as_quaternion_array(data, columns=QUATERNION_COLUMNS):
+    """
+    (N, 4) float64 quaternions (w, x, y, z) from an array or a table.
+
+    Args:
+        data: (N, 4) array, DataFrame or structured array with ``columns``
+        columns: Column names of w, x, y, z in a table
+    """
+    if hasattr(data, 'columns') or getattr(getattr(data, 'dtype', None), 'names', None):
+        return np.column_stack([np.asarray(data[name], dtype=np.float64) for name in columns])
+    return np.asarray(data, dtype=np.float64)
+
+
+def quat_multiply(a, b, out=None):
+    """
+    Hamilton product ``a * b`` of (..., 4) quaternions (w, x, y, z).
+
+    The rotation ``a * b`` applies ``b`` first, like the matrix product
+    ``A @ B``. Inputs broadcast against each other.
+
+    Args:
+        a, b: Quaternion arrays
+        out: Optional output array; may be ``a`` or ``b`` itself
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    aw, ax, ay, az = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bw, bx, by, bz = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    # All components are computed before any is written, so out may alias
+    w = aw * bw - ax * bx - ay * by - az * bz
+    x = aw * bx + ax * bw + ay * bz - az * by
+    y = aw * by - ax * bz + ay * bw + az * bx
+    z = aw * bz + ax * by - ay * bx + az * bw
+    if out is None:
+        out = np.empty(np.broadcast_shapes(a.shape, b.shape), dtype=np.float64)
+    out[..., 0], out[..., 1], out[..., 2], out[..., 3] = w, x, y, z
+    return out
+
+
+def quat_conjugate(q, out=None):
+    """Conjugate (the inverse, for unit quaternions) of (..., 4) quaternions."""
+    q = np.asarray(q, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(q)
+    out[..., 0] = q[..., 0]
+    np.negative(q[..., 1:], out=out[..., 1:])
+    return out
+
+
+def quat_to_matrix(q, out=None):
+    """
+    Rotation matrices (..., 3, 3) of (..., 4) quaternions (w, x, y, z).
+
+    Quaternions need not be exactly unit length; they are normalized
+    implicitly.
+    """
+    q = np.asarray(q, dtype=np.float64)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    s = 2.0 / np.einsum('...i,...i->...', q, q)
+    if out is None:
+        out = np.empty(q.shape[:-1] + (3, 3), dtype=np.float64)
+    xx, yy, zz = s * x * x, s * y * y, s * z * z
+    xy, xz, yz = s * x * y, s * x * z, s * y * z
+    wx, wy, wz = s * w * x, s * w * y, s * w * z
+    out[..., 0, 0] = 1.0 - yy - zz
+    out[..., 0, 1] = xy - wz
+    out[..., 0, 2] = xz + wy
+    out[..., 1, 0] = xy + wz
+    out[..., 1, 1] = 1.0 - xx - zz
+    out[..., 1, 2] = yz - wx
+    out[..., 2, 0] = xz - wy
+    out[..., 2, 1] = yz + wx
+    out[..., 2, 2] = 1.0 - xx - yy
+    return out
+
+
+def matrix_to_quat(matrix):
+    """Quaternions (w, x, y, z) with w >= 0 of (..., 3, 3) rotation matrices."""
+    q = Rotation.from_matrix(matrix).as_quat()[..., [3, 0, 1, 2]]
+    return np.where(q[..., :1] < 0, -q, q)
+
+
+def quat_rotate(q, v):
+    """
+    Rotates (..., 3) vectors by (..., 4) unit quaternions (w, x, y, z).
+
+    Uses ``v + 2w (u x v) + 2 u x (u x v)`` with ``u`` the vector part, so
+    no rotation matrices are built. Inputs broadcast against each other.
+    """
+    q = np.asarray(q, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    u = q[..., 1:]
+    t = 2.0 * np.cross(u, v)
+    return v + q[..., :1] * t + np.cross(u, t)
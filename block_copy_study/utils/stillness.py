@@ -0,0 +1,276 @@
+# stillness.py
+# utils/stillness.py
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+import numpy as np
+from .kinematics import NEON_QUATERNION_FIELDS, angular_velocity
+from .quaternions import QUATERNION_COLUMNS, as_quaternion_array
+
+
+@dataclass
+class StillnessEvent:
+    """A sensor became still ('start') or started moving again ('stop')."""
+    sensor: str
+    kind: str
+    timestamp: float
+
+
+class StillnessDetector:
+    def __init__(self, name, window_size=10, threshold=0.05, variance_threshold=None,
+                 acceleration_variance_threshold=None):
+        """
+        Streaming stillness gate for one sensor.
+
+        Every update and query is O(1): the windowed maximum of the angular
+        speed is kept in a monotonic deque, and the variances come from
+        running sums over the window. A sensor is still while the window is
+        full and
+
+        - the largest angular speed in it is below ``threshold``,
+        - the angular velocity variance, summed over the three axes, is
+          below ``variance_threshold`` (if set), and
+        - the acceleration magnitude variance is below
+          ``acceleration_variance_threshold`` (if set; samples without
+          acceleration, or with NaN acceleration, never count as still then).
+
+        Listeners added with ``subscribe`` receive a ``StillnessEvent`` on
+        every transition.
+
+        Args:
+            name: Sensor name reported in events
+            window_size: Samples per window
+            threshold: Largest angular speed (rad/s) counted as still
+            variance_threshold: Largest angular velocity variance (rad/s)^2
+            acceleration_variance_threshold: Largest acceleration magnitude
+                variance, in the square of the sensor's acceleration unit
+        """
+        self.name = name
+        self.window_size = window_size
+        self.threshold = threshold
+        self.variance_threshold = variance_threshold
+        self.acceleration_variance_threshold = acceleration_variance_threshold
+        self.still = False
+        self.since = None
+        self._listeners = []
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._maxima = deque()  # (sample index, speed), speeds decreasing
+        self._window = deque()  # (wx, wy, wz, acceleration magnitude or None)
+        self._sums = [0.0] * 6  # wx, wy, wz, wx^2, wy^2, wz^2
+        self._acceleration_sums = [0.0, 0.0]
+        self._acceleration_count = 0
+
+    def subscribe(self, callback):
+        """Calls ``callback(event)`` on every stillness start and stop."""
+        self._listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def update(self, timestamp, angular_velocity, acceleration=None):
+        """
+        Adds one sample.
+
+        Args:
+            timestamp: Sample time in seconds
+            angular_velocity: (x, y, z) in rad/s; NaN counts as moving
+            acceleration: Optional (x, y, z) acceleration; NaN counts as missing
+
+        Returns:
+            True if the sensor is still after this sample
+        """
+        wx, wy, wz = angular_velocity
+        speed = math.sqrt(wx * wx + wy * wy + wz * wz)
+        if speed != speed:
+            # Unknown velocity (e.g. the first sample): keeps the window moving
+            wx = wy = wz = 0.0
+            speed = math.inf
+        magnitude = None
+        if acceleration is not None:
+            ax, ay, az = acceleration
+            magnitude = math.sqrt(ax * ax + ay * ay + az * az)
+            if magnitude != magnitude:
+                magnitude = None
+
+        index = self.count
+        self.count += 1
+        maxima = self._maxima
+        while maxima and maxima[-1][1] <= speed:
+            maxima.pop()
+        maxima.append((index, speed))
+        if maxima[0][0] <= index - self.window_size:
+            maxima.popleft()
+
+        sums = self._sums
+        self._window.append((wx, wy, wz, magnitude))
+        sums[0] += wx
+        sums[1] += wy
+        sums[2] += wz
+        sums[3] += wx * wx
+        sums[4] += wy * wy
+        sums[5] += wz * wz
+        if magnitude is not None:
+            self._acceleration_sums[0] += magnitude
+            self._acceleration_sums[1] += magnitude * magnitude
+            self._acceleration_count += 1
+        if len(self._window) > self.window_size:
+            ox, oy, oz, old_magnitude = self._window.popleft()
+            sums[0] -= ox
+            sums[1] -= oy
+            sums[2] -= oz
+            sums[3] -= ox * ox
+            sums[4] -= oy * oy
+            sums[5] -= oz * oz
+            if old_magnitude is not None:
+                self._acceleration_sums[0] -= old_magnitude
+                self._acceleration_sums[1] -= old_magnitude * old_magnitude
+                self._acceleration_count -= 1
+
+        still = self._is_still()
+        if still != self.still:
+            self.still = still
+            self.since = timestamp
+            event = StillnessEvent(self.name, 'start' if still else 'stop', timestamp)
+            for callback in self._listeners:
+                callback(event)
+        return still
+
+    def update_batch(self, timestamps, angular_velocities, accelerations=None):
+        """
+        Adds a batch of samples in order.
+
+        Args:
+            timestamps: (N,) sample times
+            angular_velocities: (N, 3) rad/s
+            accelerations: Optional (N, 3)
+
+        Returns:
+            (N,) bool array, True where the sensor was still
+        """
+        velocities = np.asarray(angular_velocities, dtype=np.float64).tolist()
+        times = np.asarray(timestamps, dtype=np.float64).tolist()
+        if accelerations is None:
+            samples = zip(times, velocities)
+            return np.array([self.update(t, w) for t, w in samples], dtype=bool)
+        samples = zip(times, velocities, np.asarray(accelerations, dtype=np.float64).tolist())
+        return np.array([self.update(t, w, a) for t, w, a in samples], dtype=bool)
+
+    def window_max(self):
+        """Largest angular speed (rad/s) in the current window."""
+        return self._maxima[0][1] if self._maxima else math.nan
+
+    def angular_variance(self):
+        """Angular velocity variance over the window, summed over the axes."""
+        n = len(self._window)
+        if not n:
+            return math.nan
+        sums = self._sums
+        return max(sum(sums[3 + i] / n - (sums[i] / n) ** 2 for i in range(3)), 0.0)
+
+    def acceleration_variance(self):
+        """Acceleration magnitude variance over the window's samples with acceleration."""
+        n = self._acceleration_count
+        if not n:
+            return math.nan
+        total, squares = self._acceleration_sums
+        return max(squares / n - (total / n) ** 2, 0.0)
+
+    def _is_still(self):
+        if len(self._window) < self.window_size or self.window_max() >= self.threshold:
+            return False
+        if self.variance_threshold is not None and \
+                self.angular_variance() >= self.variance_threshold:
+            return False
+        if self.acceleration_variance_threshold is not None:
+            return (self._acceleration_count == self.window_size and
+                    self.acceleration_variance() < self.acceleration_variance_threshold)
+        return True
+
+
+class MotionSource:
+    """Angular velocity (and acceleration) of one subscription, batch by batch."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        names = reader.dtype.names
+        self.gyro = 'rotation_x' in names
+        self.acceleration = 'acceleration_x' in names
+        self.fields = QUATERNION_COLUMNS if 'quat_w' in names else NEON_QUATERNION_FIELDS
+        self._previous = None
+
+    def velocities(self, batch):
+        """
+        Returns:
+            Tuple of (timestamps, (N, 3) angular velocity in rad/s,
+            (N, 3) acceleration or None)
+        """
+        timestamps = batch['timestamp']
+        if self.gyro:
+            # Neon gyroscope, deg/s
+            velocity = np.deg2rad(np.column_stack([batch['rotation_x'], batch['rotation_y'],
+                                                   batch['rotation_z']]))
+        else:
+            quaternions = as_quaternion_array(batch, self.fields)
+            velocity = angular_velocity(quaternions, timestamps, self._previous)
+            self._previous = (quaternions[-1], timestamps[-1])
+        acceleration = None
+        if self.acceleration:
+            acceleration = np.column_stack([batch['acceleration_x'], batch['acceleration_y'],
+                                            batch['acceleration_z']])
+        return timestamps, velocity, acceleration
+
+
+class StillnessMonitor(threading.Thread):
+    def __init__(self, readers, poll_interval=0.05, **detector_kwargs):
+        """
+        Background thread gating stillness on several streams at full rate.
+
+        Each reader gets its own ``StillnessDetector``. Streams with a
+        gyroscope (the Neon IMU) use it directly; the MetaWear trackers get
+        angular velocity from consecutive fusion quaternions.
+
+        Args:
+            readers: Subscriptions keyed by sensor name
+            poll_interval: Longest wait for new samples in seconds
+            **detector_kwargs: Passed to every ``StillnessDetector``
+        """
+        super().__init__(daemon=True)
+        self.sources = {name: MotionSource(reader) for name, reader in readers.items()}
+        self.detectors = {name: StillnessDetector(name, **detector_kwargs) for name in readers}
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def subscribe(self, callback):
+        """Calls ``callback(event)`` on stillness transitions of any sensor."""
+        for detector in self.detectors.values():
+            detector.subscribe(callback)
+        return callback
+
+    def is_still(self, name):
+        return self.detectors[name].still
+
+    def run(self):
+        first = next(iter(self.sources.values()))
+        while not self._stop_event.is_set():
+            first.reader.wait(self.poll_interval)
+            self.process()
+        self.process()
+
+    def process(self):
+        for name, source in self.sources.items():
+            batch = source.reader.read()
+            while len(batch):
+                self.detectors[name].update_batch(*source.velocities(batch))
+                batch = source.reader.read()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        for source in self.sources.values():
+            source.reader.close()
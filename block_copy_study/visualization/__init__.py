@@ -1,5 +1,6 @@
 # visualization/__init__.py
-from .real_time_viz import ExperimentVisualizer
+from .real_time_viz import ExperimentVisualizer, VisualizerProcess
 from .analysis_viz import DataVisualizer
+from .summary_cache import SummaryCache
 
-__all__ = ['ExperimentVisualizer', 'DataVisualizer']
\ No newline at end of file
+__all__ = ['ExperimentVisualizer', 'VisualizerProcess', 'DataVisualizer', 'SummaryCache']
\ No newline at end of file
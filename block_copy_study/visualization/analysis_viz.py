@@ -1,31 +1,333 @@
 # analysis_viz.py
 # visualization/analysis_viz.py
 import matplotlib.pyplot as plt
+from matplotlib.patches import Patch
 import seaborn as sns
 import pandas as pd
 import numpy as np
+import os
+from experiment.session_reader import SessionReader, session_base
+from utils.aoi import aoi_metrics_by_trial
+from .summary_cache import SummaryCache
+
+
+TRIAL_KEYS = ['posture', 'angle', 'trial_num']
+
+
+def binned_counts(values, width):
+    """
+    Sparse histogram over the full range of ``values``.
+
+    Bins are ``width`` wide and aligned to 0, so histograms of different
+    trials merge by adding counts and no sample falls outside the grid.
+    Non-finite samples are skipped.
+
+    Args:
+        values: Samples (N,), or points (N, D)
+        width: Bin width in the unit of the values
+
+    Returns:
+        Tuple of (bin indices (M,) or (M, D), counts (M,)), sorted by bin
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values) if values.ndim == 1 else np.isfinite(values).all(axis=1)
+    bins = np.floor(values[finite] / width).astype(np.int64)
+    return np.unique(bins, axis=0, return_counts=True)
+
+
+def merge_counts(histograms):
+    """Adds sparse histograms returned by ``binned_counts``."""
+    histograms = list(histograms)
+    bins = np.concatenate([bins for bins, _ in histograms])
+    counts = np.concatenate([counts for _, counts in histograms])
+    bins, inverse = np.unique(bins, axis=0, return_inverse=True)
+    return bins, np.bincount(inverse.ravel(), weights=counts, minlength=len(bins)).astype(np.int64)
+
+
+def histogram_box(bins, counts, width):
+    """
+    Approximate box plot statistics of binned samples, for ``Axes.bxp``.
+
+    Quartiles are interpolated within their bin; whiskers reach the
+    furthest occupied bin within 1.5 IQR and every occupied bin beyond
+    them is an outlier, each drawn at its bin centre. All values are
+    within one bin width of the exact statistics.
+
+    Args:
+        bins, counts: Sparse histogram from ``binned_counts``
+        width: Bin width
+
+    Returns:
+        Dictionary of ``med``, ``q1``, ``q3``, ``whislo``, ``whishi`` and
+        ``fliers``; None for an empty histogram
+    """
+    total = counts.sum()
+    if not total:
+        return None
+    cumulative = np.cumsum(counts)
+    ranks = np.array([0.25, 0.5, 0.75]) * (total - 1) + 0.5
+    index = np.searchsorted(cumulative, ranks, side='right')
+    before = np.where(index > 0, cumulative[index - 1], 0)
+    q1, med, q3 = (bins[index] + (ranks - before) / counts[index]) * width
+    centres = (bins + 0.5) * width
+    iqr = q3 - q1
+    inside = (centres >= q1 - 1.5 * iqr) & (centres <= q3 + 1.5 * iqr)
+    whislo = centres[inside].min() if inside.any() else q1
+    whishi = centres[inside].max() if inside.any() else q3
+    return {'med': med, 'q1': q1, 'q3': q3, 'whislo': min(whislo, q1),
+            'whishi': max(whishi, q3), 'fliers': centres[~inside]}
+
+
+def _samples(columns):
+    """Per-trial reducer keeping ``columns`` as arrays, for exact figures."""
+    return lambda frame: {column: frame[column].to_numpy(np.float64) for column in columns}
+
+
+def _rows(summaries, columns):
+    """Expands ``_samples`` summaries back into rows labelled with posture and angle."""
+    frames = [pd.DataFrame({column: trial[column] for column in columns})
+              .assign(posture=trial['posture'], angle=trial['angle'])
+              for _, trial in summaries.iterrows()]
+    if not frames:
+        return pd.DataFrame(columns=list(columns) + ['posture', 'angle'])
+    return pd.concat(frames, ignore_index=True)
 
 
 class DataVisualizer:
-    def __init__(self, data_path):
-        self.data = pd.read_csv(data_path)
+    def __init__(self, data_path, cache_dir=None, cache_size=512 * 2 ** 20,
+                 gaze_cell=None, angle_bin=None):
+        """
+        Post-hoc plots across postures and angles.
+
+        Plots are drawn from per-trial summaries, computed one trial at a
+        time and kept in an on-disk ``SummaryCache``. By default a summary
+        holds just the trial's plotted columns as arrays, and the figures
+        are exactly those drawn from the raw rows. Setting ``gaze_cell`` or
+        ``angle_bin`` caches sparse histograms over the full data range
+        instead, which are far smaller but approximate: gaze is drawn as one
+        marker per occupied cell, and box plot quartiles, whiskers and
+        outliers are only accurate to one bin.
+
+        Args:
+            data_path: Either a joined CSV table that already has ``posture``
+                and ``angle`` columns (read on first use), or one or more
+                recorded sessions given by prefix or by any session file.
+                Sessions are read lazily through memory-mapped
+                ``SessionReader`` objects, one trial at a time.
+            cache_dir: Directory of the summary cache; defaults to
+                ``.summary_cache`` next to the data, False disables caching
+            cache_size: Largest cache size in bytes
+            gaze_cell: Gaze cell size in pixels; None plots every sample
+            angle_bin: Angle bin width in degrees; None draws exact box plots
+        """
+        paths = list(data_path) if isinstance(data_path, (list, tuple)) else [data_path]
+        if len(paths) == 1 and session_base(paths[0]) == str(paths[0]) \
+                and str(paths[0]).endswith('.csv'):
+            self.csv_path = str(paths[0])
+            self.sessions = []
+        else:
+            self.csv_path = None
+            self.sessions = [SessionReader(path) for path in paths]
+        self._data = None
+        self.gaze_cell = gaze_cell
+        self.angle_bin = angle_bin
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(str(paths[0])) or '.', '.summary_cache')
+        self.cache = SummaryCache(cache_dir, cache_size) if cache_dir is not False else None
+
+    @property
+    def data(self):
+        """The joined CSV table, read on first use; None for recorded sessions."""
+        if self._data is None and self.csv_path is not None:
+            self._data = pd.read_csv(self.csv_path)
+        return self._data
+
+    def _cached(self, name, sources, params, compute):
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(name, sources, params, compute)
+
+    def _sources(self, session, stream):
+        """Files a session's ``stream`` summaries are computed from."""
+        return [f"{session.base_path}_trials.csv", f"{session.base_path}_{stream}.bcol"]
+
+    def trial_summaries(self, name, stream, columns, reduce, params=None, location=None):
+        """
+        One summary per trial of every session, cached per session.
+
+        Args:
+            name: Summary name in the cache key
+            stream: 'gaze' or 'motion'
+            columns: Stream columns ``reduce`` needs
+            reduce: Callable mapping one trial's rows to a dict of values
+            params: Parameters of ``reduce`` that change its result
+            location: For the motion stream, only rows of this location
+
+        Returns:
+            DataFrame with ``session``, ``posture``, ``angle``,
+            ``trial_num`` and the keys returned by ``reduce``
+        """
+        params = {'columns': list(columns), 'location': location, 'params': params}
+        if self.csv_path is not None:
+            return self._cached(name, [self.csv_path], params,
+                                lambda: self._csv_summaries(columns, reduce, location))
+
+        def compute(session):
+            rows = []
+            for _, trial in session.trials.iterrows():
+                frame = session.load(stream, columns, posture=trial['posture'],
+                                     angle=trial['angle'], trial_num=trial['trial_num'],
+                                     location=location, labels=())
+                rows.append(dict({'session': os.path.basename(session.base_path)},
+                                 **{key: trial[key] for key in TRIAL_KEYS}, **reduce(frame)))
+            return pd.DataFrame(rows)
+        tables = [self._cached(name, self._sources(session, stream), params,
+                               lambda session=session: compute(session))
+                  for session in self.sessions]
+        return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+    def _csv_summaries(self, columns, reduce, location=None):
+        frame = self.data
+        if location is not None:
+            frame = frame.rename(columns={f'{location}_{c}': c for c in columns})
+        # A joined table tells participants apart by participant_id, if at all
+        keys = [c for c in ['participant_id'] + TRIAL_KEYS if c in frame]
+        rows = []
+        for key, trial in frame.groupby(keys, sort=False):
+            row = dict(zip(keys, key))
+            row['session'] = row.pop('participant_id', None)
+            row.update(reduce(trial[list(columns)]))
+            rows.append(row)
+        return pd.DataFrame(rows)
 
     def plot_gaze_patterns(self):
+        """Gaze per posture coloured by angle; one marker per cell if ``gaze_cell`` is set."""
+        columns = ['gaze_x', 'gaze_y']
+        if self.gaze_cell is None:
+            summaries = self.trial_summaries('gaze_samples', 'gaze', columns, _samples(columns))
+        else:
+            summaries = self.trial_summaries(
+                'gaze_cells', 'gaze', columns,
+                lambda frame: dict(zip(('cells', 'counts'), binned_counts(frame[columns], self.gaze_cell))),
+                params=self.gaze_cell)
         fig, axes = plt.subplots(3, 1, figsize=(12, 15))
         for i, posture in enumerate(['sit', 'stand', 'swivel']):
-            posture_data = self.data[self.data['posture'] == posture]
-            sns.scatterplot(data=posture_data, x='gaze_x', y='gaze_y',
-                            hue='angle', ax=axes[i])
+            rows = summaries[summaries['posture'] == posture] if len(summaries) else summaries
+            if self.gaze_cell is None:
+                sns.scatterplot(data=_rows(rows, columns), x='gaze_x', y='gaze_y',
+                                hue='angle', ax=axes[i])
+            elif len(rows):
+                sns.scatterplot(data=self._cells(rows), x='gaze_x', y='gaze_y', hue='angle',
+                                size='share', ax=axes[i])
             axes[i].set_title(f'Gaze Patterns - {posture}')
         plt.tight_layout()
         return fig
 
+    def _cells(self, summaries):
+        """Occupied gaze cells per angle, at the cell centre, with their share of samples."""
+        points = []
+        for angle, trials in summaries.groupby('angle'):
+            cells, counts = merge_counts(zip(trials['cells'], trials['counts']))
+            centres = (cells + 0.5) * self.gaze_cell
+            points.append(pd.DataFrame({'gaze_x': centres[:, 0], 'gaze_y': centres[:, 1],
+                                        'share': counts / counts.sum(), 'angle': angle}))
+        return pd.concat(points, ignore_index=True)
+
+    def plot_aoi_dwell(self, aois):
+        """
+        Dwell time and revisits per AOI for each posture and angle.
+
+        Metrics are computed per trial, so visits and transitions never run
+        across trial boundaries; the bars average the trials of a condition.
+
+        Args:
+            aois: ``AOISet`` of model, resource, workspace and block regions
+        """
+        table = self.aoi_table(aois)
+        angles = sorted(table['angle'].unique()) if len(table) else []
+        fig, axes = plt.subplots(2, max(len(angles), 1), figsize=(6 * max(len(angles), 1), 10),
+                                 squeeze=False)
+        for j, angle in enumerate(angles):
+            rows = table[table['angle'] == angle]
+            sns.barplot(data=rows, x='aoi', y='dwell_time', hue='posture', ax=axes[0][j])
+            sns.barplot(data=rows, x='aoi', y='revisits', hue='posture', ax=axes[1][j])
+            axes[0][j].set_title(f'Angle {angle}')
+            axes[0][j].set_ylabel('Dwell time per trial (s)')
+            axes[1][j].set_ylabel('Revisits per trial')
+        plt.tight_layout()
+        return fig
+
+    def aoi_table(self, aois):
+        """
+        Per-trial AOI metrics of every session.
+
+        Returns:
+            Long DataFrame with one row per session, trial and AOI
+            (``session``, ``posture``, ``angle``, ``trial_num``, ``aoi`` and
+            the ``aoi_metrics`` columns)
+        """
+        layout = {'cell_size': aois.cell_size,
+                  'aois': [(aoi.name, aoi.vertices.tolist(), aoi.is_rectangle) for aoi in aois.aois]}
+
+        def metrics(frame):
+            summary = aoi_metrics_by_trial(frame.assign(trial=0), aois, by=['trial'])[0]
+            return {'metrics': summary.drop(columns='trial', errors='ignore')}
+        summaries = self.trial_summaries('aoi_dwell', 'gaze', ['timestamp', 'gaze_x', 'gaze_y'],
+                                         metrics, params=layout)
+        keys = ['session'] + TRIAL_KEYS
+        tables = [trial['metrics'].assign(**{key: trial[key] for key in keys})
+                  for _, trial in summaries.iterrows() if len(trial['metrics'])]
+        tables = [table[keys + [c for c in table if c not in keys]] for table in tables]
+        return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
     def plot_motion_summary(self):
-        fig, axes = plt.subplots(2, 2, figsize=(15, 15))
+        """Pitch, roll and yaw of head and chest per posture and angle."""
         metrics = ['pitch', 'roll', 'yaw']
+        fig, axes = plt.subplots(2, len(metrics), figsize=(15, 15))
         for i, location in enumerate(['head', 'chest']):
+            if self.angle_bin is None:
+                summaries = self.trial_summaries('motion_samples', 'motion', metrics,
+                                                 _samples(metrics), location=location)
+                location_data = _rows(summaries, metrics)
+            else:
+                summaries = self.trial_summaries(
+                    'angle_histograms', 'motion', metrics,
+                    lambda frame: {metric: binned_counts(frame[metric], self.angle_bin)
+                                   for metric in metrics},
+                    params=self.angle_bin, location=location)
             for j, metric in enumerate(metrics):
-                sns.boxplot(data=self.data, x='posture', y=f'{location}_{metric}',
-                            hue='angle', ax=axes[i][j])
+                if self.angle_bin is None:
+                    if len(location_data):
+                        sns.boxplot(data=location_data, x='posture', y=metric,
+                                    hue='angle', ax=axes[i][j])
+                else:
+                    self._boxes(axes[i][j], summaries, metric)
+                axes[i][j].set_ylabel(f'{location}_{metric}')
         plt.tight_layout()
-        return fig
\ No newline at end of file
+        return fig
+
+    def _boxes(self, ax, summaries, metric):
+        """Box per posture and angle from the merged per-trial histograms."""
+        if not len(summaries):
+            return
+        postures = list(dict.fromkeys(summaries['posture']))
+        angles = sorted(summaries['angle'].unique())
+        colors = sns.color_palette(n_colors=len(angles))
+        width = 0.8 / len(angles)
+        for k, angle in enumerate(angles):
+            stats, positions = [], []
+            for p, posture in enumerate(postures):
+                trials = summaries[(summaries['posture'] == posture) & (summaries['angle'] == angle)]
+                box = histogram_box(*merge_counts(trials[metric]), self.angle_bin) \
+                    if len(trials) else None
+                if box is not None:
+                    stats.append(box)
+                    positions.append(p - 0.4 + width * (k + 0.5))
+            if stats:
+                ax.bxp(stats, positions=positions, widths=width * 0.9, patch_artist=True,
+                       boxprops={'facecolor': colors[k]})
+        ax.set_xticks(range(len(postures)), postures)
+        ax.set_xlabel('posture')
+        ax.legend(handles=[Patch(facecolor=colors[k], label=angle)
+                           for k, angle in enumerate(angles)], title='angle')
+
@@ -2,50 +2,273 @@
 # visualization/real_time_viz.py
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+import multiprocessing
 import time
 import numpy as np
+from hardware.ring_buffer import RingBuffer
+from hardware.stream_bus import SharedTopic
+
+
+def decimate_minmax(times, values, t_start, t_end, n_bins):
+    """
+    Reduces a time series to a min/max pair per screen column.
+
+    The window ``[t_start, t_end)`` is split into ``n_bins`` equal time bins
+    and each non-empty bin becomes two points at its centre: the bin
+    minimum and maximum. Drawn as a line this keeps every spike visible
+    while the point count stays bounded by the plot width.
+
+    Args:
+        times: Sorted sample times
+        values: Sample values
+        t_start, t_end: Time range covered by the bins
+        n_bins: Number of bins, typically the axes width in pixels
+
+    Returns:
+        Tuple of (times, values) arrays of at most ``2 * n_bins`` points
+    """
+    if len(times) <= 2 * n_bins:
+        return times, values
+    edges = np.searchsorted(times, np.linspace(t_start, t_end, n_bins + 1))
+    filled = np.flatnonzero(edges[:-1] < edges[1:])
+    starts = edges[filled]
+    lows = np.minimum.reduceat(values, starts)
+    highs = np.maximum.reduceat(values, starts)
+    centres = t_start + (filled + 0.5) * (t_end - t_start) / n_bins
+    return np.repeat(centres, 2), np.column_stack([lows, highs]).ravel()
+
+
+class _Panel:
+    def __init__(self, ax, title, channels, ylim, capacity):
+        """
+        Fixed-size history and line artists of one subplot.
+
+        Args:
+            ax: Axes to draw into
+            title: Axes title
+            channels: Field names plotted as one line each
+            ylim: Fixed y-axis limits
+            capacity: Samples kept; covers the visible window at the
+                highest expected sample rate
+        """
+        self.ax = ax
+        self.channels = list(channels)
+        self.history = RingBuffer(capacity, dtype=[('timestamp', 'f8')] +
+                                  [(name, 'f8') for name in self.channels])
+        self.lines = [ax.plot([], [], label=name, animated=True)[0] for name in self.channels]
+        ax.set_title(title)
+        ax.set_ylim(*ylim)
+        ax.legend(loc='upper left')
+
+    def extend(self, timestamps, columns):
+        records = np.empty(len(timestamps), dtype=self.history.dtype)
+        records['timestamp'] = timestamps
+        for name in self.channels:
+            records[name] = columns[name]
+        self.history.extend(records)
+
+    def redraw(self, current_time, time_window):
+        """Updates the line data for the visible window; returns the artists."""
+        history = self.history.view()
+        times = history['timestamp']
+        t_start = current_time - time_window
+        visible = history[np.searchsorted(times, t_start):]
+        n_bins = max(int(self.ax.bbox.width), 1)
+        for name, line in zip(self.channels, self.lines):
+            t, y = decimate_minmax(visible['timestamp'], visible[name],
+                                   t_start, current_time, n_bins)
+            # Times are drawn relative to now, so the x-limits never change
+            line.set_data(t - current_time, y)
+        return self.lines
 
 
 class ExperimentVisualizer:
-    def __init__(self, experiment):
+    def __init__(self, experiment=None, time_window=5.0, fps=30, max_rate=250, topics=None):
+        """
+        Live view of gaze, head, chest and mobile motion, of the head
+        orientation relative to the trunk from the kinematics stage and of
+        the stream-to-gaze lags reported by the synchronizer stage.
+
+        Each panel keeps only the last ``time_window`` seconds in a
+        preallocated ring buffer, so memory is constant over a session.
+        Lines are decimated to min/max pairs per pixel column and redrawn
+        with blitting: axes, ticks and labels are drawn once and only the
+        line artists are re-rendered each frame.
+
+        Args:
+            experiment: Running ``BlockCopyExperiment``
+            time_window: Seconds of data shown
+            fps: Target redraw rate
+            max_rate: Highest expected sample rate (Hz) of any stream
+            topics: Instead of an experiment, topics keyed by panel ('gaze',
+                'head', 'chest', 'mobile', 'kinematics', 'sync'); used by
+                ``VisualizerProcess``
+        """
         self.exp = experiment
-        self.fig = plt.figure(figsize=(15, 10))
+        self.topics = topics
+        self.time_window = time_window
+        self.fps = fps
+        self.capacity = int(max_rate * time_window * 1.5)
+        self.fig = plt.figure(figsize=(15, 12))
         self.setup_plots()
-        self.time_window = 5.0
-        self.history = self._initialize_history()
+        self._sources = None
 
     def setup_plots(self):
-        gs = self.fig.add_gridspec(3, 2)
+        gs = self.fig.add_gridspec(5, 2)
         self.gaze_ax = self.fig.add_subplot(gs[0, 0])
         self.head_ax = self.fig.add_subplot(gs[0, 1])
         self.chest_ax = self.fig.add_subplot(gs[1, :])
         self.mobile_ax = self.fig.add_subplot(gs[2, :])
+        self.kinematics_ax = self.fig.add_subplot(gs[3, :])
+        self.sync_ax = self.fig.add_subplot(gs[4, :])
 
-    def _initialize_history(self):
-        return {
-            'times': {loc: [] for loc in ['gaze', 'head', 'chest', 'mobile']},
-            'data': {loc: defaultdict(list) for loc in ['gaze', 'head', 'chest', 'mobile']}
+        self.panels = {
+            'gaze': _Panel(self.gaze_ax, 'Gaze (px)', ['gaze_x', 'gaze_y'],
+                           (0, 1600), self.capacity),
+            'head': _Panel(self.head_ax, 'Head rotation (deg/s)',
+                           ['rotation_x', 'rotation_y', 'rotation_z'], (-300, 300), self.capacity),
+            'chest': _Panel(self.chest_ax, 'Chest orientation (deg)',
+                            ['pitch', 'roll', 'yaw'], (-180, 360), self.capacity),
+            'mobile': _Panel(self.mobile_ax, 'Mobile orientation (deg)',
+                             ['pitch', 'roll', 'yaw'], (-180, 360), self.capacity),
+            'kinematics': _Panel(self.kinematics_ax, 'Head in trunk (deg)',
+                                 ['head_yaw', 'head_pitch', 'head_roll'], (-180, 180),
+                                 self.capacity),
+            'sync': _Panel(self.sync_ax, 'Mean lag to gaze (ms)',
+                           ['gaze_head_mean', 'gaze_chest_mean', 'gaze_mobile_mean'], (0, 20),
+                           self.capacity)
         }
+        for ax in (self.gaze_ax, self.head_ax, self.chest_ax, self.mobile_ax,
+                   self.kinematics_ax, self.sync_ax):
+            ax.set_xlim(-self.time_window, 0)
+        self.sync_ax.set_xlabel('Time (s)')
+
+    def _initialize_sources(self):
+        """
+        Bus subscriptions feeding the live view.
+
+        They use the 'latest' policy: if rendering falls behind, old samples
+        are skipped for this view only, never for the logger. Created on the
+        first frame because the asynchronous engine connects devices after
+        the visualizer exists.
+
+        Motion timestamps come from the trackers' clock models in-process;
+        a separate process has no clock model and uses the arrival times.
+        """
+        if self.topics is not None:
+            return [(name, topic.subscribe('visualizer', 'latest', max_lag=self.capacity), None)
+                    for name, topic in self.topics.items()]
+
+        eye, chest, mobile = self.exp.eye_tracker, self.exp.chest_imu, self.exp.mobile_imu
+        sources = [
+            ('gaze', eye.gaze_buffer, None),
+            ('head', eye.imu_buffer, None),
+            ('chest', chest.euler_buffer, chest.clock),
+            ('mobile', mobile.euler_buffer, mobile.clock)
+        ]
+        if self.exp.kinematics is not None:
+            sources.append(('kinematics', self.exp.kinematics.topic, None))
+        if self.exp.sync is not None:
+            sources.append(('sync', self.exp.sync.topic, None))
+        return [(name, topic.subscribe('visualizer', 'latest', max_lag=self.capacity), clock)
+                for name, topic, clock in sources]
+
+    def init_animation(self):
+        lines = []
+        for panel in self.panels.values():
+            for line in panel.lines:
+                line.set_data([], [])
+                lines.append(line)
+        return lines
 
     def update(self, frame):
         current_time = time.time()
         self._update_data()
-        self._update_plots(current_time)
+        return self._update_plots(current_time)
 
     def _update_data(self):
-        for location, queue in self.exp.data_queues.items():
-            while not queue.empty():
-                data = queue.get()
-                self.history['times'][location].append(data['timestamp'])
-                for key, value in data.items():
-                    if key != 'timestamp':
-                        self.history['data'][location][key].append(value)
+        if self._sources is None:
+            self._sources = self._initialize_sources()
+        for name, subscription, clock in self._sources:
+            batch = subscription.read()
+            while len(batch):
+                if clock is not None:
+                    timestamps = clock.to_host(batch['epoch'] / 1000.0)
+                elif 'timestamp' in batch.dtype.names:
+                    timestamps = batch['timestamp']
+                else:
+                    timestamps = batch['arrival']
+                self.panels[name].extend(timestamps, batch)
+                batch = subscription.read()
 
     def _update_plots(self, current_time):
-        self._plot_gaze(current_time)
-        self._plot_head_motion(current_time)
-        self._plot_body_motion(current_time)
+        return (self._plot_gaze(current_time) +
+                self._plot_head_motion(current_time) +
+                self._plot_body_motion(current_time))
+
+    def _plot_gaze(self, current_time):
+        return self.panels['gaze'].redraw(current_time, self.time_window)
+
+    def _plot_head_motion(self, current_time):
+        return self.panels['head'].redraw(current_time, self.time_window)
+
+    def _plot_body_motion(self, current_time):
+        return (self.panels['chest'].redraw(current_time, self.time_window) +
+                self.panels['mobile'].redraw(current_time, self.time_window) +
+                self.panels['kinematics'].redraw(current_time, self.time_window) +
+                self.panels['sync'].redraw(current_time, self.time_window))
 
     def start(self):
-        self.anim = FuncAnimation(self.fig, self.update, interval=100)
-        plt.show()
\ No newline at end of file
+        self.anim = FuncAnimation(self.fig, self.update, init_func=self.init_animation,
+                                  interval=1000 / self.fps, blit=True, cache_frame_data=False)
+        plt.show()
+
+
+def _run_visualizer(specs, time_window, fps):
+    topics = {name: SharedTopic.attach(spec) for name, spec in specs.items()}
+    ExperimentVisualizer(time_window=time_window, fps=fps, topics=topics).start()
+
+
+class VisualizerProcess:
+    def __init__(self, experiment, time_window=5.0, fps=30):
+        """
+        Runs ``ExperimentVisualizer`` in a separate process.
+
+        The experiment's bus must be shared (``StreamBus(shared=True)``).
+        The child process maps the device topics read-only and follows them
+        with its own cursors, so rendering never holds the acquisition
+        process's GIL and nothing is sent through pipes.
+
+        Args:
+            experiment: ``BlockCopyExperiment`` with connected devices
+            time_window: Seconds of data shown
+            fps: Target redraw rate
+        """
+        self.exp = experiment
+        self.time_window = time_window
+        self.fps = fps
+        self.process = None
+
+    def start(self):
+        eye, chest, mobile = self.exp.eye_tracker, self.exp.chest_imu, self.exp.mobile_imu
+        specs = {
+            'gaze': eye.gaze_buffer.spec(),
+            'head': eye.imu_buffer.spec(),
+            'chest': chest.euler_buffer.spec(),
+            'mobile': mobile.euler_buffer.spec()
+        }
+        if self.exp.kinematics is not None:
+            specs['kinematics'] = self.exp.kinematics.topic.spec()
+        if self.exp.sync is not None:
+            specs['sync'] = self.exp.sync.topic.spec()
+        # A fresh interpreter: GUI toolkits do not survive a fork
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=_run_visualizer,
+                                       args=(specs, self.time_window, self.fps), daemon=True)
+        self.process.start()
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
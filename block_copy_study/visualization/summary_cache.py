@@ -0,0 +1,146 @@
+# summary_cache.py
+# visualization/summary_cache.py
+import hashlib
+import json
+import os
+import pandas as pd
+
+
+def file_digest(path, block_size=1 << 20):
+    """BLAKE2b digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, directory, max_bytes=512 * 2 ** 20):
+        """
+        Persistent, size-bounded cache of small analysis summaries.
+
+        An entry is keyed by the content hashes of its source files plus the
+        analysis name and parameters, so editing a session or changing a
+        parameter simply misses the cache; stale entries are never served
+        and age out. Entries are pickled results; their modification time
+        records the last use, and the least recently used entries are
+        evicted once the directory grows past ``max_bytes``. A result larger
+        than ``max_bytes`` on its own is returned without being stored.
+
+        Hashing a large stream file costs about as much as reading it, so
+        digests are remembered per path together with the file's size and
+        modification time, and only recomputed when either changes.
+
+        Args:
+            directory: Cache directory, created if missing
+            max_bytes: Total entry size kept after an insertion
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._digest_path = os.path.join(directory, 'digests.json')
+        try:
+            with open(self._digest_path) as f:
+                self._digests = json.load(f)
+        except (OSError, ValueError):
+            self._digests = {}
+
+    def digest(self, path):
+        """Content digest of ``path``; reused while its size and mtime are unchanged."""
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        known = self._digests.get(path)
+        if known is not None and known[:2] == stamp:
+            return known[2]
+        digest = file_digest(path)
+        self._digests[path] = stamp + [digest]
+        self._write_json(self._digest_path, self._digests)
+        return digest
+
+    def key(self, name, sources, params=None):
+        """
+        Entry key of one analysis result.
+
+        Args:
+            name: Analysis name, e.g. 'gaze_density' or 'aoi_dwell'
+            sources: Files the result is computed from
+            params: JSON-serializable analysis parameters
+        """
+        payload = json.dumps({'name': name, 'sources': [self.digest(p) for p in sources],
+                              'params': params}, sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def get_or_compute(self, name, sources, params, compute):
+        """
+        Cached result of ``compute()``; computed and stored on a miss.
+
+        An entry that cannot be unpickled (e.g. truncated by a crash) counts
+        as a miss and is replaced.
+
+        Returns:
+            Result of ``compute``; anything picklable
+        """
+        path = os.path.join(self.directory, f"{self.key(name, sources, params)}.pkl")
+        try:
+            result = pd.read_pickle(path)
+            os.utime(path)
+            self.hits += 1
+            return result
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # A truncated or corrupt entry is a miss; drop it so it is rewritten
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.misses += 1
+        result = compute()
+        temporary = f"{path}.{os.getpid()}.tmp"
+        pd.to_pickle(result, temporary)
+        if os.path.getsize(temporary) > self.max_bytes:
+            os.remove(temporary)
+            return result
+        os.replace(temporary, path)
+        self.evict(keep=path)
+        return result
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used entries until the cache fits ``max_bytes``.
+
+        Args:
+            keep: Entry path that is never removed, e.g. the one just stored
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl') and entry.path != keep:
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and os.path.exists(keep):
+            total += os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                os.remove(entry.path)
+
+    @staticmethod
+    def _write_json(path, payload):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(payload, f)
+        os.replace(temporary, path)